@@ -0,0 +1,152 @@
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.quantities import RESTAURANT_UPLIFT, format_quantity, normalize_style
+
+DEFAULT_CATALOG_PATH = Path(__file__).resolve().parents[1] / "data" / "dish_catalog.json"
+
+# Requested variant or diet preference -> catalog variants that satisfy it, most specific
+# first. A diet only rules entries out; which variant applies comes from the dish itself.
+VARIANT_CHOICES = {
+    "veg": ["veg"],
+    "vegetarian": ["veg"],
+    "egg": ["egg", "veg"],
+    "eggetarian": ["egg", "veg"],
+    "non-veg": ["chicken", "egg", "veg"],
+    "nonveg": ["chicken", "egg", "veg"],
+    "non-vegetarian": ["chicken", "egg", "veg"],
+    "paneer": ["paneer", "veg"],
+}
+
+
+def normalize_dish(name: str) -> str:
+    return " ".join(re.sub(r"[^a-z0-9 ]+", " ", (name or "").lower()).split())
+
+
+def variant_choices(variant: str) -> List[str]:
+    """Catalog variants to try for a requested variant or diet (e.g. "Non-veg")."""
+    key = "-".join((variant or "standard").lower().replace("_", " ").split())
+    return list(dict.fromkeys([*VARIANT_CHOICES.get(key, [key]), "standard"]))
+
+
+class DishCatalog:
+    """Canonical per-serving ingredient templates indexed by (dish, variant, style)."""
+
+    def __init__(self, entries: Iterable[Dict[str, Any]]) -> None:
+        self.entries: List[Dict[str, Any]] = []
+        self._index: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        for entry in entries:
+            self.add(entry)
+
+    @classmethod
+    def load(cls, path: os.PathLike) -> "DishCatalog":
+        try:
+            with open(path, "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, json.JSONDecodeError):
+            data = {}
+        return cls(data.get("dishes", []))
+
+    def add(self, entry: Dict[str, Any]) -> None:
+        variant = (entry.get("variant") or "standard").lower()
+        style = (entry.get("style") or "any").lower()
+        self.entries.append(entry)
+        for name in [entry["dish"], *entry.get("aliases", [])]:
+            self._index[(normalize_dish(name), variant, style)] = entry
+
+    def __contains__(self, key: Tuple[str, str, str]) -> bool:
+        dish, variant, style = key
+        return (normalize_dish(dish), variant.lower(), style.lower()) in self._index
+
+    def names(self) -> List[str]:
+        return [entry["dish"] for entry in self.entries]
+
+    def aliases(self) -> Dict[str, str]:
+        """Every indexed name (canonical and alias, normalized) mapped to its canonical dish."""
+        return {name: entry["dish"] for (name, _, _), entry in self._index.items()}
+
+    def lookup(self, dish: str, variant: str, style: str) -> Optional[Tuple[Dict[str, Any], bool]]:
+        """Return (entry, needs_restaurant_uplift) for the most specific match, if any.
+
+        The entry's own ``variant`` says which variant matched; it may be a fallback
+        (e.g. "standard") rather than the one requested.
+        """
+        name = normalize_dish(dish)
+        style = normalize_style(style)
+        for key_variant in dict.fromkeys(variant_choices(variant)):
+            entry = self._index.get((name, key_variant, style))
+            if entry is not None:
+                return entry, False
+            entry = self._index.get((name, key_variant, "any"))
+            if entry is not None:
+                return entry, style == "restaurant-style"
+        return None
+
+    def build(self, dish: str, servings: int, variant: str, style: str) -> Optional[Dict[str, Any]]:
+        """IngredientOutput-shaped result scaled to ``servings``, or None on a miss."""
+        match = self.lookup(dish, variant, style)
+        if match is None:
+            return None
+        entry, uplift = match
+        low_factor, high_factor = RESTAURANT_UPLIFT if uplift else (1.0, 1.0)
+        servings = max(1, int(servings or 1))
+        ingredients = []
+        for item in entry["ingredients"]:
+            low, high = item["per_serving"]
+            ingredients.append({
+                "item": item["item"],
+                "quantity_range": f"{format_quantity(low * servings * low_factor)}-{format_quantity(high * servings * high_factor)}",
+                "unit": item["unit"],
+            })
+        return {
+            "agent": "IngredientAgent",
+            "dish": entry["dish"],
+            "servings_assumption": servings,
+            "variant": (entry.get("variant") or "standard").lower(),
+            "style": normalize_style(style),
+            "ingredients": ingredients,
+            "source": "catalog",
+        }
+
+
+def save_catalog(path: os.PathLike, entries: Iterable[Dict[str, Any]]) -> None:
+    # One ingredient per line keeps the catalog reviewable in diffs.
+    lines = ['{', '  "version": 1,', '  "dishes": [']
+    blocks = []
+    for entry in entries:
+        rows = ",\n".join(f"        {json.dumps(item, ensure_ascii=False)}" for item in entry["ingredients"])
+        blocks.append(
+            "    {\n"
+            f'      "dish": {json.dumps(entry["dish"], ensure_ascii=False)},\n'
+            f'      "variant": {json.dumps(entry.get("variant") or "standard")},\n'
+            f'      "style": {json.dumps(entry.get("style") or "any")},\n'
+            f'      "aliases": {json.dumps(entry.get("aliases", []), ensure_ascii=False)},\n'
+            f'      "ingredients": [\n{rows}\n      ]\n'
+            "    }"
+        )
+    lines.append(",\n".join(blocks))
+    lines.extend(["  ]", "}"])
+    tmp = Path(str(path) + ".tmp")
+    tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+_catalog: Optional[DishCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> DishCatalog:
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = DishCatalog.load(os.getenv("EATSENSE_CATALOG_PATH") or DEFAULT_CATALOG_PATH)
+    return _catalog
+
+
+def catalog_enabled() -> bool:
+    return os.getenv("EATSENSE_CATALOG_ENABLED", "true").lower() == "true"
@@ -3,6 +3,7 @@ from typing import Dict, Any, List
 from pydantic import BaseModel, Field
 
 from utils.llm import call_structured
+from utils.schemas import register_schema
 
 
 class ClarificationQuestion(BaseModel):
@@ -65,16 +66,37 @@ def _normalize_questions(raw_questions: List[Dict[str, Any]]) -> List[Dict[str,
     return normalized
 
 
+register_schema(
+    ClarificationOutput,
+    coercions={"questions": lambda value: _normalize_questions(value) if isinstance(value, list) else []},
+    defaults={"questions": [], "needs_clarification": False, "reason": "auto_normalized"},
+    overrides={"agent": "ClarificationGatekeeper"},
+)
+
+
 def decide_questions(interpreter_output: Dict[str, Any], preferences: Dict[str, Any]) -> Dict[str, Any]:
-    response = call_structured(
+    gate = interpreter_output.get("quality_gate")
+    if gate and not gate["ok"] and not interpreter_output.get("cues", {}).get("text_present"):
+        # The interpreter never saw the image (see agents.interpreter); only a description helps.
+        problems = " and ".join(reason.replace("_", " ") for reason in gate["reasons"])
+        return {
+            "agent": "ClarificationGatekeeper",
+            "needs_clarification": True,
+            "questions": [{
+                "id": "dish_description",
+                "question": f"The photo looks {problems}. Please describe the dish (name or main ingredients).",
+            }],
+            "reason": "image_quality_gate",
+        }
+
+    data = call_structured(
         model_cls=ClarificationOutput,
         system_prompt=SYSTEM_PROMPT,
         user_text="Interpreter output JSON:\n" + str(interpreter_output),
         allow_invalid=True,
+        stage="clarification",
     )
-
-    data = response.model_dump() if isinstance(response, ClarificationOutput) else (response or {})
-    questions = _normalize_questions(data.get("questions", []))
+    questions = data["questions"]
     cues = interpreter_output.get("cues", {})
     text_present = cues.get("text_present", False)
     candidates = interpreter_output.get("candidates", [])
@@ -111,7 +133,4 @@ def decide_questions(interpreter_output: Dict[str, Any], preferences: Dict[str,
             }]
     data["questions"] = questions
     data["needs_clarification"] = len(data["questions"]) > 0
-    if "reason" not in data:
-        data["reason"] = "auto_normalized"
-    data["agent"] = "ClarificationGatekeeper"
     return data
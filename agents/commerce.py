@@ -1,7 +1,11 @@
 import json
 import os
+import re
 import shutil
-from typing import Dict, Any, List, Optional
+import threading
+import time
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
 
 import anyio
 import httpx
@@ -10,6 +14,9 @@ from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 from mcp.client.streamable_http import streamable_http_client
 
+from utils.breaker import breaker_stats, get_breaker
+from utils.deadline import bounded_timeout, remaining
+
 def _load_mcp_config(path: str) -> Dict[str, Any]:
     try:
         with open(path, "r", encoding="utf-8") as handle:
@@ -24,6 +31,35 @@ def _mock_results(dish: str) -> List[Dict[str, Any]]:
         {"name": f"Street {dish}", "price": "₹180", "eta_minutes": 25},
     ]
 
+def _process_content(content: List[Any]) -> List[Dict[str, Any]]:
+    """Normalize MCP tool content into result dicts (name, price, eta_minutes, ...)."""
+    processed_results = []
+    for item in content:
+        if getattr(item, "type", None) == "text":
+            try:
+                # Try to parse as JSON if the tool returns a JSON string
+                data = json.loads(item.text)
+                if isinstance(data, list):
+                    processed_results.extend(data)
+                else:
+                    processed_results.append(data)
+            except json.JSONDecodeError:
+                # If not JSON, just add the raw text as a name
+                processed_results.append({"name": item.text, "price": "N/A", "eta_minutes": "N/A"})
+    return processed_results
+
+
+def _number(value: Any) -> float:
+    match = re.search(r"\d+(?:\.\d+)?", str(value).replace(",", ""))
+    return float(match.group()) if match else float("inf")
+
+
+def _rank_key(option: Dict[str, Any]) -> Any:
+    if not isinstance(option, dict):
+        return (float("inf"), float("inf"))
+    return (_number(option.get("eta_minutes")), _number(option.get("price")))
+
+
 async def _call_mcp_server(server_name: str, server_config: Dict[str, Any], dish: str) -> Optional[Dict[str, Any]]:
     """Helper to connect to an MCP server and call a commerce tool."""
     try:
@@ -47,7 +83,7 @@ async def _call_mcp_server(server_name: str, server_config: Dict[str, Any], dish
                         search_tool = next((t for t in tools.tools if "search" in t.name or "list" in t.name), None)
                     if search_tool:
                         result = await session.call_tool(search_tool.name, arguments={query_param: dish})
-                        return {"status": "available", "results": result.content, "source": server_name}
+                        return {"status": "available", "results": _process_content(result.content), "source": server_name}
 
         elif "command" in server_config:
             command = server_config["command"]
@@ -69,27 +105,7 @@ async def _call_mcp_server(server_name: str, server_config: Dict[str, Any], dish
                         search_tool = next((t for t in tools.tools if "search" in t.name or "list" in t.name), None)
                     if search_tool:
                         result = await session.call_tool(search_tool.name, arguments={query_param: dish})
-                        
-                        # Process results into a standard format
-                        processed_results = []
-                        for item in result.content:
-                            if item.type == 'text':
-                                try:
-                                    # Try to parse as JSON if the tool returns a JSON string
-                                    data = json.loads(item.text)
-                                    if isinstance(data, list):
-                                        processed_results.extend(data)
-                                    else:
-                                        processed_results.append(data)
-                                except json.JSONDecodeError:
-                                    # If not JSON, just add the raw text as a name
-                                    processed_results.append({"name": item.text, "price": "N/A", "eta_minutes": "N/A"})
-                        
-                        return {
-                            "status": "available", 
-                            "results": processed_results, 
-                            "source": server_name
-                        }
+                        return {"status": "available", "results": _process_content(result.content), "source": server_name}
     except httpx.HTTPStatusError as e:
         status_code = e.response.status_code if e.response else None
         if status_code == 401:
@@ -99,12 +115,105 @@ async def _call_mcp_server(server_name: str, server_config: Dict[str, Any], dish
                 "source": server_name,
             }
         raise
-    except Exception as e:
-        import traceback
-        print(f"Error calling MCP server {server_name}: {e}")
-        print(traceback.format_exc())
     return None
 
+_stats_lock = threading.Lock()
+_attempts: Counter = Counter()
+_wins: Counter = Counter()
+_last: Dict[str, Dict[str, Any]] = {}
+
+
+def commerce_stats() -> Dict[str, Dict[str, Any]]:
+    """Per server: lookups attempted and won, the last lookup's status and latency, breaker state."""
+    breakers = breaker_stats("mcp:")
+    with _stats_lock:
+        return {
+            name: {
+                "attempts": _attempts[name],
+                "wins": _wins[name],
+                **_last.get(name, {}),
+                "breaker": breakers.get(f"mcp:{name}", {}),
+            }
+            for name in _attempts
+        }
+
+
+def _eligible_servers(servers: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    allowed = {name.strip() for name in os.getenv("SWIGGY_MCP_SERVERS", "").split(",") if name.strip()}
+    preferred = os.getenv("SWIGGY_MCP_SERVER_NAME", "").strip()
+    eligible = {}
+    for name, config in servers.items():
+        if allowed and name not in allowed:
+            continue
+        if not isinstance(config, dict):
+            continue
+        if (config.get("type") == "http" and config.get("url")) or config.get("command"):
+            eligible[name] = config
+    # The preferred server goes first so it wins ties when merging.
+    if preferred in eligible:
+        eligible = {preferred: eligible.pop(preferred), **eligible}
+    return eligible
+
+
+async def _race_servers(
+    servers: Dict[str, Dict[str, Any]],
+    dish: str,
+    timeout: float,
+    merge: bool,
+    budget_bound: bool = False,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """Query all servers concurrently; unless ``merge``, the first usable answer cancels the rest.
+
+    ``budget_bound`` means ``timeout`` was cut short by the request's deadline, so a timeout
+    says nothing about the server's health and is not counted against its breaker.
+    """
+    results: List[Dict[str, Any]] = []
+    stats: Dict[str, Dict[str, Any]] = {}
+    started = time.perf_counter()
+
+    async def run(name: str, config: Dict[str, Any]) -> None:
+        # Servers whose breaker is open are skipped without a connection attempt.
+        breaker = get_breaker(f"mcp:{name}")
+        if not breaker.allow():
+            stats[name] = {"status": "circuit_open", "latency_ms": 0.0}
+            return
+        error = None
+        try:
+            with anyio.fail_after(timeout):
+                result = await _call_mcp_server(name, config, dish)
+            status = result["status"] if result else "no_result"
+        except TimeoutError:
+            result, status = None, "timeout"
+        except Exception as exc:
+            result, status, error = None, "error", f"{type(exc).__name__}: {exc}"
+        except BaseException:
+            breaker.release()
+            raise
+        left = remaining()
+        if status == "timeout" and (budget_bound or (left is not None and left <= 0)):
+            # Timed out on our own budget, not the server's health.
+            breaker.release()
+        elif status in {"timeout", "error"}:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        stats[name] = {"status": status, "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+        if error:
+            stats[name]["error"] = error
+        if result:
+            results.append(result)
+            if not merge and result["status"] == "available" and result.get("results"):
+                task_group.cancel_scope.cancel()
+
+    async with anyio.create_task_group() as task_group:
+        for name, config in servers.items():
+            task_group.start_soon(run, name, config)
+
+    for name in servers:
+        stats.setdefault(name, {"status": "cancelled", "latency_ms": round((time.perf_counter() - started) * 1000, 1)})
+    return results, stats
+
+
 def commerce_lookup(dish: str) -> Dict[str, Any]:
     enabled = os.getenv("SWIGGY_MCP_ENABLED", "false").lower() == "true"
     if not enabled:
@@ -116,7 +225,7 @@ def commerce_lookup(dish: str) -> Dict[str, Any]:
 
     config_path = os.getenv("SWIGGY_MCP_CONFIG", "./mcp.json")
     config = _load_mcp_config(config_path)
-    servers = config.get("mcpServers") or config.get("servers") or {}
+    servers = _eligible_servers(config.get("mcpServers") or config.get("servers") or {})
 
     if not servers:
         return {
@@ -125,27 +234,49 @@ def commerce_lookup(dish: str) -> Dict[str, Any]:
             "message": "No MCP servers configured.",
         }
 
-    # Attempt to call the configured server first, then fall back to known Swiggy endpoints.
-    preferred = os.getenv("SWIGGY_MCP_SERVER_NAME", "").strip()
-    server_order = []
-    if preferred:
-        server_order.append(preferred)
-    else:
-        server_order.append("swiggy-food")
-
-    for name in server_order:
-        if name in servers:
-            try:
-                mcp_result = anyio.run(_call_mcp_server, name, servers[name], dish)
-                if mcp_result:
-                    return {
-                        "agent": "CommerceAgent",
-                        "status": mcp_result["status"],
-                        "results": mcp_result["results"],
-                        "source": mcp_result["source"],
-                    }
-            except Exception:
-                continue
+    configured_timeout = float(os.getenv("SWIGGY_MCP_TIMEOUT_SECS", "8"))
+    timeout = bounded_timeout(configured_timeout)
+    merge = os.getenv("SWIGGY_MCP_MODE", "first").lower() == "merge"
+    try:
+        results, server_stats = anyio.run(
+            _race_servers, servers, dish, timeout, merge, timeout < configured_timeout
+        )
+    except Exception:
+        results, server_stats = [], {name: {"status": "error"} for name in servers}
+
+    available = [r for r in results if r["status"] == "available" and r.get("results")]
+    with _stats_lock:
+        _attempts.update(servers.keys())
+        _wins.update(r["source"] for r in available)
+        for name, stat in server_stats.items():
+            _last[name] = {"status": stat.get("status"), "latency_ms": stat.get("latency_ms")}
+
+    if available:
+        # Stable sort keeps the preferred server's options ahead on equal ETA/price.
+        order = {name: idx for idx, name in enumerate(servers)}
+        available.sort(key=lambda r: order.get(r["source"], len(order)))
+        options = [
+            {**option, "source": r["source"]} if isinstance(option, dict) else option
+            for r in available
+            for option in r["results"]
+        ]
+        return {
+            "agent": "CommerceAgent",
+            "status": "available",
+            "results": sorted(options, key=_rank_key),
+            "source": ",".join(r["source"] for r in available),
+            "servers": server_stats,
+        }
+
+    unauthorized = next((r for r in results if r["status"] == "unauthorized"), None)
+    if unauthorized:
+        return {
+            "agent": "CommerceAgent",
+            "status": "unauthorized",
+            "message": unauthorized["message"],
+            "source": unauthorized["source"],
+            "servers": server_stats,
+        }
 
     # Fallback to mock if real MCP fails or no tool found
     return {
@@ -157,4 +288,5 @@ def commerce_lookup(dish: str) -> Dict[str, Any]:
             "estimated_total": "₹260",
         },
         "note": "Mock results shown. MCP connection attempts failed or no search tool found.",
+        "servers": server_stats,
     }
@@ -2,7 +2,12 @@ from typing import Dict, Any, List
 
 from pydantic import BaseModel
 
+from agents.catalog import catalog_enabled, get_catalog
 from utils.llm import call_structured
+from utils.quantities import normalize_style
+from utils.schemas import FromContext, register_schema
+from utils.semantic_cache import get_semantic_cache, semantic_cache_enabled
+from utils.tracing import record_event
 
 
 class IngredientItem(BaseModel):
@@ -41,13 +46,57 @@ SYSTEM_PROMPT = (
 )
 
 
+def _ingredients_from_mapping(value: Any) -> Any:
+    # Some models return {"onion": {"quantity": "80-100", "unit": "g"}, ...}.
+    if not isinstance(value, dict):
+        return value
+    normalized = []
+    for key, item in value.items():
+        if isinstance(item, dict):
+            normalized.append({
+                "item": key,
+                "quantity_range": item.get("quantity") or item.get("quantity_range") or "0-0",
+                "unit": item.get("unit") or "g",
+            })
+    return normalized
+
+
+register_schema(
+    IngredientOutput,
+    aliases={"ingredients": ["ingredients_list"]},
+    coercions={"ingredients": _ingredients_from_mapping, "style": normalize_style},
+    defaults={
+        "dish": FromContext("dish"),
+        "servings_assumption": FromContext("servings"),
+        "variant": FromContext("variant"),
+        "style": FromContext("style"),
+    },
+    overrides={"agent": "IngredientAgent"},
+)
+
+
 def build_ingredients(
     dish: str,
     servings: int,
     variant: str,
     style: str,
 ) -> Dict[str, Any]:
-    response = call_structured(
+    if catalog_enabled():
+        cataloged = get_catalog().build(dish, servings, variant, style)
+        record_event("dish_catalog", hit=cataloged is not None, dish=dish)
+        if cataloged is not None:
+            return cataloged
+
+    # Variant, style and servings must match exactly; only the dish name is fuzzy.
+    cache_tag = f"{(variant or 'standard').lower()}|{(style or 'home-style').lower()}|{servings}"
+    if semantic_cache_enabled():
+        cached, score = get_semantic_cache("ingredient").lookup(dish, cache_tag)
+        record_event("semantic_cache", cache="ingredient", hit=cached is not None, score=round(score, 3))
+        if cached is not None:
+            cached["dish"] = dish
+            return cached
+
+    data = call_structured(
         model_cls=IngredientOutput,
         system_prompt=SYSTEM_PROMPT,
         user_text=(
@@ -57,27 +106,9 @@ def build_ingredients(
             f"Style: {style or 'home-style'}"
         ),
         allow_invalid=True,
+        stage="ingredient",
+        context={"dish": dish, "servings": servings, "variant": variant or "standard", "style": style or "home-style"},
     )
-    data = response.model_dump() if isinstance(response, IngredientOutput) else (response or {})
-    if "servings_assumption" not in data:
-        data["servings_assumption"] = servings
-    if "variant" not in data:
-        data["variant"] = variant or "standard"
-    if "style" not in data:
-        data["style"] = style or "home-style"
-    if "dish" not in data:
-        data["dish"] = dish
-    if "ingredients" not in data and "ingredients_list" in data:
-        data["ingredients"] = data.pop("ingredients_list")
-    if isinstance(data.get("ingredients"), dict):
-        normalized = []
-        for key, value in data["ingredients"].items():
-            if isinstance(value, dict):
-                normalized.append({
-                    "item": key,
-                    "quantity_range": value.get("quantity") or value.get("quantity_range") or "0-0",
-                    "unit": value.get("unit") or "g",
-                })
-        data["ingredients"] = normalized
-    data["agent"] = "IngredientAgent"
+    if semantic_cache_enabled() and data.get("ingredients"):
+        get_semantic_cache("ingredient").insert(dish, data, cache_tag)
     return data
@@ -1,8 +1,19 @@
-from typing import Dict, Any, Optional, List
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple
 
 from pydantic import BaseModel, Field
 
+from agents.catalog import normalize_dish
+from agents.recognizer import extract_servings, recognize
+from utils.io import thumbnail_ref
 from utils.llm import call_structured
+from utils.schemas import FromContext, register_schema
+from utils.semantic_cache import get_semantic_cache, semantic_cache_enabled
+from utils.tracing import record_event
 
 
 class DishCandidate(BaseModel):
@@ -19,12 +30,20 @@ class InterpreterCues(BaseModel):
     uncertainty_reasons: List[str]
 
 
+class VisualSummary(BaseModel):
+    components: List[str] = []
+    colors: List[str] = []
+    textures: List[str] = []
+    notes: str = ""
+
+
 class InterpreterOutput(BaseModel):
     agent: str = "InterpreterAgent"
     input_type: str
     candidates: List[DishCandidate]
     cues: InterpreterCues
     servings_guess: Optional[int]
+    visual_summary: Optional[VisualSummary] = None
 
 
 SYSTEM_PROMPT = (
@@ -33,7 +52,10 @@ SYSTEM_PROMPT = (
     "Also extract variant cues (veg/egg/chicken/paneer) if mentioned, "
     "guess servings if explicitly stated, and assess image quality "
     "(clear, unclear, or no_image). "
-    "If unsure, lower confidence and add uncertainty_reasons.\n\n"
+    "If unsure, lower confidence and add uncertainty_reasons. "
+    "When an image is attached, also describe what is visible in visual_summary "
+    "(components, colors, textures) so the dish can be re-identified later without the image; "
+    "otherwise set visual_summary to null.\n\n"
     "Return JSON with this exact shape:\n"
     "{\n"
     "  \"agent\": \"InterpreterAgent\",\n"
@@ -49,46 +71,307 @@ SYSTEM_PROMPT = (
     "    \"image_quality\": \"clear|unclear|no_image\",\n"
     "    \"uncertainty_reasons\": [\"...\"]\n"
     "  },\n"
-    "  \"servings_guess\": 1\n"
+    "  \"servings_guess\": 1,\n"
+    "  \"visual_summary\": {\"components\": [\"...\"], \"colors\": [\"...\"], \"textures\": [\"...\"], \"notes\": \"...\"}\n"
+    "}\n"
+)
+
+
+class PlateDish(BaseModel):
+    dish: str
+    confidence: float = Field(ge=0, le=1)
+    portion_servings: float = Field(gt=0, description="portion on the plate in standard servings")
+    portion_note: str = ""
+
+
+class PlateOutput(BaseModel):
+    agent: str = "InterpreterAgent"
+    input_type: str
+    dishes: List[PlateDish]
+    cues: InterpreterCues
+
+
+PLATE_SYSTEM_PROMPT = (
+    "You are InterpreterAgent for Dishwise in plate mode. The input shows a thali, combo or "
+    "plate with several dishes served together. List every distinct co-present dish (at most "
+    "8), each with a confidence between 0 and 1 and its portion on the plate in standard "
+    "servings (e.g. one katori of dal = 1.0, two rotis = 1.0, a small side of pickle = 0.25). "
+    "Extract variant cues (veg/egg/chicken/paneer) and assess image quality "
+    "(clear, unclear, or no_image).\n\n"
+    "Return JSON with this exact shape:\n"
+    "{\n"
+    "  \"agent\": \"InterpreterAgent\",\n"
+    "  \"input_type\": \"text|image|image+text\",\n"
+    "  \"dishes\": [\n"
+    "    {\"dish\": \"...\", \"confidence\": 0.0, \"portion_servings\": 1.0, \"portion_note\": \"1 katori\"}\n"
+    "  ],\n"
+    "  \"cues\": {\n"
+    "    \"variant\": [\"veg|egg|chicken|paneer\"],\n"
+    "    \"image_present\": true,\n"
+    "    \"text_present\": true,\n"
+    "    \"image_quality\": \"clear|unclear|no_image\",\n"
+    "    \"uncertainty_reasons\": [\"...\"]\n"
+    "  }\n"
     "}\n"
 )
 
 
+def _top_confidence(data: Dict[str, Any]) -> Optional[float]:
+    candidates = data.get("candidates") or []
+    return float(candidates[0].get("confidence") or 0.0) if candidates else 0.0
+
+
+register_schema(
+    InterpreterOutput,
+    aliases={"candidates": ["dish_candidates"]},
+    coercions={"candidates": lambda value: value[:2] if isinstance(value, list) else value},
+    defaults={
+        "input_type": FromContext("input_type"),
+        "cues": FromContext("default_cues"),
+        "servings_guess": None,
+    },
+)
+
+
+register_schema(
+    PlateOutput,
+    aliases={"dishes": ["items", "components", "candidates"]},
+    coercions={"dishes": lambda value: value[:8] if isinstance(value, list) else value},
+    defaults={"input_type": FromContext("input_type"), "cues": FromContext("default_cues")},
+)
+
+_vision_lock = threading.Lock()
+_vision_counts = {"first_pass": 0, "escalated": 0}
+
+
+def vision_stats() -> Dict[str, float]:
+    """Low-detail first passes and how often they were re-queried at full detail."""
+    with _vision_lock:
+        first_pass, escalated = _vision_counts["first_pass"], _vision_counts["escalated"]
+    return {
+        "first_pass": first_pass,
+        "escalated": escalated,
+        "escalation_rate": round(escalated / first_pass, 3) if first_pass else 0.0,
+    }
+
+
+# Visual summaries by image blob ref (a content hash): (stored_at, summary + candidates).
+_SUMMARY_CAPACITY = 512
+_summaries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_summaries_lock = threading.Lock()
+
+
+def _store_summary(image_ref: str, data: Dict[str, Any]) -> None:
+    summary = data.get("visual_summary")
+    if not summary:
+        return
+    entry = {
+        "visual_summary": summary,
+        "candidates": data.get("candidates", []),
+        "image_quality": (data.get("cues") or {}).get("image_quality"),
+    }
+    with _summaries_lock:
+        _summaries[image_ref] = (time.time(), entry)
+        _summaries.move_to_end(image_ref)
+        while len(_summaries) > _SUMMARY_CAPACITY:
+            _summaries.popitem(last=False)
+
+
+def _cached_summary(image_ref: str) -> Optional[Dict[str, Any]]:
+    ttl = float(os.getenv("INTERPRETER_SUMMARY_TTL_SECS", "3600"))
+    with _summaries_lock:
+        item = _summaries.get(image_ref)
+        if item is None:
+            return None
+        if time.time() - item[0] > ttl:
+            del _summaries[image_ref]
+            return None
+        _summaries.move_to_end(image_ref)
+        return item[1]
+
+
+def _image_meta_text(image_meta: Dict[str, Any]) -> str:
+    text = f"Image metadata: filename={image_meta.get('name')}, size={image_meta.get('size')}, mode={image_meta.get('mode')}"
+    if (image_meta.get("frames") or {}).get("composite"):
+        text += "\nThe image shows two views of the same meal side by side; describe the meal once."
+    gate = image_meta.get("quality")
+    if gate and not gate["ok"]:
+        text += f"\nLocal image check flagged: {', '.join(gate['reasons'])}. Lower confidence accordingly."
+    return text
+
+
+def _quality_gate_failed(image_meta: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    gate = (image_meta or {}).get("quality")
+    if gate and not gate["ok"] and os.getenv("IMAGE_GATE_ENABLED", "true").lower() == "true":
+        return gate
+    return None
+
+
+def _vision_cascade_enabled() -> bool:
+    return os.getenv("INTERPRETER_VISION_CASCADE", "true").lower() == "true"
+
+
+def _needs_full_detail(data: Dict[str, Any]) -> bool:
+    threshold = float(os.getenv("INTERPRETER_ESCALATE_CONFIDENCE", "0.7"))
+    quality = (data.get("cues") or {}).get("image_quality")
+    return _top_confidence(data) < threshold or quality == "unclear"
+
+
 def interpret(
     text_prompt: str,
     image_meta: Optional[Dict[str, Any]] = None,
-    image_data_url: Optional[str] = None,
+    image_ref: Optional[str] = None,
+    refine: bool = False,
 ) -> Dict[str, Any]:
+    """Identify the dish. With ``refine`` (a follow-up on an already analyzed image), the
+    cached visual summary of the image is sent as text instead of the image itself."""
     text_prompt = text_prompt or ""
     image_present = bool(image_meta)
     input_type = "image+text" if image_present and text_prompt.strip() else "image" if image_present else "text"
 
+    # An unusable image with no text can't be identified; skip the vision call and let the
+    # clarifier ask for a description straight away.
+    gate = _quality_gate_failed(image_meta) if input_type == "image" else None
+    if gate is not None:
+        record_event("quality_gate", passed=False, reasons=gate["reasons"])
+        return {
+            "agent": "InterpreterAgent",
+            "input_type": input_type,
+            "candidates": [],
+            "cues": {
+                "variant": [],
+                "image_present": True,
+                "text_present": False,
+                "image_quality": "unclear",
+                "uncertainty_reasons": [f"image {reason.replace('_', ' ')}" for reason in gate["reasons"]],
+            },
+            "servings_guess": None,
+            "quality_gate": gate,
+        }
+
+    # Unambiguous text-only prompts are resolved locally without an LLM round trip.
+    if input_type == "text" and os.getenv("INTERPRETER_LOCAL_ENABLED", "true").lower() == "true":
+        local = recognize(text_prompt)
+        record_event("local_recognizer", hit=local is not None)
+        if local is not None:
+            return local
+
+    # Near-duplicate text prompts reuse a cached interpretation; servings are re-extracted
+    # from the current prompt since they are deliberately left out of the cache key.
+    cache_key = None
+    if input_type == "text" and text_prompt.strip() and semantic_cache_enabled():
+        servings, cache_key = extract_servings(normalize_dish(text_prompt))
+        cached, score = get_semantic_cache("interpreter").lookup(cache_key)
+        record_event("semantic_cache", cache="interpreter", hit=cached is not None, score=round(score, 3))
+        if cached is not None:
+            cached["servings_guess"] = servings
+            return cached
+
     extra_text = None
     if image_meta:
-        extra_text = f"Image metadata: filename={image_meta.get('name')}, size={image_meta.get('size')}, mode={image_meta.get('mode')}"
+        extra_text = _image_meta_text(image_meta)
+
+    def query(ref: Optional[str], detail: Optional[str], extra: Optional[str] = extra_text) -> Dict[str, Any]:
+        return call_structured(
+            model_cls=InterpreterOutput,
+            system_prompt=SYSTEM_PROMPT,
+            user_text=f"Input type: {input_type}\nUser text: {text_prompt or 'N/A'}",
+            image_ref=ref,
+            extra_user_text=extra,
+            stage="interpreter",
+            confidence=_top_confidence,
+            image_detail=detail,
+            context={
+                "input_type": input_type,
+                "default_cues": {
+                    "variant": [],
+                    "image_present": image_present,
+                    "text_present": bool(text_prompt.strip()),
+                    "image_quality": "no_image" if not image_present else "unclear",
+                    "uncertainty_reasons": ["missing_cues"],
+                },
+            },
+        )
+
+    # Refinements run text-only against the earlier look at the same image.
+    cached = _cached_summary(image_ref) if refine and image_ref else None
+    if refine and image_ref:
+        record_event("visual_summary", hit=cached is not None)
+    if cached is not None:
+        summary_text = (
+            "The image is not attached again. Visual summary from an earlier analysis of it:\n"
+            + json.dumps(cached, ensure_ascii=False)
+        )
+        data = query(None, None, "\n\n".join(part for part in (extra_text, summary_text) if part))
+        data["cues"]["image_present"] = True
+        if cached.get("image_quality"):
+            data["cues"]["image_quality"] = cached["image_quality"]
+        data["visual_summary"] = cached["visual_summary"]
+        return data
+
+    # Images go out as a low-detail thumbnail first; only unclear or low-confidence
+    # answers pay for a full-detail re-query.
+    thumb_ref = None
+    if image_ref and _vision_cascade_enabled():
+        thumb_ref = thumbnail_ref(image_ref, int(os.getenv("INTERPRETER_THUMBNAIL_PX", "512")))
+    if thumb_ref:
+        data = query(thumb_ref, "low")
+        escalate = _needs_full_detail(data)
+        with _vision_lock:
+            _vision_counts["first_pass"] += 1
+            _vision_counts["escalated"] += int(escalate)
+        record_event("vision_tier", tier="low", confidence=_top_confidence(data), escalated=escalate)
+        if escalate:
+            data = query(image_ref, "high")
+            record_event("vision_tier", tier="high", confidence=_top_confidence(data), escalated=False)
+    else:
+        data = query(image_ref, None)
+    if image_ref:
+        _store_summary(image_ref, data)
+    if cache_key and data["candidates"]:
+        get_semantic_cache("interpreter").insert(cache_key, data)
+    return data
 
-    response = call_structured(
-        model_cls=InterpreterOutput,
-        system_prompt=SYSTEM_PROMPT,
+
+def interpret_plate(
+    text_prompt: str,
+    image_meta: Optional[Dict[str, Any]] = None,
+    image_ref: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Identify every dish on a multi-dish plate with its portion in standard servings.
+
+    The output also carries ``candidates`` (dishes by confidence) so it can stand in for
+    a regular interpretation.
+    """
+    text_prompt = text_prompt or ""
+    image_present = bool(image_meta)
+    input_type = "image+text" if image_present and text_prompt.strip() else "image" if image_present else "text"
+    extra_text = None
+    if image_meta:
+        extra_text = _image_meta_text(image_meta)
+
+    data = call_structured(
+        model_cls=PlateOutput,
+        system_prompt=PLATE_SYSTEM_PROMPT,
         user_text=f"Input type: {input_type}\nUser text: {text_prompt or 'N/A'}",
-        image_data_url=image_data_url,
+        image_ref=image_ref,
         extra_user_text=extra_text,
+        stage="interpreter",
+        context={
+            "input_type": input_type,
+            "default_cues": {
+                "variant": [],
+                "image_present": image_present,
+                "text_present": bool(text_prompt.strip()),
+                "image_quality": "no_image" if not image_present else "unclear",
+                "uncertainty_reasons": ["missing_cues"],
+            },
+        },
     )
-    data = response.model_dump()
-    if "candidates" not in data and "dish_candidates" in data:
-        data["candidates"] = data.pop("dish_candidates")
-    if "input_type" not in data:
-        data["input_type"] = input_type
-    if "cues" not in data:
-        cues = {
-            "variant": [],
-            "image_present": image_present,
-            "text_present": bool(text_prompt.strip()),
-            "image_quality": "no_image" if not image_present else "unclear",
-            "uncertainty_reasons": ["missing_cues"],
-        }
-        data["cues"] = cues
-    if "servings_guess" not in data:
-        data["servings_guess"] = None
-    data["candidates"] = (data.get("candidates") or [])[:2]
+    data["mode"] = "plate"
+    data["candidates"] = [
+        {"dish": item["dish"], "confidence": item["confidence"], "cues": ["plate"]}
+        for item in sorted(data["dishes"], key=lambda item: -item["confidence"])
+    ]
+    data["servings_guess"] = None
     return data
@@ -1,8 +1,17 @@
-from typing import Dict, Any, List
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
 
+import numpy as np
 from pydantic import BaseModel
 
 from utils.llm import call_structured
+from utils.quantities import IngredientTable, name_tokens
+from utils.schemas import FromContext, register_schema
+
+NUTRIENTS_PATH = Path(__file__).resolve().parents[1] / "data" / "nutrients.json"
 
 
 class NutritionPerServing(BaseModel):
@@ -40,41 +49,160 @@ SYSTEM_PROMPT = (
 )
 
 
+_DEFAULT_ASSUMPTIONS = [
+    "Quantities use midpoint of provided ranges.",
+    "Nutrition values are approximations per 100g.",
+]
+
+register_schema(
+    NutritionOutput,
+    aliases={
+        "per_serving.calories_kcal": ["calories_per_serving"],
+        "per_serving.protein_g": ["protein"],
+        "per_serving.carbs_g": ["carbs", "carbohydrates"],
+        "per_serving.fat_g": ["fat"],
+    },
+    coercions={
+        "per_serving": lambda value: value if isinstance(value, dict) else {},
+        "assumptions": lambda value: value if isinstance(value, list) else list(_DEFAULT_ASSUMPTIONS),
+    },
+    defaults={
+        "servings": FromContext("servings", 1),
+        "per_serving.calories_kcal": 0,
+        "per_serving.protein_g": 0.0,
+        "per_serving.carbs_g": 0.0,
+        "per_serving.fat_g": 0.0,
+        "assumptions": _DEFAULT_ASSUMPTIONS,
+    },
+    overrides={"agent": "NutritionAgent"},
+)
+
+
 def estimate_nutrition(ingredient_output: Dict[str, Any]) -> Dict[str, Any]:
-    response = call_structured(
+    return call_structured(
         model_cls=NutritionOutput,
         system_prompt=SYSTEM_PROMPT,
         user_text=f"Ingredient output JSON:\n{ingredient_output}",
         allow_invalid=True,
+        stage="nutrition",
+        context={"servings": ingredient_output.get("servings_assumption", 1)},
     )
-    data = response.model_dump() if isinstance(response, NutritionOutput) else (response or {})
-    servings = ingredient_output.get("servings_assumption", 1)
-    if "servings" not in data:
-        data["servings"] = servings
-    if "per_serving" not in data:
-        per_serving = {}
-        if "calories_per_serving" in data:
-            per_serving["calories_kcal"] = data.get("calories_per_serving")
-        if "protein" in data:
-            per_serving["protein_g"] = data.get("protein")
-        if "carbs" in data:
-            per_serving["carbs_g"] = data.get("carbs")
-        if "carbohydrates" in data:
-            per_serving["carbs_g"] = data.get("carbohydrates")
-        if "fat" in data:
-            per_serving["fat_g"] = data.get("fat")
-        data["per_serving"] = per_serving
-    if not isinstance(data.get("per_serving"), dict):
-        data["per_serving"] = {}
-    per_serving = data["per_serving"]
-    per_serving.setdefault("calories_kcal", 0)
-    per_serving.setdefault("protein_g", 0.0)
-    per_serving.setdefault("carbs_g", 0.0)
-    per_serving.setdefault("fat_g", 0.0)
-    if not isinstance(data.get("assumptions"), list):
-        data["assumptions"] = [
-            "Quantities use midpoint of provided ranges.",
-            "Nutrition values are approximations per 100g.",
-        ]
-    data["agent"] = "NutritionAgent"
-    return data
+
+
+@lru_cache(maxsize=1)
+def _nutrient_table() -> Tuple[List[str], Dict[str, List[float]]]:
+    with open(NUTRIENTS_PATH, "r", encoding="utf-8") as handle:
+        data = json.load(handle)
+    return data["columns"], data["per_100g"]
+
+
+# Cooking fats decide an item's nutrients whatever they are made from ("coconut oil").
+_FATS = ("oil", "ghee", "butter")
+
+
+def _match_food(item: str, foods: Dict[str, List[float]]) -> Optional[str]:
+    """Table key for an ingredient name, matched on whole words (so "eggplant" isn't egg).
+
+    A cooking fat wins outright; otherwise the match ending last (the head noun, as in
+    "tomato puree") wins, then the longest key ("coconut milk" over coconut).
+    """
+    words = name_tokens(item)
+    best: Optional[Tuple[int, int, str]] = None
+    for key in foods:
+        key_words = name_tokens(key)
+        size = len(key_words)
+        ends = [start + size for start in range(len(words) - size + 1) if words[start:start + size] == key_words]
+        if not ends:
+            continue
+        rank = (1 if key in _FATS else 0, max(ends), size)
+        if best is None or rank > best[:3]:
+            best = (*rank, key)
+    return best[3] if best else None
+
+
+def estimate_nutrition_local(ingredient_output: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-serving estimate from the bundled per-100g table, without an LLM call.
+
+    Used when the request's time budget is too short for NutritionAgent. Ingredients
+    without a table entry or a gram equivalent are left out and listed in the assumptions.
+    """
+    columns, foods = _nutrient_table()
+    table = IngredientTable.from_output(ingredient_output)
+    grams = table.grams.mean(axis=1)
+    keys = [_match_food(item, foods) for item in table.items]
+    per_100g = np.array([foods[key] if key else [np.nan] * len(columns) for key in keys], dtype=np.float64)
+    per_100g = per_100g.reshape(-1, len(columns))
+    usable = ~np.isnan(grams) & ~np.isnan(per_100g[:, 0])
+    totals = (grams[usable, None] / 100.0 * per_100g[usable]).sum(axis=0) / table.servings
+
+    per_serving = {column: round(float(value), 1) for column, value in zip(columns, totals)}
+    per_serving["calories_kcal"] = int(round(per_serving["calories_kcal"]))
+    skipped = [item for item, ok in zip(table.items, usable) if not ok]
+    assumptions = [
+        "Quantities use midpoint of provided ranges.",
+        "Estimated locally from a standard per-100g nutrient table (time budget too short for the full estimate).",
+    ]
+    if skipped:
+        assumptions.append("Not counted (no table entry or weight): " + ", ".join(skipped) + ".")
+    return {
+        "agent": "NutritionAgent",
+        "servings": table.servings,
+        "per_serving": per_serving,
+        "assumptions": assumptions,
+        "source": "local_table",
+    }
+
+
+def nutrition_interval(
+    ingredient_output: Dict[str, Any],
+    anchor: Optional[Dict[str, Any]] = None,
+    samples: Optional[int] = None,
+    seed: int = 0,
+) -> Optional[Dict[str, Any]]:
+    """Per-serving median and 10th-90th percentile band from the ingredient quantity ranges.
+
+    Every ingredient's grams are drawn uniformly within its range (ingredients x samples in
+    one array) and pushed through the per-100g table. With ``anchor`` (the reported
+    per-serving estimate) the band is rescaled around it, so it describes the spread due to
+    quantities rather than the table's own point estimate; nutrients whose reported value is
+    missing, zero or not finite keep the table's band. None when nothing can be matched.
+    """
+    columns, foods = _nutrient_table()
+    table = IngredientTable.from_output(ingredient_output)
+    grams = table.grams
+    keys = [_match_food(item, foods) for item in table.items]
+    usable = ~np.isnan(grams[:, 0]) & np.array([key is not None for key in keys], dtype=bool)
+    if not usable.any():
+        return None
+    samples = samples or int(os.getenv("NUTRITION_INTERVAL_SAMPLES", "4000"))
+    low, high = grams[usable, 0], grams[usable, 1]
+    per_100g = np.array([foods[key] for key, ok in zip(keys, usable) if ok], dtype=np.float64)
+
+    draws = np.random.default_rng(seed).random((len(low), samples))
+    draws = low[:, None] + (high - low)[:, None] * draws
+    totals = per_100g.T @ draws / (100.0 * table.servings)  # (nutrients, samples)
+    p10, median, p90 = np.percentile(totals, [10, 50, 90], axis=1)
+
+    per_serving = {}
+    anchored = False
+    for idx, column in enumerate(columns):
+        band = np.array([p10[idx], median[idx], p90[idx]])
+        reported = (anchor or {}).get(column)
+        # A zero or non-finite estimate (e.g. a schema default after failed validation) would
+        # collapse the band to a confident point, so it is left unanchored.
+        if isinstance(reported, (int, float)) and np.isfinite(reported) and reported > 0 and median[idx] > 0:
+            band = band * (reported / median[idx])
+            anchored = True
+        digits = 0 if column == "calories_kcal" else 1
+        per_serving[column] = dict(zip(("p10", "median", "p90"), (round(float(v), digits) for v in band)))
+
+    midpoints = np.nan_to_num(grams.mean(axis=1))
+    return {
+        "method": "monte_carlo",
+        "samples": samples,
+        "per_serving": per_serving,
+        "anchored": anchored,
+        # Share of the dish's weight that the table could account for.
+        "coverage": round(float(midpoints[usable].sum() / max(midpoints.sum(), 1e-9)), 3),
+        "not_counted": [item for item, ok in zip(table.items, usable) if not ok],
+    }
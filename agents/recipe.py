@@ -3,6 +3,7 @@ from typing import Dict, Any, List
 from pydantic import BaseModel
 
 from utils.llm import call_structured
+from utils.schemas import FromContext, register_schema
 
 
 class RecipeOutput(BaseModel):
@@ -30,29 +31,33 @@ SYSTEM_PROMPT = (
 )
 
 
+register_schema(
+    RecipeOutput,
+    # Some models nest the answer as {"recipe": {"name", "steps", "time"}}.
+    aliases={
+        "dish": ["recipe.name"],
+        "steps": ["recipe.steps"],
+        "time_minutes": ["recipe.time_minutes", "recipe.time"],
+    },
+    defaults={"dish": FromContext("dish"), "steps": [], "time_minutes": 25},
+    overrides={
+        "ingredients_used": FromContext("ingredients_used", 0),
+        "style": FromContext("style"),
+        "agent": "RecipeAgent",
+    },
+)
+
+
 def build_recipe(ingredient_output: Dict[str, Any], style: str) -> Dict[str, Any]:
     dish = ingredient_output.get("dish", "Dish")
     ingredients = ingredient_output.get("ingredients", [])
-    response = call_structured(
+    data = call_structured(
         model_cls=RecipeOutput,
         system_prompt=SYSTEM_PROMPT,
         user_text=f"Dish: {dish}\nStyle: {style}\nIngredients: {ingredients}",
         allow_invalid=True,
+        stage="recipe",
+        context={"dish": dish, "style": style or "home-style", "ingredients_used": len(ingredients)},
     )
-    data = response.model_dump() if isinstance(response, RecipeOutput) else (response or {})
-    if "recipe" in data and isinstance(data["recipe"], dict):
-        inner = data.pop("recipe")
-        data.setdefault("dish", inner.get("name") or dish)
-        data.setdefault("steps", inner.get("steps"))
-        if "time_minutes" not in data:
-            data["time_minutes"] = inner.get("time_minutes") or inner.get("time") or 25
-    if "dish" not in data:
-        data["dish"] = dish
-    if "steps" not in data:
-        data["steps"] = []
-    if "time_minutes" not in data:
-        data["time_minutes"] = 25
-    data["ingredients_used"] = len(ingredients)
-    data["style"] = style or "home-style"
-    data["agent"] = "RecipeAgent"
+    data.pop("recipe", None)
     return data
@@ -0,0 +1,153 @@
+import os
+import re
+import threading
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from agents.catalog import get_catalog, normalize_dish
+
+DISH_NAMES_PATH = Path(__file__).resolve().parents[1] / "data" / "dish_names.txt"
+
+_NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "single": 1, "couple": 2,
+}
+_NUM = r"(\d{1,2}|" + "|".join(_NUMBER_WORDS) + r")"
+_SERVINGS_PATTERNS = [
+    re.compile(_NUM + r"\s*(?:servings?|serves|people|persons?|pax|plates?|portions?)\b"),
+    re.compile(r"\b(?:for|serves?|feeds)\s+(?:a\s+)?" + _NUM + r"\b"),
+    re.compile(r"(?:\bx\s*|\*\s*)" + _NUM + r"\b"),
+    re.compile(r"\b" + _NUM + r"\s*x\b"),
+]
+_VARIANT_WORDS = {
+    "veg": "veg", "vegetarian": "veg", "vegetable": "veg",
+    "egg": "egg", "eggs": "egg", "anda": "egg",
+    "chicken": "chicken", "murgh": "chicken",
+    "paneer": "paneer",
+    "mutton": "mutton", "lamb": "mutton", "gosht": "mutton",
+    "fish": "fish", "machli": "fish",
+    "prawn": "prawn", "prawns": "prawn", "shrimp": "prawn",
+}
+_FILLER = {"a", "an", "the", "of", "some", "plate", "bowl", "i", "had", "ate", "made", "homemade", "please", "and", "with"}
+
+
+def _to_int(token: str) -> int:
+    return int(token) if token.isdigit() else _NUMBER_WORDS[token]
+
+
+def extract_servings(text: str) -> Tuple[Optional[int], str]:
+    """Return (servings, text with the servings phrase removed)."""
+    for pattern in _SERVINGS_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            servings = _to_int(match.group(1))
+            if 1 <= servings <= 20:
+                return servings, (text[:match.start()] + " " + text[match.end():]).strip()
+    return None, text
+
+
+def _variant_set(text: str) -> FrozenSet[str]:
+    return frozenset(_VARIANT_WORDS[word] for word in text.split() if word in _VARIANT_WORDS)
+
+
+def extract_variants(text: str) -> List[str]:
+    found: List[str] = []
+    for word in text.split():
+        variant = _VARIANT_WORDS.get(word)
+        if variant and variant not in found:
+            found.append(variant)
+    return found
+
+
+class DishLexicon:
+    """Normalized dish names (catalog dishes, aliases and extra names) for fuzzy matching."""
+
+    def __init__(self, names: Dict[str, str]) -> None:
+        self.names = names
+
+    @classmethod
+    def load(cls) -> "DishLexicon":
+        names = get_catalog().aliases()
+        try:
+            lines = DISH_NAMES_PATH.read_text(encoding="utf-8").splitlines()
+        except OSError:
+            lines = []
+        for line in lines:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                names.setdefault(normalize_dish(line), line)
+        return cls(names)
+
+    def match(self, text: str) -> List[Tuple[str, float, str]]:
+        """Score every canonical dish against ``text``; best first as (dish, score, how)."""
+        best: Dict[str, Tuple[float, str]] = {}
+        padded = f" {text} "
+        variants = _variant_set(text)
+        for name, dish in self.names.items():
+            # Protein words must agree: "egg biryani" is one letter from "veg biryani" but a
+            # different dish, and "egg dal tadka" is not the catalog's dal tadka.
+            name_variants = _variant_set(name)
+            if f" {name} " in padded:
+                if variants - name_variants - {"veg"}:
+                    continue
+                # Exact phrase: penalize only by how much unrelated text surrounds it.
+                score, how = 0.7 + 0.3 * len(name) / max(len(text), 1), "exact_match"
+            elif name_variants != variants:
+                continue
+            else:
+                score, how = SequenceMatcher(None, name, text).ratio(), "fuzzy_match"
+            if score > best.get(dish, (0.0, ""))[0]:
+                best[dish] = (score, how)
+        return sorted(((dish, score, how) for dish, (score, how) in best.items()), key=lambda r: -r[1])
+
+
+_lexicon: Optional[DishLexicon] = None
+_lexicon_lock = threading.Lock()
+
+
+def get_lexicon() -> DishLexicon:
+    global _lexicon
+    if _lexicon is None:
+        with _lexicon_lock:
+            if _lexicon is None:
+                _lexicon = DishLexicon.load()
+    return _lexicon
+
+
+def recognize(text_prompt: str) -> Optional[Dict[str, Any]]:
+    """InterpreterOutput-shaped result for an unambiguous text prompt, else None."""
+    threshold = float(os.getenv("INTERPRETER_LOCAL_THRESHOLD", "0.88"))
+    text = normalize_dish(text_prompt)
+    if not text:
+        return None
+    servings, remainder = extract_servings(text)
+    remainder = " ".join(word for word in remainder.split() if word not in _FILLER)
+    if not remainder:
+        return None
+
+    ranked = get_lexicon().match(remainder)
+    if not ranked or ranked[0][1] < threshold:
+        return None
+    top_dish, top_score, how = ranked[0]
+    runner_up = ranked[1] if len(ranked) > 1 else ("Mixed Dish", 0.0, "fallback")
+    if top_score - runner_up[1] < 0.1:
+        return None
+
+    return {
+        "agent": "InterpreterAgent",
+        "input_type": "text",
+        "candidates": [
+            {"dish": top_dish, "confidence": round(min(0.95, top_score), 2), "cues": ["local_lexicon", how]},
+            {"dish": runner_up[0], "confidence": round(min(0.4, runner_up[1] / 2), 2), "cues": ["local_lexicon", "runner_up"]},
+        ],
+        "cues": {
+            "variant": extract_variants(text),
+            "image_present": False,
+            "text_present": True,
+            "image_quality": "no_image",
+            "uncertainty_reasons": [],
+        },
+        "servings_guess": servings,
+        "source": "local_recognizer",
+    }
@@ -1,24 +1,63 @@
 from __future__ import annotations
 
+import contextvars
+import functools
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
 from dataclasses import dataclass, field
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
 
-from agents.interpreter import interpret
+from agents.interpreter import interpret, interpret_plate
 from agents.clarification import decide_questions
 from agents.ingredient import build_ingredients
 from agents.recipe import build_recipe
-from agents.nutrition import estimate_nutrition
+from agents.nutrition import estimate_nutrition, estimate_nutrition_local, nutrition_interval
 from agents.commerce import commerce_lookup
+from utils.breaker import breaker_stats
+from utils.deadline import DeadlineExceeded, deadline_scope
+from utils.metrics import COMMERCE_OUTCOMES, REQUESTS_INFLIGHT, STAGES_INFLIGHT, observe_clarification, observe_stage
+from utils.profiling import profile_stage, profiling_enabled, request_key
+from utils.quantities import RESTAURANT_UPLIFT, IngredientTable, normalize_style
+from utils.ratelimit import request_scope
+from utils.trace_log import get_trace_log, trace_log_enabled
+from utils.tracing import collect_events
 
 
 @dataclass
 class CoordinatorState:
     text_prompt: str = ""
     image_meta: Optional[Dict[str, Any]] = None
-    image_data_url: Optional[str] = None
+    image_ref: Optional[str] = None
     preferences: Dict[str, Any] = field(default_factory=dict)
     clarifications: Dict[str, Any] = field(default_factory=dict)
     trace: Dict[str, Any] = field(default_factory=dict)
+    session_id: str = ""
+    priority: str = "interactive"
+    profile: bool = False
+    # Absolute time.time() by which the response is due (see utils.deadline.deadline_after).
+    deadline: Optional[float] = None
+    # Treat the input as a plate of several dishes (thali, combo) instead of one dish.
+    plate_mode: bool = False
+    request_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    # Called with (stage name, stage trace entry) whenever a stage finishes (e.g. job progress).
+    on_stage: Optional[Callable[[str, Dict[str, Any]], None]] = None
+
+
+_F = TypeVar("_F", bound=Callable[..., Any])
+
+
+def _request_entry(method: _F) -> _F:
+    """Count calls to a Coordinator entry point as an in-flight request."""
+
+    @functools.wraps(method)
+    def wrapper(self: "Coordinator", *args: Any, **kwargs: Any) -> Any:
+        with self.serving():
+            return method(self, *args, **kwargs)
+
+    return wrapper  # type: ignore[return-value]
 
 
 class Coordinator:
@@ -26,29 +65,92 @@ class Coordinator:
 
     def __init__(self, state: CoordinatorState) -> None:
         self.state = state
+        self._profile_key: Optional[str] = None
+        self._serving = 0
 
+    @contextmanager
+    def serving(self) -> Iterator[None]:
+        """Count this request in eatsense_requests_inflight; nested entry points count once."""
+        self._serving += 1
+        if self._serving == 1:
+            REQUESTS_INFLIGHT.inc()
+        try:
+            yield
+        finally:
+            self._serving -= 1
+            if self._serving == 0:
+                REQUESTS_INFLIGHT.dec()
+
+    def _run_stage(self, name: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run one agent call, recording its latency and helper events under trace["Stages"]."""
+        started = time.perf_counter()
+        error = None
+        failure: Optional[BaseException] = None
+        profiler = nullcontext(None)
+        if self.state.profile or profiling_enabled():
+            self._profile_key = self._profile_key or request_key(self.state.request_id)
+            profiler = profile_stage(self._profile_key, name)
+        with request_scope(self.state.priority, self.state.session_id), deadline_scope(self.state.deadline), \
+                collect_events() as events, profiler as profile:
+            STAGES_INFLIGHT.inc(agent=name)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as exc:
+                error = f"{type(exc).__name__}: {exc}"
+                failure = exc
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                STAGES_INFLIGHT.dec(agent=name)
+                observe_stage(name, elapsed, failure, events)
+                stage = {"latency_ms": round(elapsed * 1000, 1), "events": events}
+                if error:
+                    stage["error"] = error
+                if profile is not None:
+                    stage["profile"] = profile
+                self.state.trace.setdefault("Stages", {})[name] = stage
+                if self.state.on_stage is not None:
+                    self.state.on_stage(name, stage)
+
+    @_request_entry
     def run_interpreter(self) -> Dict[str, Any]:
-        output = interpret(
+        output = self._run_stage(
+            "InterpreterAgent",
+            interpret_plate if self.state.plate_mode else interpret,
             text_prompt=self.state.text_prompt,
             image_meta=self.state.image_meta,
-            image_data_url=self.state.image_data_url,
+            image_ref=self.state.image_ref,
         )
         self.state.trace["InterpreterAgent"] = output
+        frames = (self.state.image_meta or {}).get("frames")
+        if frames:
+            self.state.trace["FrameSelection"] = frames
         return output
 
+    @_request_entry
     def run_clarifier(self, interpreter_output: Dict[str, Any]) -> Dict[str, Any]:
-        output = decide_questions(interpreter_output, self.state.preferences)
+        if interpreter_output.get("mode") == "plate":
+            # Plates list co-present dishes, not alternatives, so there is nothing to choose between.
+            output = {"agent": "ClarificationGatekeeper", "needs_clarification": False, "questions": [], "reason": "plate_mode"}
+            self.state.trace["ClarificationGatekeeper"] = output
+            return output
+        output = self._run_stage("ClarificationGatekeeper", decide_questions, interpreter_output, self.state.preferences)
+        observe_clarification(output.get("questions", []))
         self.state.trace["ClarificationGatekeeper"] = output
         return output
 
+    @_request_entry
     def apply_clarifications(self, interpreter_output: Dict[str, Any]) -> Dict[str, Any]:
         answers = self.state.clarifications
 
         if answers.get("dish_description"):
-            interpreter_output = interpret(
+            interpreter_output = self._run_stage(
+                "InterpreterAgent",
+                interpret,
                 text_prompt=answers["dish_description"],
                 image_meta=self.state.image_meta,
-                image_data_url=self.state.image_data_url,
+                image_ref=self.state.image_ref,
+                refine=True,
             )
 
         candidates = interpreter_output.get("candidates", [])
@@ -71,31 +173,247 @@ class Coordinator:
         self.state.trace["InterpreterAgent"] = interpreter_output
         return interpreter_output
 
+    @_request_entry
     def build_outputs(self, interpreter_output: Dict[str, Any]) -> Dict[str, Any]:
+        if interpreter_output.get("mode") == "plate":
+            return self.build_plate_outputs(interpreter_output)
+
         servings = self._resolve_servings(interpreter_output)
         variant = self._resolve_variant()
-        style = (self.state.preferences.get("style") or "home-style").lower()
+        style = normalize_style(self.state.preferences.get("style"))
+
+        candidates = interpreter_output.get("candidates") or []
+        if not candidates:
+            raise ValueError("No dish identified; a dish description is needed.")
+        top_dish = candidates[0]["dish"]
+        ingredient_output, recipe_output, nutrition_output, degraded = self._build_dish(top_dish, servings, variant, style)
 
-        top_dish = interpreter_output.get("candidates", [])[0]["dish"]
-        ingredient_output = build_ingredients(top_dish, servings, variant, style)
-        recipe_output = build_recipe(ingredient_output, style)
-        nutrition_output = estimate_nutrition(ingredient_output)
-        commerce_output = commerce_lookup(top_dish)
+        if self._budget_below("DEADLINE_COMMERCE_MIN_SECS", 2):
+            degraded["commerce"] = "skipped"
+            commerce_output = {
+                "agent": "CommerceAgent",
+                "status": "skipped",
+                "message": "Commerce lookup skipped to meet the response deadline.",
+            }
+        else:
+            commerce_output = self._run_stage("CommerceAgent", commerce_lookup, top_dish)
+        COMMERCE_OUTCOMES.inc(status=commerce_output.get("status", "unknown"))
 
         self.state.trace.update({
             "IngredientAgent": ingredient_output,
             "RecipeAgent": recipe_output,
             "NutritionAgent": nutrition_output,
             "CommerceAgent": commerce_output,
+            "Breakers": breaker_stats(),
+            "Degraded": degraded,
         })
 
-        return self._compose_output(
+        final_output = self._compose_output(
             interpreter_output,
             ingredient_output,
             recipe_output,
             nutrition_output,
             commerce_output,
         )
+        final_output["degraded"] = degraded
+        self.persist_trace()
+        return final_output
+
+    @_request_entry
+    def build_plate_outputs(self, plate_output: Dict[str, Any]) -> Dict[str, Any]:
+        """Build every dish on a plate concurrently and add up plate-level nutrition.
+
+        Each dish is generated for one standard serving; its nutrition is weighted by the
+        interpreter's portion estimate. A dish that fails is reported and left out of the total.
+        """
+        variant = self._resolve_variant()
+        style = normalize_style(self.state.preferences.get("style"))
+        dishes = [item for item in plate_output.get("dishes", []) if item.get("dish")]
+        if not dishes:
+            raise ValueError("No dishes recognized on the plate.")
+
+        workers = max(1, min(len(dishes), int(os.getenv("PLATE_MAX_WORKERS", "4"))))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plate") as pool:
+            # Submit in a copy of the caller's context so outer scopes (events, deadline) carry over.
+            futures = [
+                pool.submit(contextvars.copy_context().run, self._build_dish, item["dish"], 1, variant, style, f"[{idx}]")
+                for idx, item in enumerate(dishes)
+            ]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as exc:
+                    results.append(exc)
+        if all(isinstance(result, Exception) for result in results):
+            raise results[0]
+
+        columns = ("calories_kcal", "protein_g", "carbs_g", "fat_g")
+        totals = dict.fromkeys(columns, 0.0)
+        breakdown: List[Dict[str, Any]] = []
+        degraded: Dict[str, str] = {}
+        for item, result in zip(dishes, results):
+            portion = float(item.get("portion_servings") or 1.0)
+            entry: Dict[str, Any] = {
+                "dish": item["dish"],
+                "portion_servings": portion,
+                "portion_note": item.get("portion_note", ""),
+            }
+            if isinstance(result, Exception):
+                entry["error"] = f"{type(result).__name__}: {result}"
+                degraded[item["dish"]] = "failed"
+                breakdown.append(entry)
+                continue
+            ingredient_output, recipe_output, nutrition_output, dish_degraded = result
+            per_serving = nutrition_output.get("per_serving") or {}
+            contribution = {key: round(float(per_serving.get(key) or 0) * portion, 1) for key in columns}
+            for key in columns:
+                totals[key] += contribution[key]
+            degraded.update({f"{item['dish']} {part}": how for part, how in dish_degraded.items()})
+            entry.update({
+                "ingredients": ingredient_output,
+                "recipe": recipe_output,
+                "nutrition": nutrition_output,
+                "contribution": contribution,
+            })
+            breakdown.append(entry)
+
+        per_plate = {key: round(value, 1) for key, value in totals.items()}
+        per_plate["calories_kcal"] = int(round(per_plate["calories_kcal"]))
+        nutrition_output = {
+            "agent": "NutritionAgent",
+            "servings": 1,
+            "per_serving": per_plate,
+            "assumptions": [
+                "Plate total: each dish's per-serving estimate weighted by its estimated portion.",
+            ] + (["Dishes that failed are not counted."] if any("error" in entry for entry in breakdown) else []),
+            "source": "plate_total",
+        }
+        commerce_output = {
+            "agent": "CommerceAgent",
+            "status": "skipped",
+            "message": "Commerce lookup is not available for multi-dish plates.",
+        }
+        self.state.trace.update({
+            "PlateDishes": breakdown,
+            "NutritionAgent": nutrition_output,
+            "CommerceAgent": commerce_output,
+            "Breakers": breaker_stats(),
+            "Degraded": degraded,
+        })
+        self.persist_trace()
+        return {
+            "mode": "plate",
+            "dish": plate_output.get("candidates", []),
+            "dishes": breakdown,
+            "nutrition": nutrition_output,
+            "commerce": commerce_output,
+            "degraded": degraded,
+        }
+
+    def persist_trace(self) -> None:
+        """Hand the trace to the background trace log (never blocks on disk I/O)."""
+        if not trace_log_enabled():
+            return
+        get_trace_log().submit(
+            self.state.request_id,
+            self.state.trace,
+            session_id=self.state.session_id,
+            priority=self.state.priority,
+            text_prompt=self.state.text_prompt,
+            image_ref=self.state.image_ref,
+        )
+
+    def _build_dish(
+        self,
+        dish: str,
+        servings: int,
+        variant: str,
+        style: str,
+        suffix: str = "",
+    ) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any], Dict[str, str]]:
+        """Ingredients, recipe and nutrition for one dish; stage names get ``suffix``."""
+        ingredient_output = self._run_stage(f"IngredientAgent{suffix}", build_ingredients, dish, servings, variant, style)
+
+        # Under a deadline, optional work is dropped or done locally rather than overrunning:
+        # the recipe is skipped and nutrition falls back to the local table.
+        degraded: Dict[str, str] = {}
+        recipe_output = None
+        if not self._budget_below("DEADLINE_RECIPE_MIN_SECS", 8):
+            try:
+                recipe_output = self._run_stage(f"RecipeAgent{suffix}", build_recipe, ingredient_output, style)
+            except DeadlineExceeded:
+                pass
+        if recipe_output is None:
+            degraded["recipe"] = "skipped"
+            recipe_output = {
+                "agent": "RecipeAgent",
+                "status": "skipped",
+                "dish": ingredient_output.get("dish", dish),
+                "ingredients_used": len(ingredient_output.get("ingredients", [])),
+                "time_minutes": None,
+                "style": style,
+                "steps": [],
+                "message": "Recipe skipped to meet the response deadline.",
+            }
+
+        nutrition_output = None
+        if not self._budget_below("DEADLINE_NUTRITION_MIN_SECS", 6):
+            try:
+                nutrition_output = self._run_stage(f"NutritionAgent{suffix}", estimate_nutrition, ingredient_output)
+            except DeadlineExceeded:
+                pass
+        if nutrition_output is None:
+            degraded["nutrition"] = "local_estimate"
+            nutrition_output = self._run_stage(f"NutritionAgent{suffix}", estimate_nutrition_local, ingredient_output)
+        self._add_interval(nutrition_output, ingredient_output)
+        return ingredient_output, recipe_output, nutrition_output, degraded
+
+    def _add_interval(self, nutrition_output: Dict[str, Any], ingredient_output: Dict[str, Any]) -> None:
+        """Attach the quantity-range uncertainty band (local, a few ms) to a nutrition result."""
+        if os.getenv("NUTRITION_INTERVALS_ENABLED", "true").lower() != "true":
+            return
+        interval = nutrition_interval(ingredient_output, anchor=nutrition_output.get("per_serving"))
+        if interval is not None:
+            nutrition_output["interval"] = interval
+        else:
+            nutrition_output.pop("interval", None)
+
+    def _budget_below(self, env_name: str, default_secs: float) -> bool:
+        if self.state.deadline is None:
+            return False
+        return self.state.deadline - time.time() < float(os.getenv(env_name, str(default_secs)))
+
+    def rescale_outputs(self, final_output: Dict[str, Any], servings: int, style: str) -> Dict[str, Any]:
+        """Rescale a composed result to new servings/style locally, without any LLM call.
+
+        Ingredient quantities scale linearly; per-serving nutrition only changes with the
+        restaurant-style uplift. The recipe is kept as is.
+        """
+        ingredient_output = final_output["ingredients"]
+        table = IngredientTable.from_output(ingredient_output)
+        old_servings, old_style = table.servings, table.style
+        scaled = table.rescale(servings, style).to_output()
+
+        nutrition_output = dict(final_output["nutrition"])
+        uplift = sum(RESTAURANT_UPLIFT) / 2
+        factor = 1.0
+        if old_style != scaled["style"]:
+            factor = uplift if scaled["style"] == "restaurant-style" else 1 / uplift
+        per_serving = dict(nutrition_output.get("per_serving") or {})
+        for key, value in per_serving.items():
+            if isinstance(value, (int, float)):
+                per_serving[key] = int(round(value * factor)) if key == "calories_kcal" else round(value * factor, 1)
+        nutrition_output["per_serving"] = per_serving
+        nutrition_output["servings"] = scaled["servings_assumption"]
+        nutrition_output["assumptions"] = list(nutrition_output.get("assumptions") or []) + [
+            f"Rescaled locally from {old_servings} servings ({old_style}) to "
+            f"{scaled['servings_assumption']} servings ({scaled['style']})."
+        ]
+        self._add_interval(nutrition_output, scaled)
+
+        self.state.trace.update({"IngredientAgent": scaled, "NutritionAgent": nutrition_output})
+        return {**final_output, "ingredients": scaled, "nutrition": nutrition_output}
 
     def _resolve_servings(self, interpreter_output: Dict[str, Any]) -> int:
         answers = self.state.clarifications
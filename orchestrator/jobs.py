@@ -0,0 +1,92 @@
+import time
+from typing import Any, Callable, Dict, Optional
+
+from orchestrator.coordinator import Coordinator, CoordinatorState
+from orchestrator.pipeline import analyze_state
+from utils.blobstore import get_blob_store, is_blob_ref
+from utils.deadline import DeadlineExceeded
+from utils.jobqueue import JobQueue, get_job_queue
+
+# Job kinds: the whole non-interactive flow, or only the output build after clarification.
+ANALYZE = "analyze"
+BUILD = "build"
+
+# CoordinatorState fields carried in a job payload; the first group determines the result.
+_INPUT_FIELDS = ("text_prompt", "image_meta", "image_ref", "preferences", "clarifications", "plate_mode")
+_CONTEXT_FIELDS = ("session_id", "request_id", "priority")
+
+
+def _budget(state: CoordinatorState) -> Optional[float]:
+    # Jobs carry the remaining time budget, not the absolute deadline: the clock starts
+    # when a worker claims the job, so time spent queued doesn't expire it.
+    return None if state.deadline is None else max(0.0, state.deadline - time.time())
+
+
+def _state_payload(state: CoordinatorState) -> Dict[str, Any]:
+    return {name: getattr(state, name) for name in _INPUT_FIELDS + _CONTEXT_FIELDS}
+
+
+def _inputs(state: CoordinatorState, **extra: Any) -> Dict[str, Any]:
+    # A result built under a short budget may be degraded, so the budget is part of the key.
+    budget = _budget(state)
+    return {
+        **{name: getattr(state, name) for name in _INPUT_FIELDS},
+        "budget_secs": None if budget is None else round(budget),
+        **extra,
+    }
+
+
+def _share_image(state: CoordinatorState) -> None:
+    # Workers are separate processes; they read the image from the blob store's disk tier.
+    if is_blob_ref(state.image_ref):
+        get_blob_store().persist(state.image_ref)
+
+
+def submit_analysis(state: CoordinatorState, queue: Optional[JobQueue] = None) -> str:
+    """Queue the full flow (default clarification answers) for ``state``; returns the job id."""
+    _share_image(state)
+    payload = {"state": _state_payload(state), "budget_secs": _budget(state)}
+    return (queue or get_job_queue()).submit(ANALYZE, payload, _inputs(state))
+
+
+def submit_build(
+    state: CoordinatorState,
+    interpreter_output: Dict[str, Any],
+    queue: Optional[JobQueue] = None,
+) -> str:
+    """Queue apply_clarifications + build_outputs for an already interpreted input."""
+    _share_image(state)
+    payload = {
+        "state": _state_payload(state),
+        "budget_secs": _budget(state),
+        "interpreter_output": interpreter_output,
+        "trace": state.trace,
+    }
+    return (queue or get_job_queue()).submit(BUILD, payload, _inputs(state, interpreter_output=interpreter_output))
+
+
+def run_job(job: Dict[str, Any], on_stage: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """Execute a claimed job; returns {"output", "trace"} like orchestrator.pipeline.analyze."""
+    payload = job["payload"]
+    budget = payload.get("budget_secs")
+    state = CoordinatorState(
+        **payload["state"],
+        deadline=None if budget is None else time.time() + budget,
+        trace=dict(payload.get("trace") or {}),
+        on_stage=on_stage,
+    )
+    if job["kind"] == ANALYZE:
+        clarifications, state.clarifications = state.clarifications, {}
+        return analyze_state(state, clarifications)
+    if job["kind"] == BUILD:
+        coordinator = Coordinator(state)
+        interpreter_output = payload["interpreter_output"]
+        if state.clarifications:
+            interpreter_output = coordinator.apply_clarifications(interpreter_output)
+        return {"output": coordinator.build_outputs(interpreter_output), "trace": state.trace}
+    raise ValueError(f"Unknown job kind: {job['kind']}")
+
+
+def is_retryable(exc: BaseException) -> bool:
+    # A spent time budget or a malformed job will not succeed on a second attempt.
+    return not isinstance(exc, (DeadlineExceeded, ValueError, KeyError, TypeError))
@@ -1,23 +1,86 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 from orchestrator.coordinator import Coordinator, CoordinatorState
+from utils.deadline import deadline_after
 
 
 def run_interpreter(
     text_prompt: str,
     image_meta: Optional[Dict[str, Any]],
-    image_data_url: Optional[str],
+    image_ref: Optional[str],
 ) -> Dict[str, Any]:
     coordinator = Coordinator(
         CoordinatorState(
             text_prompt=text_prompt,
             image_meta=image_meta,
-            image_data_url=image_data_url,
+            image_ref=image_ref,
         )
     )
     return coordinator.run_interpreter()
 
 
+def default_answers(questions: List[Dict[str, Any]], interpreter_output: Dict[str, Any], text_prompt: str) -> Dict[str, str]:
+    """Non-interactive answers to clarification questions: keep the top candidate and preferences."""
+    candidates = interpreter_output.get("candidates") or []
+    answers = {}
+    for question in questions:
+        qid = question.get("id")
+        if qid == "dish_choice" and candidates:
+            answers[qid] = candidates[0]["dish"]
+        elif qid == "dish_description" and text_prompt:
+            answers[qid] = text_prompt
+        elif qid == "diet_conflict":
+            answers[qid] = "keep veg"
+    return answers
+
+
+def analyze(
+    text_prompt: str = "",
+    image_meta: Optional[Dict[str, Any]] = None,
+    image_ref: Optional[str] = None,
+    preferences: Optional[Dict[str, Any]] = None,
+    clarifications: Optional[Dict[str, Any]] = None,
+    deadline_secs: Optional[float] = None,
+    priority: str = "interactive",
+    session_id: str = "",
+    plate_mode: bool = False,
+) -> Dict[str, Any]:
+    """Run the whole flow in one call (for scripts and API layers); returns {"request_id", "output", "trace"}.
+
+    Clarification questions not covered by ``clarifications`` are answered with
+    default_answers. ``deadline_secs`` bounds the whole call; see Coordinator.build_outputs
+    for how results degrade when it runs short.
+    """
+    state = CoordinatorState(
+        text_prompt=text_prompt or "",
+        image_meta=image_meta,
+        image_ref=image_ref,
+        preferences=preferences or {},
+        session_id=session_id,
+        priority=priority,
+        deadline=deadline_after(deadline_secs),
+        plate_mode=plate_mode,
+    )
+    return analyze_state(state, clarifications)
+
+
+def analyze_state(state: CoordinatorState, clarifications: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """analyze() for a ready-made CoordinatorState (e.g. one rebuilt from a queued job)."""
+    coordinator = Coordinator(state)
+    # One in-flight request across all stages, rather than one per entry point.
+    with coordinator.serving():
+        interpreter_output = coordinator.run_interpreter()
+        clarifier_output = coordinator.run_clarifier(interpreter_output)
+        state.clarifications = {
+            **default_answers(clarifier_output.get("questions", []), interpreter_output, state.text_prompt),
+            **(clarifications or {}),
+        }
+        if state.clarifications:
+            interpreter_output = coordinator.apply_clarifications(interpreter_output)
+        output = coordinator.build_outputs(interpreter_output)
+    return {"request_id": state.request_id, "output": output, "trace": state.trace}
+
+
 def run_clarifier(interpreter_output: Dict[str, Any], preferences: Dict[str, Any]) -> Dict[str, Any]:
     coordinator = Coordinator(CoordinatorState(preferences=preferences))
     return coordinator.run_clarifier(interpreter_output)
@@ -0,0 +1,132 @@
+"""Analyze a batch of dish prompts non-interactively.
+
+Usage:
+    python scripts/batch_run.py inputs.jsonl [--out results.jsonl] [--workers 4] [--deadline-secs 20]
+        [--export exports/]
+
+Each input line is a JSON object: {"text": "...", "image_path": "...", "servings": 2,
+"style": "home-style", "diet": "veg", "deadline_secs": 15, "plate": false} (all optional
+except one of text/image_path). "image_paths": [...] (several photos or a short clip) is
+reduced to the best distinct frame(s) first. Clarification questions get default answers.
+Requests run at batch priority so interactive sessions keep their share of the LLM rate
+limit. One JSON line per input is written: {"index", "input", "request_id", "output", "trace"}
+or {"index", "input", "error"}. With --export, results are also appended to the columnar
+tables of scripts/export_results.py as they complete.
+"""
+
+import argparse
+import json
+import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from dotenv import load_dotenv
+
+from orchestrator.pipeline import analyze
+from utils.export import ResultExporter
+from utils.imaging import ingest_media
+from utils.io import safe_open_image
+from utils.metrics import metrics_enabled, start_metrics_server
+
+
+def _iter_inputs(path: Path) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    with open(path, "r", encoding="utf-8") as handle:
+        for index, line in enumerate(line for line in handle if line.strip()):
+            yield index, json.loads(line)
+
+
+def run_one(index: int, item: Dict[str, Any], default_deadline: float) -> Dict[str, Any]:
+    image_meta = image_ref = None
+    try:
+        if item.get("image_path"):
+            with open(item["image_path"], "rb") as handle:
+                image = safe_open_image(handle)
+            if not image["ok"]:
+                raise ValueError(f"Invalid image {item['image_path']}: {image['error']}")
+            image_meta, image_ref = image["meta"], image["image_ref"]
+        elif item.get("image_paths"):
+            image = ingest_media([(path, Path(path).read_bytes()) for path in item["image_paths"]])
+            if not image["ok"]:
+                raise ValueError(f"Invalid media {item['image_paths']}: {image['error']}")
+            image_meta, image_ref = image["meta"], image["image_ref"]
+        result = analyze(
+            text_prompt=item.get("text", ""),
+            image_meta=image_meta,
+            image_ref=image_ref,
+            preferences={
+                "diet": item.get("diet", "veg"),
+                "servings": item.get("servings"),
+                "style": item.get("style", "home-style"),
+            },
+            clarifications=item.get("clarifications"),
+            deadline_secs=item.get("deadline_secs", default_deadline),
+            priority="batch",
+            session_id=f"batch-{uuid.uuid4().hex[:8]}",
+            plate_mode=bool(item.get("plate")),
+        )
+        return {"index": index, "input": item, **result}
+    except Exception as exc:
+        return {"index": index, "input": item, "error": f"{type(exc).__name__}: {exc}"}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", type=Path)
+    parser.add_argument("--out", type=Path, help="results JSONL (default: stdout)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--deadline-secs", type=float, default=0, help="per-item time budget (0 = none)")
+    parser.add_argument("--export", type=Path, help="also append results to columnar tables in this directory")
+    args = parser.parse_args()
+
+    load_dotenv(ROOT_DIR / ".env")
+    if metrics_enabled():
+        start_metrics_server()
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    exporter = ResultExporter(args.export) if args.export else None
+    write_lock = threading.Lock()
+    failed = 0
+
+    def handle(index: int, item: Dict[str, Any]) -> None:
+        nonlocal failed
+        ok = False
+        try:
+            record = run_one(index, item, args.deadline_secs)
+            with write_lock:
+                out.write(json.dumps(record, default=str) + "\n")
+                out.flush()
+            if exporter is not None:
+                exporter.add(record)
+            ok = "error" not in record
+        except Exception as exc:
+            # Writing or exporting failed; the pool would drop the exception silently.
+            print(f"Item {index} failed: {type(exc).__name__}: {exc}", file=sys.stderr)
+        if not ok:
+            with write_lock:
+                failed += 1
+
+    # Only a small window of items is in flight, so large input files are streamed rather
+    # than parsed and queued in the pool up front.
+    window = threading.BoundedSemaphore(max(1, args.workers) * 2)
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            for index, item in _iter_inputs(args.inputs):
+                window.acquire()
+                future = pool.submit(handle, index, item)
+                future.add_done_callback(lambda _: window.release())
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if exporter is not None:
+            exporter.close()
+    print(f"Done ({failed} failed).", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
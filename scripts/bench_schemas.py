@@ -0,0 +1,123 @@
+"""Measure per-call output validation overhead: legacy agent fix-ups vs the schema registry.
+
+Usage:
+    python scripts/bench_schemas.py [--iterations 20000]
+
+The legacy path mirrors what agents did before the registry: json.loads, model_validate,
+model_dump and hand-written normalization on the resulting dict. The registry path is a
+single TypeAdapter.validate_json over the raw bytes with declarative rules.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from agents.ingredient import IngredientOutput
+from agents.nutrition import NutritionOutput
+from agents.recipe import RecipeOutput
+from utils.schemas import get_schema
+
+INGREDIENT_RAW = json.dumps({
+    "agent": "IngredientAgent",
+    "dish": "Veg Biryani",
+    "servings_assumption": 2,
+    "variant": "veg",
+    "style": "home-style",
+    "ingredients": [{"item": f"item {i}", "quantity_range": "120-160", "unit": "g"} for i in range(10)],
+}).encode("utf-8")
+NUTRITION_RAW = json.dumps({
+    "agent": "NutritionAgent",
+    "servings": 2,
+    "per_serving": {"calories_kcal": 420, "protein_g": 18.0, "carbs_g": 55.0, "fat_g": 12.0},
+    "assumptions": ["Midpoints used."],
+}).encode("utf-8")
+RECIPE_RAW = json.dumps({
+    "agent": "RecipeAgent",
+    "dish": "Veg Biryani",
+    "ingredients_used": 10,
+    "time_minutes": 40,
+    "style": "home-style",
+    "steps": [f"Step {i}" for i in range(6)],
+}).encode("utf-8")
+
+CONTEXTS = {
+    "ingredient": {"dish": "Veg Biryani", "servings": 2, "variant": "veg", "style": "home-style"},
+    "nutrition": {"servings": 2},
+    "recipe": {"dish": "Veg Biryani", "style": "home-style", "ingredients_used": 10},
+}
+
+
+def _legacy_ingredient(raw: bytes) -> Dict[str, Any]:
+    data = IngredientOutput.model_validate(json.loads(raw)).model_dump()
+    for key, value in (("servings_assumption", 2), ("variant", "veg"), ("style", "home-style"), ("dish", "Veg Biryani")):
+        if key not in data:
+            data[key] = value
+    if "ingredients" not in data and "ingredients_list" in data:
+        data["ingredients"] = data.pop("ingredients_list")
+    data["agent"] = "IngredientAgent"
+    return data
+
+
+def _legacy_nutrition(raw: bytes) -> Dict[str, Any]:
+    data = NutritionOutput.model_validate(json.loads(raw)).model_dump()
+    if "servings" not in data:
+        data["servings"] = 2
+    if not isinstance(data.get("per_serving"), dict):
+        data["per_serving"] = {}
+    for key, value in (("calories_kcal", 0), ("protein_g", 0.0), ("carbs_g", 0.0), ("fat_g", 0.0)):
+        data["per_serving"].setdefault(key, value)
+    if not isinstance(data.get("assumptions"), list):
+        data["assumptions"] = []
+    data["agent"] = "NutritionAgent"
+    return data
+
+
+def _legacy_recipe(raw: bytes) -> Dict[str, Any]:
+    data = RecipeOutput.model_validate(json.loads(raw)).model_dump()
+    if "recipe" in data and isinstance(data["recipe"], dict):
+        data.pop("recipe")
+    for key, value in (("dish", "Veg Biryani"), ("steps", []), ("time_minutes", 25)):
+        if key not in data:
+            data[key] = value
+    data["ingredients_used"] = 10
+    data["style"] = "home-style"
+    data["agent"] = "RecipeAgent"
+    return data
+
+
+def _time(fn: Callable[[], Any], iterations: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    cases = [
+        ("ingredient", INGREDIENT_RAW, _legacy_ingredient, IngredientOutput),
+        ("nutrition", NUTRITION_RAW, _legacy_nutrition, NutritionOutput),
+        ("recipe", RECIPE_RAW, _legacy_recipe, RecipeOutput),
+    ]
+    print(f"{'agent':<12}{'legacy us':>12}{'registry us':>14}{'speedup':>10}")
+    for name, raw, legacy, model_cls in cases:
+        spec = get_schema(model_cls)
+        context = CONTEXTS[name]
+        legacy_us = _time(lambda: legacy(raw), args.iterations)
+        registry_us = _time(lambda: spec.validate_json(raw, context), args.iterations)
+        print(f"{name:<12}{legacy_us:>12.2f}{registry_us:>14.2f}{legacy_us / registry_us:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Export past analyses to columnar tables for analytics.
+
+Usage:
+    python scripts/export_results.py [results.jsonl ...] [--trace-log .traces] --out exports/
+        [--format auto|parquet|arrow|csv] [--row-group 10000] [--full]
+
+Inputs are scripts/batch_run.py result files and/or the trace log directory. Each analysis
+is flattened into four tables: analyses (one row per request), candidates, ingredients and
+stages. They are written as Parquet or Arrow IPC part files (needs pyarrow) or appended to CSV.
+Runs are incremental: read positions are kept in <out>/_export_state.json, so a re-run
+only exports what was added since (--full starts over).
+"""
+
+import argparse
+import gzip
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterator
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from utils.export import TABLES, ResultExporter
+from utils.trace_log import INDEX_NAME
+
+STATE_NAME = "_export_state.json"
+
+
+def _iter_jsonl(path: Path, state: Dict[str, int]) -> Iterator[Dict[str, Any]]:
+    """New complete lines of a growing JSONL file, from the saved byte offset."""
+    key = str(path.resolve())
+    offset = state.get(key, 0)
+    if path.stat().st_size < offset:
+        offset = 0  # truncated or replaced
+    with open(path, "rb") as handle:
+        handle.seek(offset)
+        for line in handle:
+            if not line.endswith(b"\n"):
+                break  # still being written
+            offset += len(line)
+            state[key] = offset
+            if line.strip():
+                yield json.loads(line)
+
+
+def _iter_trace_log(directory: Path, state: Dict[str, int]) -> Iterator[Dict[str, Any]]:
+    """Records of gzip members not exported yet, found through the trace log index."""
+    members = set()
+    try:
+        with open(directory / INDEX_NAME, "r", encoding="utf-8") as handle:
+            for line in handle:
+                entry = json.loads(line)
+                if entry["offset"] >= state.get(entry["segment"], 0):
+                    members.add((entry["segment"], entry["offset"], entry["length"]))
+    except FileNotFoundError:
+        return
+    for segment, offset, length in sorted(members):
+        try:
+            with open(directory / segment, "rb") as handle:
+                handle.seek(offset)
+                member = handle.read(length)
+        except FileNotFoundError:
+            continue  # rotated away
+        for line in gzip.decompress(member).splitlines():
+            if line.strip():
+                yield json.loads(line)
+        state[segment] = offset + length
+    # Forget segments the trace log has deleted.
+    for segment in [name for name in state if not (directory / name).exists()]:
+        del state[segment]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="*", type=Path, help="batch_run.py result JSONL files")
+    parser.add_argument("--trace-log", type=Path, help="trace log directory (TRACE_LOG_DIR)")
+    parser.add_argument("--out", type=Path, required=True)
+    parser.add_argument("--format", default="auto", choices=["auto", "parquet", "arrow", "csv"])
+    parser.add_argument("--row-group", type=int, default=10_000, help="rows per written row group")
+    parser.add_argument("--full", action="store_true", help="ignore saved positions and export everything")
+    args = parser.parse_args()
+    if not args.inputs and not args.trace_log:
+        parser.error("give result files and/or --trace-log")
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    state_path = args.out / STATE_NAME
+    if args.full:
+        for name in TABLES:
+            (args.out / f"{name}.csv").unlink(missing_ok=True)
+            for part in (args.out / name).glob("part-*"):
+                part.unlink()
+    state = {} if args.full or not state_path.exists() else json.loads(state_path.read_text(encoding="utf-8"))
+    files_state = state.setdefault("files", {})
+    trace_state = state.setdefault("trace_log", {})
+
+    with ResultExporter(args.out, format=args.format, row_group_size=args.row_group) as exporter:
+        for path in args.inputs:
+            exporter.add_many(_iter_jsonl(path, files_state))
+        if args.trace_log:
+            exporter.add_many(_iter_trace_log(args.trace_log, trace_state))
+    # Positions are saved only after the tables are closed, so a crash re-exports instead of skipping.
+    tmp = state_path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    tmp.replace(state_path)
+    print(f"Exported {exporter.records} analyses to {args.out} ({exporter.format}).", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Run queued analysis jobs from the SQLite job queue on a pool of worker processes.
+
+Usage:
+    python scripts/job_worker.py [--workers 4] [--poll-secs 0.5] [--db .jobs/jobs.db]
+
+Clients (the UI with JOBS_ENABLED=true, or orchestrator.jobs.submit_analysis/submit_build)
+enqueue jobs; each worker process claims one at a time, runs its Coordinator stages and
+records every stage completion as a job event. A worker heartbeats its lease while a job
+runs, so a crashed worker's job is picked up again after JOBS_VISIBILITY_SECS. Failures
+are retried with backoff up to JOBS_MAX_ATTEMPTS, then moved to the dead_letter table.
+Throughput scales with --workers independently of the web tier.
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from dotenv import load_dotenv
+
+from orchestrator.jobs import is_retryable, run_job
+from utils.jobqueue import JobQueue, get_job_queue
+
+
+def _heartbeat(queue: JobQueue, job_id: str, worker: str, stop: threading.Event) -> None:
+    while not stop.wait(queue.visibility / 3):
+        if not queue.heartbeat(job_id, worker):
+            return
+
+
+def _process_one(queue: JobQueue, job: Dict[str, Any], worker: str) -> None:
+    def on_stage(name: str, stage: Dict[str, Any]) -> None:
+        event = {"latency_ms": stage["latency_ms"]}
+        if stage.get("error"):
+            event["error"] = stage["error"]
+        queue.add_event(job["id"], name, event, worker)
+
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(queue, job["id"], worker, stop), daemon=True)
+    beat.start()
+    try:
+        result = run_job(job, on_stage)
+    except Exception as exc:
+        status = queue.fail(job["id"], worker, f"{type(exc).__name__}: {exc}", retryable=is_retryable(exc))
+        print(f"[{worker}] job {job['id']} attempt {job['attempt']} failed ({status}): {exc}", file=sys.stderr)
+    else:
+        queue.complete(job["id"], worker, result)
+    finally:
+        stop.set()
+
+
+def worker_loop(index: int, db: str, poll_secs: float) -> None:
+    load_dotenv(ROOT_DIR / ".env")
+    if db:
+        os.environ["JOBS_DB"] = db
+    queue = get_job_queue()
+    worker = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    while True:
+        job = queue.claim(worker)
+        if job is None:
+            time.sleep(poll_secs)
+            continue
+        _process_one(queue, job, worker)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4, help="worker processes")
+    parser.add_argument("--poll-secs", type=float, default=0.5, help="idle wait between claim attempts")
+    parser.add_argument("--db", default="", help="job database (default: JOBS_DB or .jobs/jobs.db)")
+    args = parser.parse_args()
+
+    processes = [
+        multiprocessing.Process(target=worker_loop, args=(index, args.db, args.poll_secs), name=f"eatsense-worker-{index}")
+        for index in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    print(f"Started {len(processes)} workers.", file=sys.stderr)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""Simulate concurrent users running the full analysis flow and report latency percentiles.
+
+Usage:
+    python scripts/loadtest.py --users 20 --duration 60 [--mode closed|open] [--rate 5]
+        [--latency-ms 400 --jitter-ms 150 --error-rate 0.02] [--base-url URL] [--out run.json]
+
+Each simulated user runs run_interpreter -> run_clarifier -> apply_clarifications ->
+build_outputs on an in-process Coordinator. Unless --base-url is given, LLM calls go to a
+local fake OpenAI-compatible server that answers every agent schema after an injected delay
+and fails a configurable fraction of requests.
+
+closed: --users workers loop back-to-back (with --think-ms between flows).
+open:   flows arrive as a Poisson process at --rate per second regardless of completions
+        (at most --users in flight); latency is measured from the scheduled arrival so
+        queueing delay is not hidden.
+
+The JSON report has per-stage and end-to-end p50/p95/p99, throughput, error rates and
+peak RSS, so runs can be diffed.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import resource
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from orchestrator.coordinator import Coordinator, CoordinatorState
+
+PROMPTS = [
+    "veg biryani for 2", "paneer butter masala", "masala dosa", "chole bhature for 3",
+    "egg fried rice", "chicken curry home style", "rajma chawal", "aloo paratha for 4",
+    "pav bhaji", "idli sambar", "dal makhani", "vegetable pulao",
+]
+
+_USER_TEXT = re.compile(r"User text: (.*)")
+
+
+def _fake_output(schema: str, prompt: str) -> Dict[str, Any]:
+    dish = (prompt or "Mixed Dish").split(" for ")[0].strip().title()
+    if schema == "InterpreterOutput":
+        return {
+            "agent": "InterpreterAgent",
+            "input_type": "text",
+            "candidates": [
+                {"dish": dish, "confidence": 0.82, "cues": ["text"]},
+                {"dish": "Mixed Dish", "confidence": 0.2, "cues": ["fallback"]},
+            ],
+            "cues": {"variant": [], "image_present": False, "text_present": True, "image_quality": "no_image", "uncertainty_reasons": []},
+            "servings_guess": None,
+        }
+    if schema == "ClarificationOutput":
+        return {"agent": "ClarificationGatekeeper", "needs_clarification": False, "questions": [], "reason": "clear"}
+    if schema == "IngredientOutput":
+        return {
+            "agent": "IngredientAgent", "dish": dish, "servings_assumption": 1, "variant": "veg", "style": "home-style",
+            "ingredients": [{"item": f"ingredient {i}", "quantity_range": "50-80", "unit": "g"} for i in range(8)],
+        }
+    if schema == "NutritionOutput":
+        return {
+            "agent": "NutritionAgent", "servings": 1,
+            "per_serving": {"calories_kcal": 420, "protein_g": 14.0, "carbs_g": 55.0, "fat_g": 15.0},
+            "assumptions": ["Load-test fixture."],
+        }
+    if schema == "RecipeOutput":
+        return {
+            "agent": "RecipeAgent", "dish": dish, "ingredients_used": 8, "time_minutes": 30, "style": "home-style",
+            "steps": [f"Step {i}" for i in range(1, 7)],
+        }
+    return {}
+
+
+def start_fake_server(latency_ms: float, jitter_ms: float, error_rate: float) -> ThreadingHTTPServer:
+    counts: Counter = Counter()
+    counts_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:  # noqa: N802 - http.server API
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            time.sleep(max(0.0, random.gauss(latency_ms, jitter_ms)) / 1000)
+            failed = random.random() < error_rate
+            with counts_lock:
+                counts["requests"] += 1
+                counts["injected_errors"] += int(failed)
+            if failed:
+                self._reply(500, {"error": {"message": "injected failure", "type": "server_error"}})
+                return
+            fmt = body.get("response_format") or {}
+            schema = (fmt.get("json_schema") or {}).get("name", "")
+            user = next((m["content"] for m in body.get("messages", []) if m.get("role") == "user"), "")
+            text = user if isinstance(user, str) else " ".join(p.get("text", "") for p in user if isinstance(p, dict))
+            match = _USER_TEXT.search(text)
+            content = json.dumps(_fake_output(schema, match.group(1) if match else ""))
+            self._reply(200, {
+                "id": "chatcmpl-loadtest",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": 300, "completion_tokens": 200, "total_tokens": 500},
+            })
+
+        def _reply(self, status: int, payload: Dict[str, Any]) -> None:
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.counts = counts  # type: ignore[attr-defined]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _answer(question_id: str, interpreter_output: Dict[str, Any], prompt: str) -> str:
+    if question_id == "dish_choice":
+        return interpreter_output["candidates"][0]["dish"]
+    if question_id == "dish_description":
+        return prompt
+    if question_id == "diet_conflict":
+        return "keep vegetarian"
+    if question_id == "variant":
+        return "veg"
+    return ""
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.completed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def flow(self, prompt: str, session_id: str, scheduled: Optional[float] = None) -> None:
+        started = scheduled if scheduled is not None else time.perf_counter()
+        state = CoordinatorState(
+            text_prompt=prompt,
+            preferences={"diet": "veg", "servings": None, "style": "home-style"},
+            session_id=session_id,
+        )
+        coordinator = Coordinator(state)
+        error = None
+        try:
+            interpreter_output = coordinator.run_interpreter()
+            clarification = coordinator.run_clarifier(interpreter_output)
+            state.clarifications = {
+                q["id"]: _answer(q["id"], interpreter_output, prompt) for q in clarification.get("questions", [])
+            }
+            interpreter_output = coordinator.apply_clarifications(interpreter_output)
+            coordinator.build_outputs(interpreter_output)
+        except Exception as exc:
+            error = type(exc).__name__
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            for name, stage in state.trace.get("Stages", {}).items():
+                self.latencies[name].append(stage["latency_ms"])
+                if stage.get("error"):
+                    self.errors[f"{name}: {stage['error'].split(':', 1)[0]}"] += 1
+            if error:
+                self.failed += 1
+                self.errors[f"flow: {error}"] += 1
+            else:
+                self.completed += 1
+                self.latencies["end_to_end"].append(elapsed_ms)
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    arr = np.asarray(values, dtype=np.float64)
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {
+        "count": int(arr.size),
+        "mean_ms": round(float(arr.mean()), 1),
+        "p50_ms": round(float(p50), 1),
+        "p95_ms": round(float(p95), 1),
+        "p99_ms": round(float(p99), 1),
+        "max_ms": round(float(arr.max()), 1),
+    }
+
+
+def run_closed(recorder: Recorder, users: int, duration: float, think_ms: float) -> None:
+    deadline = time.perf_counter() + duration
+
+    def user_loop(idx: int) -> None:
+        n = 0
+        while time.perf_counter() < deadline:
+            recorder.flow(random.choice(PROMPTS), f"user{idx:04d}-{n}")
+            n += 1
+            if think_ms:
+                time.sleep(random.expovariate(1000 / think_ms))
+
+    threads = [threading.Thread(target=user_loop, args=(i,)) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_open(recorder: Recorder, users: int, duration: float, rate: float) -> None:
+    deadline = time.perf_counter() + duration
+    next_arrival = time.perf_counter()
+    n = 0
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        while next_arrival < deadline:
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(recorder.flow, random.choice(PROMPTS), f"open-{n}", next_arrival)
+            n += 1
+            next_arrival += random.expovariate(rate)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    parser.add_argument("--users", type=int, default=10, help="closed: concurrent users; open: max in flight")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to generate load")
+    parser.add_argument("--rate", type=float, default=5.0, help="open loop: arrivals per second")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="closed loop: mean think time between flows")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="fake server: mean response latency")
+    parser.add_argument("--jitter-ms", type=float, default=100.0, help="fake server: latency std deviation")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fake server: fraction of HTTP 500s")
+    parser.add_argument("--base-url", help="use an existing OpenAI-compatible endpoint instead of the fake server")
+    parser.add_argument("--keep-shortcuts", action="store_true", help="leave local recognizer, catalog and caches on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, help="write the JSON report here (default: stdout)")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    server = None
+    if args.base_url:
+        os.environ["OPENAI_BASE_URL"] = args.base_url
+    else:
+        server = start_fake_server(args.latency_ms, args.jitter_ms, args.error_rate)
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "loadtest")
+    if not args.keep_shortcuts:
+        # Measure the LLM path, not local hits on a small fixed prompt set.
+        for name in ("INTERPRETER_LOCAL_ENABLED", "EATSENSE_CATALOG_ENABLED", "SEMANTIC_CACHE_ENABLED"):
+            os.environ[name] = "false"
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    if args.mode == "closed":
+        run_closed(recorder, args.users, args.duration, args.think_ms)
+    else:
+        run_open(recorder, args.users, args.duration, args.rate)
+    wall = time.perf_counter() - started
+    if server is not None:
+        server.shutdown()
+
+    total = recorder.completed + recorder.failed
+    report = {
+        "config": {key: (str(value) if isinstance(value, Path) else value) for key, value in vars(args).items()},
+        "summary": {
+            "flows": total,
+            "completed": recorder.completed,
+            "failed": recorder.failed,
+            "error_rate": round(recorder.failed / total, 4) if total else 0.0,
+            "throughput_rps": round(recorder.completed / wall, 3) if wall else 0.0,
+            "wall_s": round(wall, 2),
+            # ru_maxrss is KiB on Linux and bytes on macOS.
+            "peak_rss_mb": round(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1
+            ),
+        },
+        "stages": {name: _percentiles(values) for name, values in sorted(recorder.latencies.items()) if values},
+        "errors": dict(recorder.errors.most_common()),
+    }
+    if server is not None:
+        # The OpenAI client retries 5xx responses, so injected errors mostly show up as latency.
+        report["fake_server"] = dict(server.counts)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        args.out.write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
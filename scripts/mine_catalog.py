@@ -0,0 +1,124 @@
+"""Grow the dish catalog offline from recorded agent traces.
+
+Usage:
+    python scripts/mine_catalog.py traces/*.jsonl [--min-count 3] [--out data/dish_catalog.json]
+
+Each input is a JSON trace, a JSON list of traces, or JSONL (optionally gzip-compressed).
+IngredientAgent outputs are normalized to per-serving ranges and aggregated per
+(dish, variant, style); ingredients present in at least half of the samples are kept
+with median ranges. Existing catalog entries are left untouched unless --overwrite.
+"""
+
+import argparse
+import gzip
+import json
+import math
+import statistics
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from agents.catalog import DEFAULT_CATALOG_PATH, DishCatalog, normalize_dish, save_catalog
+from utils.quantities import parse_range
+
+
+def _iter_traces(path: Path) -> Iterator[Dict[str, Any]]:
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt", encoding="utf-8") as handle:
+        text = handle.read()
+    try:
+        data = json.loads(text)
+        records = data if isinstance(data, list) else [data]
+    except json.JSONDecodeError:
+        records = [json.loads(line) for line in text.splitlines() if line.strip()]
+    for record in records:
+        if isinstance(record, dict):
+            yield record.get("trace", record)
+
+
+def mine(paths: List[Path]) -> Dict[Tuple[str, str, str], Dict[str, Any]]:
+    samples: Dict[Tuple[str, str, str], List[Dict[Tuple[str, str], Tuple[float, float]]]] = defaultdict(list)
+    names: Dict[Tuple[str, str, str], str] = {}
+    for path in paths:
+        for trace in _iter_traces(path):
+            output = trace.get("IngredientAgent") or {}
+            if not output.get("ingredients") or output.get("source") == "catalog":
+                continue
+            servings = max(1, int(output.get("servings_assumption") or 1))
+            key = (
+                normalize_dish(output.get("dish", "")),
+                (output.get("variant") or "standard").lower(),
+                (output.get("style") or "home-style").lower(),
+            )
+            items = {}
+            for ingredient in output["ingredients"]:
+                parsed = parse_range(ingredient.get("quantity_range"))
+                if math.isnan(parsed[0]) or not ingredient.get("item"):
+                    continue
+                item_key = (ingredient["item"].strip().lower(), (ingredient.get("unit") or "g").strip().lower())
+                items[item_key] = (parsed[0] / servings, parsed[1] / servings)
+            if items:
+                samples[key].append(items)
+                names.setdefault(key, output.get("dish", key[0]).strip().title())
+
+    mined = {}
+    for key, runs in samples.items():
+        counts: Dict[Tuple[str, str], List[Tuple[float, float]]] = defaultdict(list)
+        for items in runs:
+            for item_key, value in items.items():
+                counts[item_key].append(value)
+        ingredients = []
+        for (item, unit), values in counts.items():
+            if len(values) * 2 < len(runs):
+                continue
+            low = round(statistics.median(v[0] for v in values), 2)
+            high = round(statistics.median(v[1] for v in values), 2)
+            ingredients.append({"item": item, "per_serving": [low, max(low, high)], "unit": unit})
+        mined[key] = {
+            "dish": names[key],
+            "variant": key[1],
+            "style": key[2],
+            "aliases": [],
+            "ingredients": ingredients,
+            "samples": len(runs),
+        }
+    return mined
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("traces", nargs="+", type=Path)
+    parser.add_argument("--out", type=Path, default=DEFAULT_CATALOG_PATH)
+    parser.add_argument("--min-count", type=int, default=3, help="minimum traces per (dish, variant, style)")
+    parser.add_argument("--overwrite", action="store_true", help="replace existing catalog entries")
+    args = parser.parse_args()
+
+    catalog = DishCatalog.load(args.out)
+    entries = list(catalog.entries)
+    added = 0
+    for key, entry in sorted(mine(args.traces).items()):
+        samples = entry.pop("samples")
+        if samples < args.min_count or not entry["ingredients"]:
+            continue
+        existing = (key in catalog) or ((key[0], key[1], "any") in catalog)
+        if existing and not args.overwrite:
+            continue
+        if existing:
+            entries = [
+                e for e in entries
+                if (normalize_dish(e["dish"]), (e.get("variant") or "standard").lower(), (e.get("style") or "any").lower()) != key
+            ]
+        entries.append(entry)
+        added += 1
+        print(f"{entry['dish']} ({key[1]}, {key[2]}): {len(entry['ingredients'])} ingredients from {samples} traces")
+    save_catalog(args.out, entries)
+    print(f"Wrote {len(entries)} entries ({added} mined) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
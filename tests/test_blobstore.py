@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+import utils.blobstore as blobstore
+from utils.blobstore import BlobStore
+
+
+def _blob(n: int, size: int = 100) -> bytes:
+    return bytes([n]) * size
+
+
+def test_lru_eviction_spills_the_oldest_blob_to_disk(tmp_path):
+    store = BlobStore(root=str(tmp_path), memory_limit_bytes=250)
+    first = store.put(_blob(1), "image/png")
+    second = store.put(_blob(2), "image/jpeg")
+    store.get(first)  # touch: ``second`` is now least recently used
+    third = store.put(_blob(3), "image/jpeg")
+
+    assert set(store._memory) == {first, third}
+    assert store._path(second).exists()
+    assert not store._path(first).exists()
+    assert second in store
+
+
+def test_spilled_blob_is_read_back_with_its_mime(tmp_path):
+    store = BlobStore(root=str(tmp_path), memory_limit_bytes=150)
+    first = store.put(_blob(1), "image/png")
+    store.put(_blob(2), "image/jpeg")
+    assert first not in store._memory
+
+    assert store.get(first) == (_blob(1), "image/png")
+    assert first in store._memory
+
+
+def test_spilled_blob_is_readable_from_a_fresh_store(tmp_path):
+    store = BlobStore(root=str(tmp_path), memory_limit_bytes=150)
+    first = store.put(_blob(1), "image/png")
+    store.put(_blob(2), "image/jpeg")
+
+    assert BlobStore(root=str(tmp_path)).get(first) == (_blob(1), "image/png")
+
+
+def _spill(store: BlobStore, count: int) -> list:
+    refs = []
+    for n in range(count):
+        ref = store.put(_blob(n), "image/png")
+        store.persist(ref)
+        os.utime(store._path(ref), (1_000_000 + n, 1_000_000 + n))
+        refs.append(ref)
+    return refs
+
+
+def test_prune_drops_the_oldest_files_over_the_size_limit(tmp_path):
+    store = BlobStore(root=str(tmp_path), disk_limit_bytes=350)
+    refs = _spill(store, 5)  # 5 files of 111 bytes each
+    store._prune_disk()
+
+    assert [store._path(ref).exists() for ref in refs] == [False, False, True, True, True]
+
+
+def test_prune_drops_the_oldest_files_over_the_count_limit(tmp_path):
+    store = BlobStore(root=str(tmp_path), disk_limit_files=2)
+    refs = _spill(store, 5)
+    store._prune_disk()
+
+    assert [store._path(ref).exists() for ref in refs] == [False, False, False, True, True]
+
+
+def test_load_data_url_on_a_missing_ref_asks_for_a_reupload(tmp_path, monkeypatch):
+    monkeypatch.setattr(blobstore, "_store", BlobStore(root=str(tmp_path)))
+    ref = blobstore.store_image_bytes(b"abc", "image/png")
+    assert blobstore.load_data_url(ref) == "data:image/png;base64,YWJj"
+
+    with pytest.raises(RuntimeError, match="re-upload"):
+        blobstore.load_data_url("sha256:" + "0" * 64)
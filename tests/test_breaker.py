@@ -0,0 +1,122 @@
+from types import SimpleNamespace
+
+import pytest
+
+import utils.breaker as breaker_module
+from utils.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(breaker_module, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def _breaker(**overrides):
+    options = dict(window=10, min_calls=4, failure_rate=0.5, cooldown=30.0)
+    options.update(overrides)
+    return CircuitBreaker("test", **options)
+
+
+def _fail(breaker, times=1):
+    for _ in range(times):
+        assert breaker.allow()
+        breaker.record_failure()
+
+
+def test_stays_closed_below_min_calls(clock):
+    breaker = _breaker()
+    _fail(breaker, 3)
+    assert breaker.state == CLOSED
+
+
+def test_opens_at_the_failure_rate_threshold(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.allow()
+        breaker.record_success()
+    _fail(breaker, 2)
+    assert breaker.state == CLOSED  # 2 of 5 failed
+    _fail(breaker)
+    assert breaker.state == OPEN  # 3 of 6 reaches 0.5
+
+
+def test_stays_closed_under_the_failure_rate(clock):
+    breaker = _breaker()
+    for _ in range(8):
+        breaker.allow()
+        breaker.record_success()
+    _fail(breaker, 2)
+    assert breaker.state == CLOSED
+
+
+def test_open_breaker_rejects_until_the_cooldown_ends(clock):
+    breaker = _breaker()
+    _fail(breaker, 4)
+    assert breaker.state == OPEN
+    clock.now += 10
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.check()
+    assert excinfo.value.retry_in == pytest.approx(20.0)
+    assert breaker.snapshot()["rejected"] == 1
+
+    clock.now += 20
+    assert breaker.state == HALF_OPEN
+
+
+def _half_open(clock):
+    breaker = _breaker()
+    _fail(breaker, 4)
+    clock.now += 30
+    return breaker
+
+
+def test_half_open_allows_one_probe(clock):
+    breaker = _half_open(clock)
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes_with_a_fresh_window(clock):
+    breaker = _half_open(clock)
+    breaker.check()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    snapshot = breaker.snapshot()
+    assert (snapshot["calls"], snapshot["failure_rate"]) == (1, 0.0)
+
+
+def test_failed_probe_reopens_for_another_cooldown(clock):
+    breaker = _half_open(clock)
+    breaker.check()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.snapshot()["opens"] == 2
+    clock.now += 29
+    assert breaker.state == OPEN
+    clock.now += 1
+    assert breaker.state == HALF_OPEN
+
+
+def test_released_probe_slot_can_be_reused(clock):
+    breaker = _half_open(clock)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+def test_release_while_closed_records_nothing(clock):
+    breaker = _breaker()
+    breaker.allow()
+    breaker.release()
+    assert breaker.snapshot()["calls"] == 0
@@ -0,0 +1,66 @@
+import pytest
+
+from agents.catalog import DishCatalog, variant_choices
+from utils.quantities import RESTAURANT_UPLIFT
+
+_RICE = [{"item": "rice", "unit": "g", "per_serving": [80, 100]}]
+
+
+@pytest.fixture
+def catalog():
+    return DishCatalog([
+        {"dish": "Biryani", "variant": "veg", "aliases": ["dum biryani"], "ingredients": _RICE},
+        {"dish": "Biryani", "variant": "chicken", "ingredients": _RICE + [{"item": "chicken", "unit": "g", "per_serving": [120, 150]}]},
+        {"dish": "Egg Curry", "variant": "egg", "ingredients": [{"item": "egg", "unit": "pcs", "per_serving": [2, 2]}]},
+        {"dish": "Khichdi", "ingredients": _RICE},
+        {"dish": "Dal Makhani", "variant": "veg", "style": "restaurant-style", "ingredients": _RICE},
+    ])
+
+
+@pytest.mark.parametrize(
+    "diet, expected",
+    [
+        ("Veg", ["veg", "standard"]),
+        ("Egg", ["egg", "veg", "standard"]),
+        ("Non-veg", ["chicken", "egg", "veg", "standard"]),
+        ("non veg", ["chicken", "egg", "veg", "standard"]),
+        ("chicken", ["chicken", "standard"]),
+        ("", ["standard"]),
+    ],
+)
+def test_diets_map_to_catalog_variants(diet, expected):
+    assert variant_choices(diet) == expected
+
+
+@pytest.mark.parametrize(
+    "dish, diet, variant",
+    [
+        ("Biryani", "Non-veg", "chicken"),
+        ("Biryani", "Veg", "veg"),
+        ("dum biryani", "Egg", "veg"),
+        ("Egg Curry", "Non-veg", "egg"),
+        ("Khichdi", "Egg", "standard"),
+    ],
+)
+def test_build_reports_the_variant_that_matched(catalog, dish, diet, variant):
+    built = catalog.build(dish, 2, diet, "home-style")
+    assert built is not None
+    assert built["variant"] == variant
+
+
+def test_no_fallback_across_diets(catalog):
+    assert catalog.build("Egg Curry", 1, "veg", "home-style") is None
+
+
+def test_restaurant_style_applies_the_uplift_once(catalog):
+    home = catalog.build("Biryani", 2, "veg", "Home-style")
+    restaurant = catalog.build("Biryani", 2, "veg", "restaurant style")
+    assert home["ingredients"][0]["quantity_range"] == "160-200"
+    low, high = (float(part) for part in restaurant["ingredients"][0]["quantity_range"].split("-"))
+    assert (low, high) == pytest.approx((160 * RESTAURANT_UPLIFT[0], 200 * RESTAURANT_UPLIFT[1]), abs=0.5)
+    assert restaurant["style"] == "restaurant-style"
+
+
+def test_style_specific_entry_wins(catalog):
+    built = catalog.build("Dal Makhani", 1, "veg", "restaurant-style")
+    assert built["ingredients"][0]["quantity_range"] == "80-100"
@@ -0,0 +1,43 @@
+import anyio
+import pytest
+
+import agents.commerce as commerce
+import utils.breaker as breaker_module
+from utils.deadline import deadline_after, deadline_scope
+
+
+@pytest.fixture
+def slow_server(monkeypatch):
+    monkeypatch.setattr(breaker_module, "_breakers", {})
+
+    async def hang(name, config, dish):
+        await anyio.sleep(5)
+
+    monkeypatch.setattr(commerce, "_call_mcp_server", hang)
+    return {"swiggy": {"type": "http", "url": "http://localhost"}}
+
+
+def _race(servers, timeout, budget_bound=False):
+    return anyio.run(commerce._race_servers, servers, "Dal", timeout, False, budget_bound)
+
+
+def _calls(name="swiggy"):
+    return breaker_module.get_breaker(f"mcp:{name}").snapshot()["calls"]
+
+
+def test_server_timeout_counts_against_its_breaker(slow_server):
+    _, stats = _race(slow_server, 0.05)
+    assert stats["swiggy"]["status"] == "timeout"
+    assert breaker_module.get_breaker("mcp:swiggy").snapshot()["failure_rate"] == 1.0
+
+
+def test_timeout_cut_short_by_the_deadline_is_not_a_failure(slow_server):
+    _, stats = _race(slow_server, 0.05, budget_bound=True)
+    assert stats["swiggy"]["status"] == "timeout"
+    assert _calls() == 0
+
+
+def test_timeout_after_the_deadline_passed_is_not_a_failure(slow_server):
+    with deadline_scope(deadline_after(0.05)):
+        _race(slow_server, 0.1)
+    assert _calls() == 0
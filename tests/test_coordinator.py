@@ -0,0 +1,41 @@
+import orchestrator.coordinator as coordinator_module
+from orchestrator.coordinator import Coordinator, CoordinatorState
+from utils.metrics import REQUESTS_INFLIGHT
+
+
+def _inflight() -> float:
+    return sum(value for _, _, value in REQUESTS_INFLIGHT.samples())
+
+
+def test_entry_points_count_as_in_flight_requests(monkeypatch):
+    seen = []
+
+    def interpret(**kwargs):
+        seen.append(_inflight())
+        return {"candidates": [{"dish": "Dal"}]}
+
+    monkeypatch.setattr(coordinator_module, "interpret", interpret)
+    before = _inflight()
+    Coordinator(CoordinatorState(text_prompt="dal")).run_interpreter()
+
+    assert seen == [before + 1]
+    assert _inflight() == before
+
+
+def test_nested_entry_points_count_once(monkeypatch):
+    seen = []
+
+    def interpret(**kwargs):
+        seen.append(_inflight())
+        return {"candidates": [{"dish": "Dal"}]}
+
+    monkeypatch.setattr(coordinator_module, "interpret", interpret)
+    before = _inflight()
+    coordinator = Coordinator(CoordinatorState(text_prompt="dal"))
+    with coordinator.serving():
+        coordinator.run_interpreter()
+        coordinator.apply_clarifications({"candidates": []})
+        seen.append(_inflight())
+
+    assert seen == [before + 1, before + 1]
+    assert _inflight() == before
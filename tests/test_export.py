@@ -0,0 +1,214 @@
+import csv
+import json
+import sys
+
+import pytest
+
+import scripts.export_results as export_results
+import utils.export as export
+from utils.export import TABLES, ResultExporter, flatten
+from utils.trace_log import TraceLog
+
+
+def _trace(dish="Dal Tadka"):
+    return {
+        "InterpreterAgent": {
+            "input_type": "text",
+            "candidates": [{"dish": dish, "confidence": 0.9}, {"dish": "Dal Fry", "confidence": 0.4}],
+        },
+        "IngredientAgent": {
+            "dish": dish,
+            "servings_assumption": 2,
+            "style": "home-style",
+            "ingredients": [
+                {"item": "toor dal", "quantity_range": "100-120", "unit": "g"},
+                {"item": "ghee", "quantity_range": "1-2", "unit": "tbsp"},
+                {"item": "salt", "quantity_range": "to taste", "unit": ""},
+            ],
+        },
+        "RecipeAgent": {"style": "home-style", "time_minutes": 35},
+        "NutritionAgent": {
+            "servings": 2,
+            "per_serving": {"calories_kcal": 320, "protein_g": 14.0, "carbs_g": 40.0, "fat_g": 10.0},
+            "interval": {"per_serving": {"calories_kcal": {"p10": 280, "median": 320, "p90": 370}}},
+        },
+        "CommerceAgent": {"status": "disabled"},
+        "Degraded": {},
+        "Stages": {
+            "InterpreterAgent": {
+                "latency_ms": 800.0,
+                "events": [{"kind": "llm_request", "tokens": 900}, {"kind": "semantic_cache"}],
+            },
+            "IngredientAgent": {"latency_ms": 1200.0, "events": [{"kind": "llm_request", "tokens": 1500}]},
+            "CommerceAgent": {"latency_ms": 0.5, "events": [], "error": "RuntimeError: boom"},
+        },
+    }
+
+
+def _batch_record(index=0, dish="Dal Tadka"):
+    trace = _trace(dish)
+    return {
+        "index": index,
+        "input": {"text": dish},
+        "request_id": f"req-{index}",
+        "output": {"dish": trace["InterpreterAgent"]["candidates"], "nutrition": trace["NutritionAgent"]},
+        "trace": trace,
+    }
+
+
+def test_batch_record_flattens_into_the_four_tables():
+    rows = flatten(_batch_record())
+    assert set(rows) == set(TABLES)
+
+    (analysis,) = rows["analyses"]
+    assert analysis["request_id"] == "req-0"
+    assert (analysis["mode"], analysis["dish"], analysis["confidence"]) == ("dish", "Dal Tadka", 0.9)
+    assert (analysis["servings"], analysis["ingredients"], analysis["calories_kcal"]) == (2, 3, 320.0)
+    assert (analysis["calories_p10"], analysis["calories_p90"]) == (280.0, 370.0)
+    assert (analysis["recipe_minutes"], analysis["commerce_status"]) == (35.0, "disabled")
+    assert analysis["stages_ms"] == 2000.5
+
+    assert [(c["rank"], c["dish"]) for c in rows["candidates"]] == [(0, "Dal Tadka"), (1, "Dal Fry")]
+    ghee = next(row for row in rows["ingredients"] if row["item"] == "ghee")
+    assert (ghee["quantity_low"], ghee["grams_high"]) == (1.0, pytest.approx(2 * 15 * 0.91))
+    salt = next(row for row in rows["ingredients"] if row["item"] == "salt")
+    assert salt["quantity_low"] is None and salt["grams_low"] is None
+    stages = {row["stage"]: row for row in rows["stages"]}
+    assert (stages["InterpreterAgent"]["llm_requests"], stages["InterpreterAgent"]["tokens"]) == (1, 900)
+    assert stages["CommerceAgent"]["error"] == "RuntimeError: boom"
+
+
+def test_trace_log_record_flattens_like_a_batch_record():
+    record = {"request_id": "req-1", "ts": 1700000000.0, "session_id": "s1", "priority": "interactive",
+              "trace": _trace()}
+    (analysis,) = flatten(record)["analyses"]
+    assert (analysis["request_id"], analysis["session_id"], analysis["ts"]) == ("req-1", "s1", 1700000000.0)
+    assert analysis["dish"] == "Dal Tadka"
+    assert len(flatten(record)["ingredients"]) == 3
+
+
+def test_record_without_request_id_gets_a_stable_id():
+    record = {"index": 3, "input": {"text": "dal"}, "error": "ValueError: no dish"}
+    first, second = flatten(record)["analyses"][0], flatten(dict(record))["analyses"][0]
+    assert first["request_id"] == second["request_id"]
+    assert first["request_id"].startswith("input-")
+    assert first["error"] == "ValueError: no dish"
+
+
+def test_plate_record_has_one_ingredient_block_per_dish():
+    trace = _trace()
+    plate = [
+        {"dish": "Dal Tadka", "portion_servings": 1.0, "ingredients": trace["IngredientAgent"]},
+        {"dish": "Jeera Rice", "portion_servings": 1.0, "ingredients": {
+            "ingredients": [{"item": "basmati rice", "quantity_range": "80-100", "unit": "g"}]}},
+        {"dish": "Papad", "portion_servings": 0.5, "error": "RuntimeError: failed"},
+    ]
+    trace.update({"PlateDishes": plate, "NutritionAgent": {"per_serving": {"calories_kcal": 700}, "source": "plate_total"}})
+    rows = flatten({"request_id": "plate-1", "trace": trace})
+
+    (analysis,) = rows["analyses"]
+    assert (analysis["mode"], analysis["dishes"], analysis["ingredients"]) == ("plate", 3, 4)
+    assert analysis["nutrition_source"] == "plate_total"
+    assert analysis["recipe_minutes"] is None and analysis["recipe_status"] is None
+    assert {row["dish"] for row in rows["ingredients"]} == {"Dal Tadka", "Jeera Rice"}
+
+
+def _read_csv(directory, table):
+    with open(directory / f"{table}.csv", newline="", encoding="utf-8") as handle:
+        return list(csv.DictReader(handle))
+
+
+def test_auto_format_falls_back_to_csv_without_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "pa", None)
+    with ResultExporter(tmp_path, row_group_size=2) as exporter:
+        for index in range(3):
+            exporter.add(_batch_record(index))
+    assert exporter.format == "csv"
+
+    analyses = _read_csv(tmp_path, "analyses")
+    assert [row["request_id"] for row in analyses] == ["req-0", "req-1", "req-2"]
+    assert list(analyses[0]) == [column for column, _ in TABLES["analyses"]]
+    assert len(_read_csv(tmp_path, "ingredients")) == 9
+
+
+def test_columnar_format_without_pyarrow_is_an_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "pa", None)
+    with pytest.raises(RuntimeError, match="pyarrow"):
+        ResultExporter(tmp_path, format="parquet")
+
+
+def test_parquet_part_files_hold_every_row(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    with ResultExporter(tmp_path, format="parquet", row_group_size=2) as exporter:
+        for index in range(3):
+            exporter.add(_batch_record(index))
+    (part,) = (tmp_path / "analyses").glob("part-*.parquet")
+    assert pq.read_table(part).column("request_id").to_pylist() == ["req-0", "req-1", "req-2"]
+
+
+def _run(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["export_results.py", *map(str, args)])
+    export_results.main()
+
+
+def _append(path, *records, partial=None):
+    with open(path, "a", encoding="utf-8") as handle:
+        for record in records:
+            handle.write(json.dumps(record) + "\n")
+        if partial is not None:
+            handle.write(json.dumps(partial)[:20])
+
+
+def _exported(out):
+    return [row["request_id"] for row in _read_csv(out, "analyses")]
+
+
+def test_rerun_exports_only_new_complete_lines(tmp_path, monkeypatch):
+    results, out = tmp_path / "results.jsonl", tmp_path / "out"
+    _append(results, _batch_record(0), _batch_record(1), partial=_batch_record(2))
+    _run(monkeypatch, results, "--out", out, "--format", "csv")
+    assert _exported(out) == ["req-0", "req-1"]
+
+    # Finish the partial line, then add another one.
+    content = results.read_text(encoding="utf-8")
+    results.write_text(content[:content.rindex("\n") + 1], encoding="utf-8")
+    _append(results, _batch_record(2), _batch_record(3))
+    _run(monkeypatch, results, "--out", out, "--format", "csv")
+    assert _exported(out) == ["req-0", "req-1", "req-2", "req-3"]
+
+    _run(monkeypatch, results, "--out", out, "--format", "csv")
+    assert _exported(out) == ["req-0", "req-1", "req-2", "req-3"]
+
+
+def test_truncated_file_is_read_from_the_start(tmp_path, monkeypatch):
+    results, out = tmp_path / "results.jsonl", tmp_path / "out"
+    _append(results, _batch_record(0), _batch_record(1))
+    _run(monkeypatch, results, "--out", out, "--format", "csv")
+
+    results.write_text(json.dumps(_batch_record(5)) + "\n", encoding="utf-8")
+    _run(monkeypatch, results, "--out", out, "--format", "csv")
+    assert _exported(out) == ["req-0", "req-1", "req-5"]
+
+
+def test_full_starts_over(tmp_path, monkeypatch):
+    results, out = tmp_path / "results.jsonl", tmp_path / "out"
+    _append(results, _batch_record(0), _batch_record(1))
+    _run(monkeypatch, results, "--out", out, "--format", "csv")
+    _run(monkeypatch, results, "--out", out, "--format", "csv", "--full")
+    assert _exported(out) == ["req-0", "req-1"]
+
+
+def test_trace_log_members_are_exported_once(tmp_path, monkeypatch):
+    traces, out = tmp_path / "traces", tmp_path / "out"
+    log = TraceLog(traces, batch_size=2)
+    for n in range(3):
+        log.submit(f"trace-{n}", _trace(), session_id="s1")
+    log.close()
+    _run(monkeypatch, "--trace-log", traces, "--out", out, "--format", "csv")
+    assert _exported(out) == ["trace-0", "trace-1", "trace-2"]
+
+    log = TraceLog(traces)
+    log.submit("trace-3", _trace())
+    log.close()
+    _run(monkeypatch, "--trace-log", traces, "--out", out, "--format", "csv")
+    assert _exported(out) == ["trace-0", "trace-1", "trace-2", "trace-3"]
@@ -0,0 +1,106 @@
+import time
+
+import pytest
+
+from orchestrator.coordinator import Coordinator, CoordinatorState
+from orchestrator.jobs import _budget, _inputs, run_job
+from utils.deadline import deadline_after
+from utils.jobqueue import DEAD, DONE, QUEUED, RUNNING, JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(tmp_path / "jobs.db", visibility=0.2, max_attempts=2, retry_backoff=0.0, dedupe_ttl=60)
+
+
+def test_same_inputs_dedupe_to_one_job(queue):
+    first = queue.submit("analyze", {"text": "dal"})
+    assert queue.submit("analyze", {"text": "dal", "noise": 1}, inputs={"text": "dal"}) == first
+    assert queue.submit("analyze", {"text": "rajma"}) != first
+    assert queue.stats()[QUEUED] == 2
+
+
+def test_done_job_is_reused_only_within_ttl(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db", retry_backoff=0.0, dedupe_ttl=0.1)
+    job_id = queue.submit("analyze", {"text": "dal"})
+    queue.claim("w")
+    queue.complete(job_id, "w", {"output": 1})
+    assert queue.submit("analyze", {"text": "dal"}) == job_id
+
+    time.sleep(0.15)
+    fresh = queue.submit("analyze", {"text": "dal"})
+    assert fresh != job_id
+    assert queue.get(job_id) is None
+    assert queue.get(fresh)["status"] == QUEUED
+
+
+def test_failed_attempt_is_retried_then_dead_lettered(queue):
+    job_id = queue.submit("analyze", {"text": "dal"})
+    assert queue.claim("w1")["attempt"] == 1
+    assert queue.fail(job_id, "w1", "boom") == QUEUED
+    assert queue.claim("w2")["attempt"] == 2
+    assert queue.fail(job_id, "w2", "boom again") == DEAD
+
+    job = queue.get(job_id)
+    assert job["status"] == DEAD and job["error"] == "boom again"
+    # The fingerprint is free again once the job is dead.
+    assert queue.submit("analyze", {"text": "dal"}) != job_id
+
+
+def test_non_retryable_failure_goes_straight_to_dead_letter(queue):
+    job_id = queue.submit("analyze", {"text": "dal"})
+    queue.claim("w")
+    assert queue.fail(job_id, "w", "bad payload", retryable=False) == DEAD
+
+
+def test_expired_lease_is_reclaimed_and_events_restart(queue):
+    job_id = queue.submit("analyze", {"text": "dal"})
+    queue.claim("w1")
+    assert queue.add_event(job_id, "InterpreterAgent", {"latency_ms": 1.0}, "w1")
+    time.sleep(0.25)
+
+    job = queue.claim("w2")
+    assert job["id"] == job_id and job["attempt"] == 2
+    assert queue.events(job_id) == []
+    # The lost worker can no longer write events or complete the job.
+    assert not queue.add_event(job_id, "IngredientAgent", {"latency_ms": 2.0}, "w1")
+    assert not queue.complete(job_id, "w1", {"output": "stale"})
+
+    queue.add_event(job_id, "InterpreterAgent", {"latency_ms": 3.0}, "w2")
+    assert queue.complete(job_id, "w2", {"output": "ok"})
+    assert [event["latency_ms"] for event in queue.events(job_id)] == [3.0]
+    assert queue.get(job_id)["status"] == DONE
+
+
+def test_heartbeat_keeps_the_lease(queue):
+    job_id = queue.submit("analyze", {"text": "dal"})
+    queue.claim("w1")
+    for _ in range(3):
+        time.sleep(0.1)
+        assert queue.heartbeat(job_id, "w1")
+    assert queue.claim("w2") is None
+    assert queue.get(job_id)["status"] == RUNNING
+
+
+def test_job_budget_is_part_of_the_key():
+    state = CoordinatorState(text_prompt="dal", deadline=deadline_after(30))
+    assert 29 < _budget(state) <= 30
+    assert _inputs(state)["budget_secs"] == 30
+    assert _inputs(CoordinatorState(text_prompt="dal"))["budget_secs"] is None
+
+
+def test_job_deadline_starts_when_claimed(monkeypatch):
+    seen = {}
+
+    def fake_build(self, interpreter_output):
+        seen["left"] = self.state.deadline - time.time()
+        return {}
+
+    monkeypatch.setattr(Coordinator, "build_outputs", fake_build)
+    state = {
+        "text_prompt": "dal", "image_meta": None, "image_ref": None, "preferences": {}, "clarifications": {},
+        "plate_mode": False, "session_id": "", "request_id": "r", "priority": "batch",
+    }
+    # However long the job sat in the queue, the worker gets the whole remaining budget.
+    run_job({"id": "j", "kind": "build", "payload": {"state": state, "budget_secs": 5.0, "interpreter_output": {}}})
+    assert 4 < seen["left"] <= 5
@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+from utils.json_repair import repair_json
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"dish": "Dal", "confidence": 0.9}', {"dish": "Dal", "confidence": 0.9}),
+        ('Sure! ```json\n{"dish": "Dal"}\n``` Hope that helps.', {"dish": "Dal"}),
+        ('The answer is {"dish": "Dal"} as requested.', {"dish": "Dal"}),
+        ('{"ok": True, "missing": None, "no": False}', {"ok": True, "missing": None, "no": False}),
+        ('{"items": [1, 2, ], }', {"items": [1, 2]}),
+        ('{"dish": "Dal", "items": ["rice", "ghe', {"dish": "Dal", "items": ["rice", "ghe"]}),
+        ('{"dish": "Dal", "servings": 2, "style"', {"dish": "Dal", "servings": 2}),
+        ('{"dish": "Dal", "servings":', {"dish": "Dal"}),
+        ("[1, 2, [3", [1, 2, [3]]),
+    ],
+)
+def test_repairs_common_model_mistakes(text, expected):
+    assert repair_json(text) == expected
+
+
+@pytest.mark.parametrize(
+    "value",
+    ["a, ]", "x,}", "True or None", "tabs,\t}", 'quote \\" and, ]', "```"],
+)
+def test_string_contents_are_never_rewritten(value):
+    text = json.dumps({"note": value, "items": [value]})
+    assert repair_json(text) == {"note": value, "items": [value]}
+
+
+def test_string_contents_survive_a_trailing_comma_repair():
+    assert repair_json('{"note": "a, ]", "items": ["b,}",],}') == {"note": "a, ]", "items": ["b,}"]}
+
+
+@pytest.mark.parametrize("text", ["", "no json here", "just words, really"])
+def test_unrecoverable_text_returns_none(text):
+    assert repair_json(text) is None
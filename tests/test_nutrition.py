@@ -0,0 +1,61 @@
+import pytest
+
+from agents.nutrition import _match_food, _nutrient_table, nutrition_interval
+
+
+@pytest.mark.parametrize(
+    "item, key",
+    [
+        ("coconut oil", "oil"),
+        ("peanut oil", "oil"),
+        ("ghee or oil", "oil"),
+        ("coconut milk", "coconut milk"),
+        ("grated coconut", "coconut"),
+        ("eggplant", "eggplant"),
+        ("eggs", "egg"),
+        ("chickpeas", "chickpea"),
+        ("green peas", "peas"),
+        ("tomatoes, chopped", "tomato"),
+        ("green chillies", "chilli"),
+        ("kashmiri mirch", None),
+    ],
+)
+def test_foods_match_on_whole_words(item, key):
+    _, foods = _nutrient_table()
+    assert _match_food(item, foods) == key
+
+
+def test_interval_brackets_the_median():
+    ingredients = {
+        "servings_assumption": 2,
+        "style": "home-style",
+        "ingredients": [
+            {"item": "basmati rice", "quantity_range": "150-200", "unit": "g"},
+            {"item": "coconut oil", "quantity_range": "1-2", "unit": "tbsp"},
+        ],
+    }
+    calories = nutrition_interval(ingredients)["per_serving"]["calories_kcal"]
+    assert calories["p10"] < calories["median"] < calories["p90"]
+
+
+@pytest.mark.parametrize("reported", [0, -5, float("nan"), float("inf")])
+def test_unusable_reported_value_leaves_the_band_unanchored(reported):
+    ingredients = {
+        "servings_assumption": 1,
+        "ingredients": [{"item": "basmati rice", "quantity_range": "150-200", "unit": "g"}],
+    }
+    plain = nutrition_interval(ingredients)["per_serving"]["calories_kcal"]
+    interval = nutrition_interval(ingredients, anchor={"calories_kcal": reported})
+    assert interval["per_serving"]["calories_kcal"] == plain
+    assert plain["p10"] > 0
+    assert interval["anchored"] is False
+
+
+def test_positive_reported_value_anchors_the_band():
+    ingredients = {
+        "servings_assumption": 1,
+        "ingredients": [{"item": "basmati rice", "quantity_range": "150-200", "unit": "g"}],
+    }
+    interval = nutrition_interval(ingredients, anchor={"calories_kcal": 500})
+    assert interval["per_serving"]["calories_kcal"]["median"] == 500
+    assert interval["anchored"] is True
@@ -0,0 +1,99 @@
+import math
+
+import numpy as np
+import pytest
+
+from utils.quantities import RESTAURANT_UPLIFT, IngredientTable, grams_per_unit, parse_range
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("120-160", (120.0, 160.0)),
+        ("160 - 120", (120.0, 160.0)),
+        ("2 to 3", (2.0, 3.0)),
+        ("1–2", (1.0, 2.0)),
+        ("~100", (100.0, 100.0)),
+        ("1.5", (1.5, 1.5)),
+        ("1/2 - 1", (0.5, 1.0)),
+        ("1/2-3/4", (0.5, 0.75)),
+        ("1 1/2", (1.5, 1.5)),
+        ("1-1/2", (1.5, 1.5)),
+        ("1-1/2 - 2", (1.5, 2.0)),
+        ("½", (0.5, 0.5)),
+        ("1½", (1.5, 1.5)),
+        ("¾-1", (0.75, 1.0)),
+        ("1 ½ to 2", (1.5, 2.0)),
+        ("3⁄4", (0.75, 0.75)),
+    ],
+)
+def test_parse_range(text, expected):
+    assert parse_range(text) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("text", ["", None, "to taste", "a pinch"])
+def test_unparseable_range_is_nan(text):
+    assert all(math.isnan(value) for value in parse_range(text))
+
+
+@pytest.mark.parametrize(
+    "item, unit, grams",
+    [
+        ("basmati rice", "g", 1.0),
+        ("paneer", "kg", 1000.0),
+        ("water", "ml", 1.0),
+        ("coconut oil", "tbsp", 15.0 * 0.92),
+        ("mustard seeds", "tsp", 5.0 * 0.6),
+        ("boiled potato", "cup", 240.0),
+        ("foil", "cup", 240.0),
+        ("eggs", "pcs", 50.0),
+        ("tomatoes", "", 100.0),
+        ("green chillies", "pcs", 4.0),
+    ],
+)
+def test_grams_per_unit_matches_whole_words(item, unit, grams):
+    assert grams_per_unit(item, unit) == pytest.approx(grams)
+
+
+@pytest.mark.parametrize("item, unit", [("eggplant", "pcs"), ("cardamom", "pcs"), ("rice", "handful")])
+def test_unknown_grams_per_unit_is_nan(item, unit):
+    assert math.isnan(grams_per_unit(item, unit))
+
+
+def _output(style="home-style"):
+    return {
+        "agent": "IngredientAgent",
+        "dish": "Dal Tadka",
+        "servings_assumption": 2,
+        "variant": "veg",
+        "style": style,
+        "ingredients": [
+            {"item": "toor dal", "quantity_range": "100-120", "unit": "g"},
+            {"item": "ghee", "quantity_range": "1-2", "unit": "tbsp"},
+            {"item": "salt", "quantity_range": "to taste", "unit": ""},
+        ],
+    }
+
+
+def test_to_output_round_trips():
+    assert IngredientTable.from_output(_output()).to_output() == _output()
+
+
+def test_rescale_servings():
+    table = IngredientTable.from_output(_output()).rescale(4)
+    assert table.quantities[:2].tolist() == [[200.0, 240.0], [2.0, 4.0]]
+    assert table.to_output()["servings_assumption"] == 4
+    assert table.to_output()["ingredients"][2]["quantity_range"] == "to taste"
+
+
+def test_restaurant_uplift_is_applied_once():
+    home = IngredientTable.from_output(_output())
+    restaurant = home.rescale(2, "restaurant")
+    assert restaurant.style == "restaurant-style"
+    assert restaurant.quantities[0].tolist() == pytest.approx([100 * RESTAURANT_UPLIFT[0], 120 * RESTAURANT_UPLIFT[1]])
+
+    # Rescaling a restaurant-style table again changes servings only.
+    doubled = restaurant.rescale(4)
+    assert doubled.quantities[0].tolist() == pytest.approx((restaurant.quantities[0] * 2).tolist())
+    # And going back home removes the uplift.
+    assert np.allclose(doubled.rescale(2, "home-style").quantities[:2], home.quantities[:2])
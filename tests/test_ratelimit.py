@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+
+from utils.deadline import DeadlineExceeded, deadline_after, deadline_scope
+from utils.ratelimit import LLMScheduler, request_scope
+
+
+def test_disabled_scheduler_never_waits():
+    assert LLMScheduler().acquire(10_000) == 0.0
+
+
+def test_interactive_requests_go_before_batch():
+    scheduler = LLMScheduler(rpm=60)
+    for _ in range(60):
+        scheduler.acquire(1)  # drain: one request refills every second
+    order = []
+
+    def request(priority: str) -> None:
+        with request_scope(priority, session_id=priority):
+            scheduler.acquire(1)
+        order.append(priority)
+
+    # Batch traffic may not dip into the interactive reserve, so it is still queued when
+    # the later interactive request is served.
+    threading.Thread(target=request, args=("batch",), daemon=True).start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=request, args=("interactive",))
+    interactive.start()
+    interactive.join(5)
+    assert order == ["interactive"]
+
+
+def test_acquire_within_budget_returns_queue_wait():
+    scheduler = LLMScheduler(rpm=600)
+    with deadline_scope(deadline_after(5)):
+        assert scheduler.acquire(100) < 0.1
+
+
+def test_queued_request_stops_at_its_deadline():
+    scheduler = LLMScheduler(rpm=1)
+    scheduler.acquire(1)  # empties the bucket for the next minute
+    started = time.monotonic()
+    with deadline_scope(deadline_after(0.2)), pytest.raises(DeadlineExceeded):
+        scheduler.acquire(1)
+    assert time.monotonic() - started < 1.0
+    assert scheduler.queue_depth() == 0
+
+
+def test_expired_waiter_behind_another_request_leaves_the_queue():
+    scheduler = LLMScheduler(rpm=1)
+    scheduler.acquire(1)
+    blocker = threading.Thread(target=lambda: _acquire_with_budget(scheduler, 0.6))
+    blocker.start()
+    time.sleep(0.05)
+    with deadline_scope(deadline_after(0.2)), pytest.raises(DeadlineExceeded):
+        scheduler.acquire(1)
+    blocker.join()
+    assert scheduler.queue_depth() == 0
+
+
+def _acquire_with_budget(scheduler: LLMScheduler, seconds: float) -> None:
+    with deadline_scope(deadline_after(seconds)):
+        try:
+            scheduler.acquire(1)
+        except DeadlineExceeded:
+            pass
@@ -0,0 +1,47 @@
+import pytest
+
+from agents.recognizer import extract_servings, recognize
+
+
+@pytest.mark.parametrize(
+    "prompt, dish",
+    [
+        ("veg biryani", "Veg Biryani"),
+        ("Chicken Biryani for 2", "Chicken Biryani"),
+        ("chicken biryni", "Chicken Biryani"),
+        ("paneer buter masala", "Paneer Butter Masala"),
+        ("dal tadka x2", "Dal Tadka"),
+    ],
+)
+def test_unambiguous_prompts_are_recognized(prompt, dish):
+    result = recognize(prompt)
+    assert result is not None
+    assert result["candidates"][0]["dish"] == dish
+    assert result["source"] == "local_recognizer"
+
+
+@pytest.mark.parametrize(
+    "prompt",
+    [
+        "egg biryani",  # one letter from "veg biryani"
+        "egg dal tadka",  # exact "dal tadka" plus a protein the catalog dish lacks
+        "chicken palak",
+        "fish biryani",
+        "something spicy with rice",
+        "",
+    ],
+)
+def test_prompts_with_a_different_protein_or_no_clear_dish_go_to_the_llm(prompt):
+    assert recognize(prompt) is None
+
+
+def test_variant_and_servings_cues_are_extracted():
+    result = recognize("mutton biryani for 3 people")
+    assert result["candidates"][0]["dish"] == "Mutton Biryani"
+    assert result["cues"]["variant"] == ["mutton"]
+    assert result["servings_guess"] == 3
+
+
+def test_extract_servings_removes_the_phrase():
+    assert extract_servings("rajma serves four") == (4, "rajma")
+    assert extract_servings("rajma") == (None, "rajma")
@@ -0,0 +1,30 @@
+from utils.router import ModelRouter
+
+
+def _observe(router, model, latency, ok, times=5):
+    for _ in range(times):
+        router.observe("ingredient", model, latency, ok)
+
+
+def test_fast_failing_model_never_beats_a_healthy_one():
+    router = ModelRouter(explore_rate=0.0)
+    _observe(router, "broken", 0.03, ok=False)
+    _observe(router, "good", 1.2, ok=True)
+    assert router.best("ingredient", ["broken", "good"]) == "good"
+
+
+def test_healthy_models_rank_by_latency_of_successful_calls():
+    router = ModelRouter(explore_rate=0.0)
+    _observe(router, "slow", 2.0, ok=True)
+    _observe(router, "fast", 0.5, ok=True)
+    _observe(router, "fast", 0.01, ok=False, times=1)
+    assert router.best("ingredient", ["slow", "fast"]) == "fast"
+    assert router.stats()["ingredient:fast"]["median_latency_ms"] == 500.0
+
+
+def test_least_failing_model_wins_when_all_are_unhealthy():
+    router = ModelRouter(explore_rate=0.0)
+    _observe(router, "a", 0.1, ok=False)
+    _observe(router, "b", 1.0, ok=False, times=3)
+    _observe(router, "b", 1.0, ok=True, times=2)
+    assert router.best("ingredient", ["a", "b"]) == "b"
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from agents.ingredient import IngredientOutput
+from agents.interpreter import InterpreterOutput
+from agents.nutrition import NutritionOutput
+from utils.schemas import get_schema
+
+_CUES = {
+    "variant": [],
+    "image_present": False,
+    "text_present": True,
+    "image_quality": "no_image",
+    "uncertainty_reasons": [],
+}
+
+
+def _candidate(dish):
+    return {"dish": dish, "confidence": 0.8, "cues": []}
+
+
+def test_response_format_is_strict():
+    fmt = get_schema(NutritionOutput).response_format
+    assert fmt["json_schema"]["strict"] is True
+    schema = fmt["json_schema"]["schema"]
+    assert schema["additionalProperties"] is False
+    assert set(schema["required"]) == set(schema["properties"])
+
+
+def test_interpreter_dish_candidates_alias_and_context_defaults():
+    raw = json.dumps({"dish_candidates": [_candidate("Dal"), _candidate("Sambar"), _candidate("Rasam")]})
+    data = get_schema(InterpreterOutput).validate_json(raw, {"input_type": "text", "default_cues": _CUES})
+
+    assert [c["dish"] for c in data["candidates"]] == ["Dal", "Sambar"]
+    assert data["input_type"] == "text"
+    assert data["cues"] == _CUES
+    assert data["servings_guess"] is None
+
+
+def test_well_formed_interpreter_output_is_kept():
+    raw = {
+        "agent": "InterpreterAgent",
+        "input_type": "image",
+        "candidates": [_candidate("Dal"), _candidate("Sambar"), _candidate("Rasam")],
+        "cues": _CUES,
+        "servings_guess": 2,
+    }
+    data = get_schema(InterpreterOutput).validate_json(json.dumps(raw), {"input_type": "text"})
+    assert data["input_type"] == "image"
+    assert len(data["candidates"]) == 2
+    assert data["servings_guess"] == 2
+
+
+def test_dict_shaped_ingredients_become_a_list():
+    raw = json.dumps({
+        "ingredients": {"onion": {"quantity": "80-100", "unit": "g"}, "ghee": {"quantity_range": "1-2"}},
+        "style": "Restaurant",
+        "agent": "Something",
+    })
+    context = {"dish": "Dal Tadka", "servings": 2, "variant": "veg", "style": "home-style"}
+    data = get_schema(IngredientOutput).validate_json(raw, context)
+
+    assert data["ingredients"] == [
+        {"item": "onion", "quantity_range": "80-100", "unit": "g"},
+        {"item": "ghee", "quantity_range": "1-2", "unit": "g"},
+    ]
+    assert (data["dish"], data["servings_assumption"], data["variant"]) == ("Dal Tadka", 2, "veg")
+    assert data["style"] == "restaurant-style"
+    assert data["agent"] == "IngredientAgent"
+
+
+def test_ingredients_list_alias():
+    raw = {"ingredients_list": [{"item": "rice", "quantity_range": "150-200", "unit": "g"}]}
+    context = {"dish": "Khichdi", "servings": 1, "variant": "veg", "style": "home-style"}
+    data = get_schema(IngredientOutput).validate_python(raw, context)
+    assert data["ingredients"][0]["item"] == "rice"
+
+
+def test_flat_nutrition_fields_are_aliased_into_per_serving():
+    raw = json.dumps({"calories_per_serving": 420, "protein": 18, "carbohydrates": 55, "fat": 12})
+    data = get_schema(NutritionOutput).validate_json(raw, {"servings": 2})
+
+    assert data["per_serving"] == {"calories_kcal": 420, "protein_g": 18.0, "carbs_g": 55.0, "fat_g": 12.0}
+    assert data["servings"] == 2
+    assert data["assumptions"]
+    assert data["agent"] == "NutritionAgent"
+
+
+def test_missing_nutrition_values_default_to_zero():
+    data = get_schema(NutritionOutput).validate_json("{}", {})
+    assert data["servings"] == 1
+    assert data["per_serving"]["calories_kcal"] == 0
+
+
+def test_required_fields_without_a_rule_still_fail():
+    with pytest.raises(ValidationError):
+        get_schema(InterpreterOutput).validate_json(json.dumps({"candidates": [{"dish": "Dal"}]}), {})
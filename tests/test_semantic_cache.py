@@ -0,0 +1,74 @@
+import pytest
+
+from agents.recognizer import extract_servings, normalize_dish
+from utils.semantic_cache import SemanticCache
+
+
+def _key(prompt: str) -> str:
+    # The interpreter keys its cache this way: servings are left out of the key.
+    return extract_servings(normalize_dish(prompt))[1]
+
+
+@pytest.fixture
+def cache():
+    cache = SemanticCache(capacity=8)
+    cache.insert(_key("veg biryani 2 servings"), {"dish": "Veg Biryani"})
+    cache.insert("paneer butter masala", {"dish": "Paneer Butter Masala"})
+    cache.insert("chicken curry", {"dish": "Chicken Curry"})
+    return cache
+
+
+@pytest.mark.parametrize("prompt", ["Veg Biryani for two", "vegetarian biryani", "Veg  Biryani, 2 servings!"])
+def test_near_duplicates_hit(cache, prompt):
+    value, score = cache.lookup(_key(prompt))
+    assert value == {"dish": "Veg Biryani"}
+    assert score >= cache.threshold
+
+
+@pytest.mark.parametrize("prompt", ["chicken biryani", "veg pulao", "biryani masala"])
+def test_different_dishes_miss(cache, prompt):
+    value, score = cache.lookup(_key(prompt))
+    assert value is None
+    assert score < cache.threshold
+
+
+def test_hits_are_private_copies(cache):
+    value, _ = cache.lookup("paneer butter masala")
+    value["dish"] = "changed"
+    assert cache.lookup("paneer butter masala")[0] == {"dish": "Paneer Butter Masala"}
+
+
+def test_entries_only_match_their_own_tag():
+    cache = SemanticCache(capacity=8)
+    cache.insert("dal tadka", {"servings": 2}, tag="2")
+    assert cache.lookup("dal tadka", tag="4") == (None, 0.0)
+    assert cache.lookup("dal tadka", tag="2")[0] == {"servings": 2}
+
+
+def test_least_recently_used_entry_is_evicted_at_capacity():
+    cache = SemanticCache(capacity=2)
+    cache.insert("dal tadka", 1)
+    cache.insert("rajma chawal", 2)
+    cache.lookup("dal tadka")  # ``rajma chawal`` is now least recently used
+    cache.insert("aloo gobi", 3)
+
+    assert len(cache) == 2
+    assert cache.lookup("rajma chawal")[0] is None
+    assert cache.lookup("dal tadka")[0] == 1
+    assert cache.lookup("aloo gobi")[0] == 3
+
+
+def test_save_and_load_round_trip(cache, tmp_path):
+    path = str(tmp_path / "interpreter.npz")
+    cache.save(path)
+    restored = SemanticCache(capacity=8, path=path)
+
+    assert len(restored) == 3
+    assert restored.lookup(_key("Veg Biryani for two"))[0] == {"dish": "Veg Biryani"}
+    assert restored.lookup("chicken curry")[0] == {"dish": "Chicken Curry"}
+
+
+def test_load_ignores_a_cache_built_with_other_settings(cache, tmp_path):
+    path = str(tmp_path / "interpreter.npz")
+    cache.save(path)
+    assert len(SemanticCache(dim=1024, capacity=8, path=path)) == 0
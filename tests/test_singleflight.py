@@ -0,0 +1,239 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import utils.llm as llm
+from utils.breaker import CircuitOpenError
+from utils.deadline import DeadlineExceeded, deadline_after, deadline_scope
+from utils.singleflight import SingleFlight, WaitTimeout
+
+
+def _start(target):
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread
+
+
+def test_waiters_share_the_leaders_result_as_copies():
+    flight = SingleFlight()
+    release = threading.Event()
+    results = []
+
+    def leader():
+        results.append(flight.do("k", lambda: release.wait() and {"n": 1}, clone=dict))
+
+    def waiter():
+        results.append(flight.do("k", lambda: {"n": 2}, clone=dict))
+
+    threads = [_start(leader)]
+    time.sleep(0.05)
+    threads.append(_start(waiter))
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(coalesced for _, coalesced in results) == [False, True]
+    shared = [result for result, _ in results]
+    assert shared[0] == shared[1] == {"n": 1}
+    assert shared[0] is not shared[1]
+
+
+def test_leader_errors_are_shared():
+    flight = SingleFlight()
+    errors = []
+
+    def leader():
+        def fail():
+            time.sleep(0.1)
+            raise ValueError("bad output")
+
+        try:
+            flight.do("k", fail)
+        except ValueError as exc:
+            errors.append(exc)
+
+    def waiter():
+        try:
+            flight.do("k", lambda: "unused")
+        except ValueError as exc:
+            errors.append(exc)
+
+    threads = [_start(leader)]
+    time.sleep(0.03)
+    threads.append(_start(waiter))
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 2
+
+
+def test_waiter_gives_up_after_its_timeout():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader = _start(lambda: flight.do("k", lambda: release.wait(2)))
+    time.sleep(0.05)
+    started = time.monotonic()
+    with pytest.raises(WaitTimeout):
+        flight.do("k", lambda: "unused", timeout=0.1)
+    assert time.monotonic() - started < 1.0
+    release.set()
+    leader.join()
+
+
+def test_leader_specific_errors_are_retried_by_a_waiter():
+    flight = SingleFlight()
+    outcome = {}
+
+    def leader():
+        def fail():
+            time.sleep(0.1)
+            raise DeadlineExceeded("leader budget spent")
+
+        with pytest.raises(DeadlineExceeded):
+            flight.do("k", fail, retry_on=(DeadlineExceeded,))
+
+    def waiter():
+        outcome["result"] = flight.do("k", lambda: "fresh", retry_on=(DeadlineExceeded,))
+
+    threads = [_start(leader)]
+    time.sleep(0.03)
+    threads.append(_start(waiter))
+    for thread in threads:
+        thread.join()
+
+    assert outcome["result"] == ("fresh", False)
+
+
+def test_cancelled_async_leader_hands_the_call_to_a_waiter():
+    flight = SingleFlight()
+    calls = []
+
+    async def slow():
+        calls.append("leader")
+        await asyncio.sleep(5)
+
+    async def fresh():
+        calls.append("waiter")
+        return "fresh"
+
+    async def scenario():
+        leader = asyncio.create_task(flight.do_async("k", slow))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(flight.do_async("k", fresh))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.wait_for(waiter, 1)
+
+    assert asyncio.run(scenario()) == ("fresh", False)
+    assert calls == ["leader", "waiter"]
+
+
+def _coalesced(calls, outcomes, name, deadline_secs):
+    def run():
+        try:
+            with deadline_scope(deadline_after(deadline_secs)):
+                outcomes[name] = llm._call_coalesced(
+                    dict, "system", "same prompt", None, None, False, {}, "model", 0.0
+                )
+        except Exception as exc:
+            outcomes[name] = exc
+
+    return run
+
+
+def test_llm_waiter_without_deadline_survives_leader_deadline(monkeypatch):
+    calls = []
+    outcomes = {}
+
+    def fake_call(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(0.15)
+            raise DeadlineExceeded("leader budget spent")
+        return {"dish": "Dal"}, True
+
+    monkeypatch.setattr(llm, "_call_structured", fake_call)
+    leader = _start(_coalesced(calls, outcomes, "leader", 5))
+    time.sleep(0.05)
+    waiter = _start(_coalesced(calls, outcomes, "waiter", 0))
+    leader.join()
+    waiter.join()
+
+    assert isinstance(outcomes["leader"], DeadlineExceeded)
+    assert outcomes["waiter"] == ({"dish": "Dal"}, True)
+    assert len(calls) == 2
+
+
+def test_llm_waiter_with_tighter_deadline_stops_waiting(monkeypatch):
+    release = threading.Event()
+    outcomes = {}
+
+    def fake_call(*args, **kwargs):
+        release.wait(2)
+        return {"dish": "Dal"}, True
+
+    monkeypatch.setattr(llm, "_call_structured", fake_call)
+    leader = _start(_coalesced([], outcomes, "leader", 0))
+    time.sleep(0.05)
+    started = time.monotonic()
+    _coalesced([], outcomes, "waiter", 0.2)()
+    elapsed = time.monotonic() - started
+    release.set()
+    leader.join()
+
+    assert isinstance(outcomes["waiter"], DeadlineExceeded)
+    assert elapsed < 1.0
+    assert outcomes["leader"] == ({"dish": "Dal"}, True)
+
+
+def test_llm_waiter_retries_after_leader_circuit_open(monkeypatch):
+    calls = []
+    outcomes = {}
+
+    def fake_call(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(0.15)
+            raise CircuitOpenError("llm:test", 1.0)
+        return {"dish": "Dal"}, True
+
+    monkeypatch.setattr(llm, "_call_structured", fake_call)
+    leader = _start(_coalesced(calls, outcomes, "leader", 0))
+    time.sleep(0.05)
+    waiter = _start(_coalesced(calls, outcomes, "waiter", 0))
+    leader.join()
+    waiter.join()
+
+    assert isinstance(outcomes["leader"], CircuitOpenError)
+    assert outcomes["waiter"] == ({"dish": "Dal"}, True)
+
+
+def test_cancelled_async_waiter_leaves_the_call():
+    flight = SingleFlight()
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return "done"
+
+        leader = asyncio.create_task(flight.do_async("k", slow))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(flight.do_async("k", slow))
+        await asyncio.sleep(0.01)
+        call = flight._calls["k"]
+        assert (call.waiters, len(call.async_waiters)) == (1, 1)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        leaving = (call.waiters, len(call.async_waiters))
+        release.set()
+        return leaving, await leader
+
+    assert asyncio.run(scenario()) == ((0, 0), ("done", False))
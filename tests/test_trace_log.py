@@ -0,0 +1,126 @@
+import gzip
+import json
+import threading
+
+import utils.trace_log as trace_log
+from utils.trace_log import INDEX_NAME, TraceLog, redact
+
+
+def test_records_round_trip_through_their_index_entries(tmp_path):
+    log = TraceLog(tmp_path, batch_size=2)
+    for n in range(5):
+        log.submit(f"req-{n}", {"n": n}, session="s1")
+    log.close()
+
+    for n in range(5):
+        record = log.lookup(f"req-{n}")
+        assert (record["request_id"], record["session"], record["trace"]) == (f"req-{n}", "s1", {"n": n})
+    assert log.lookup("unknown") is None
+    assert log.stats()["written"] == 5
+
+
+def test_index_offsets_point_at_whole_gzip_members(tmp_path):
+    log = TraceLog(tmp_path, batch_size=2)
+    for n in range(5):
+        log.submit(f"req-{n}", {"n": n})
+    log.close()
+
+    entries = [json.loads(line) for line in (tmp_path / INDEX_NAME).read_text().splitlines()]
+    for entry in entries:
+        with open(tmp_path / entry["segment"], "rb") as handle:
+            handle.seek(entry["offset"])
+            lines = gzip.decompress(handle.read(entry["length"])).splitlines()
+        assert entry["request_id"] in {json.loads(line)["request_id"] for line in lines}
+    # The segment is a valid multi-member gzip file as a whole.
+    segment = tmp_path / entries[0]["segment"]
+    assert len(gzip.decompress(segment.read_bytes()).splitlines()) == 5
+
+
+def test_later_record_for_the_same_request_wins(tmp_path):
+    log = TraceLog(tmp_path, batch_size=1)
+    log.submit("req", {"attempt": 1})
+    log.submit("req", {"attempt": 2})
+    log.close()
+    assert log.lookup("req")["trace"] == {"attempt": 2}
+
+
+def test_lookup_sees_records_written_after_the_first_lookup(tmp_path):
+    first = TraceLog(tmp_path)
+    first.submit("a", {})
+    first.close()
+    assert first.lookup("a") is not None
+
+    second = TraceLog(tmp_path)
+    second.submit("b", {})
+    second.close()
+    assert first.lookup("b") is not None
+
+
+def test_redaction_replaces_inline_images_but_keeps_blob_refs():
+    trace = {
+        "image": "abc",
+        "image_ref_holder": {"image": "sha256:" + "0" * 64},
+        "steps": [{"url": "data:image/png;base64,AAAA"}, b"raw"],
+        "text": "veg biryani",
+    }
+    redacted = redact(trace)
+    assert redacted["image"].startswith("<redacted sha256:")
+    assert redacted["image_ref_holder"]["image"] == "sha256:" + "0" * 64
+    assert redacted["steps"][0]["url"].startswith("<redacted sha256:")
+    assert redacted["steps"][1].startswith("<redacted sha256:")
+    assert redacted["text"] == "veg biryani"
+    assert trace["image"] == "abc"
+
+
+def test_submit_snapshots_the_trace(tmp_path):
+    log = TraceLog(tmp_path)
+    trace = {"events": [1]}
+    log.submit("req", trace)
+    trace["events"].append(2)
+    log.close()
+    assert log.lookup("req")["trace"] == {"events": [1]}
+
+
+def test_rotation_prunes_old_segments_and_their_index_entries(tmp_path):
+    log = TraceLog(tmp_path, segment_bytes=1, max_segments=2, batch_size=1)
+    for n in range(4):
+        # One batch per segment: wait for each write so every record rotates.
+        log.submit(f"req-{n}", {"n": n, "padding": "x" * 200})
+        _wait_written(log, n + 1)
+    log.close()
+    segments = sorted(tmp_path.glob("traces-*.jsonl.gz"))
+    assert len(segments) == 2
+
+    index = [json.loads(line) for line in (tmp_path / INDEX_NAME).read_text().splitlines()]
+    assert {entry["segment"] for entry in index} <= {path.name for path in segments}
+    assert log.lookup("req-0") is None
+    assert log.lookup("req-3")["trace"]["n"] == 3
+
+
+def _wait_written(log, count):
+    for _ in range(500):
+        if log.stats()["written"] >= count:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("trace writer did not catch up")
+
+
+def test_full_queue_drops_and_counts_without_blocking(tmp_path, monkeypatch):
+    release = threading.Event()
+    log = TraceLog(tmp_path, queue_size=1, batch_size=1, flush_interval=0.01)
+    monkeypatch.setattr(log, "_write_batch", lambda batch: release.wait(5))
+
+    results = [log.submit(f"req-{n}", {}) for n in range(20)]
+    release.set()
+    log.close()
+
+    stats = log.stats()
+    assert results.count(False) == stats["dropped"] > 0
+    assert stats["written"] + stats["dropped"] == 20
+
+
+def test_enabled_only_when_asked(monkeypatch):
+    monkeypatch.delenv("TRACE_LOG_ENABLED", raising=False)
+    assert not trace_log.trace_log_enabled()
+    monkeypatch.setenv("TRACE_LOG_ENABLED", "true")
+    assert trace_log.trace_log_enabled()
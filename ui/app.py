@@ -2,8 +2,10 @@ import base64
 import io
 import json
 import os
+import time
+import uuid
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 
 import streamlit as st
 from dotenv import load_dotenv
@@ -15,9 +17,20 @@ load_dotenv(ROOT_DIR / ".env")
 if str(ROOT_DIR) not in os.sys.path:
     os.sys.path.insert(0, str(ROOT_DIR))
 
+from agents.catalog import get_catalog
 from orchestrator.coordinator import Coordinator, CoordinatorState
+from orchestrator.jobs import submit_build
+from utils.blobstore import store_data_url
+from utils.deadline import deadline_after
+from utils.imaging import VIDEO_EXTENSIONS, ingest_media
 from utils.io import safe_open_image
+from utils.jobqueue import DEAD, DONE, get_job_queue, jobs_enabled
+from utils.metrics import metrics_enabled, start_metrics_server
+from utils.quantities import normalize_style
 
+# Streamlit reruns this script on every interaction; the server starts once per process.
+if metrics_enabled():
+    start_metrics_server()
 
 # -----------------------------
 # Page + light UI styling
@@ -98,8 +111,18 @@ if "clarification" not in st.session_state:
     st.session_state.clarification = None
 if "image_meta" not in st.session_state:
     st.session_state.image_meta = None
-if "image_data_url" not in st.session_state:
-    st.session_state.image_data_url = None
+if "image_ref" not in st.session_state:
+    st.session_state.image_ref = None
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if "request_id" not in st.session_state:
+    st.session_state.request_id = uuid.uuid4().hex
+if "job_id" not in st.session_state:
+    # A pending build job survives a browser refresh through the ?job= query param.
+    st.session_state.job_id = st.query_params.get("job")
+
+# Load the dish catalog once per process so the first analysis doesn't pay for it.
+get_catalog()
 
 # Preferences (new)
 if "diet" not in st.session_state:
@@ -108,6 +131,13 @@ if "servings" not in st.session_state:
     st.session_state.servings = 1
 if "style" not in st.session_state:
     st.session_state.style = "Home-style"
+if "deadline_secs" not in st.session_state:
+    st.session_state.deadline_secs = 0
+if "plate_mode" not in st.session_state:
+    st.session_state.plate_mode = False
+# Sidebar servings/style the current result was generated under; later changes are rescaled.
+if "result_prefs" not in st.session_state:
+    st.session_state.result_prefs = None
 
 
 # -----------------------------
@@ -142,23 +172,52 @@ def render_stepper(stage: int) -> None:
 def _make_coordinator(
     text_prompt: str,
     image_meta: Optional[Dict[str, Any]],
-    image_data_url: Optional[str],
+    image_ref: Optional[str],
     clarifications: Optional[Dict[str, Any]] = None,
+    trace: Optional[Dict[str, Any]] = None,
 ) -> Coordinator:
     state = CoordinatorState(
         text_prompt=text_prompt or "",
         image_meta=image_meta,
-        image_data_url=image_data_url,
+        image_ref=image_ref,
         preferences={
             "diet": st.session_state.diet,
             "servings": st.session_state.servings,
             "style": st.session_state.style,
         },
         clarifications=clarifications or {},
+        trace=dict(trace or {}),
+        session_id=st.session_state.session_id,
+        # One id per analysis, so the persisted trace covers every step of it.
+        request_id=st.session_state.request_id,
+        priority="interactive",
+        # Append ?profile=1 to the URL to profile this session's requests.
+        profile=st.query_params.get("profile") == "1",
+        deadline=deadline_after(st.session_state.deadline_secs),
+        plate_mode=st.session_state.plate_mode,
     )
     return Coordinator(state)
 
 
+def _sidebar_prefs() -> Tuple[int, str]:
+    return int(st.session_state.servings), normalize_style(st.session_state.style)
+
+
+def _generate_outputs(coordinator: Coordinator, interpreter_output: Dict[str, Any]) -> None:
+    """Apply clarifications and build outputs inline, or hand them to the job workers."""
+    st.session_state.result_prefs = _sidebar_prefs()
+    if jobs_enabled():
+        job_id = submit_build(coordinator.state, interpreter_output)
+        st.session_state.job_id = job_id
+        st.query_params["job"] = job_id
+        return
+    if coordinator.state.clarifications:
+        interpreter_output = coordinator.apply_clarifications(interpreter_output)
+    final_output = coordinator.build_outputs(interpreter_output)
+    st.session_state.trace = coordinator.state.trace
+    st.session_state.final = final_output
+
+
 # -----------------------------
 # Header row with logo (new)
 # -----------------------------
@@ -184,13 +243,15 @@ st.markdown(
     "<div class='section-bar'><div class='section-title'>⚙️ Preferences</div>",
     unsafe_allow_html=True,
 )
-p1, p2, p3 = st.columns([1.2, 1.0, 1.4])
+p1, p2, p3, p4 = st.columns([1.2, 1.0, 1.4, 1.0])
 with p1:
     st.radio("Dietary", ["Veg", "Egg", "Non-veg"], key="diet", horizontal=True)
 with p2:
     st.number_input("Servings", min_value=1, max_value=6, step=1, key="servings")
 with p3:
     st.radio("Style", ["Home-style", "Restaurant-style"], key="style", horizontal=True)
+with p4:
+    st.number_input("Time budget (s)", min_value=0, max_value=120, step=5, key="deadline_secs", help="0 = no limit")
 st.markdown("</div>", unsafe_allow_html=True)
 
 st.write("")
@@ -200,8 +261,13 @@ st.write("")
 # Input form (kept layout)
 # -----------------------------
 with st.form("input_form"):
-    image_file = st.file_uploader("Upload a food image (optional)", type=["png", "jpg", "jpeg"])
+    image_files = st.file_uploader(
+        "Upload food photos or a short clip (optional)",
+        type=["png", "jpg", "jpeg", "webp", "gif"] + [ext.lstrip(".") for ext in VIDEO_EXTENSIONS],
+        accept_multiple_files=True,
+    )
     text_prompt = st.text_input("Or describe the dish", placeholder="e.g., veg biryani for 2 servings")
+    st.checkbox("Plate with several dishes (thali, combo)", key="plate_mode")
 
     # Optional: paste data-url without changing layout much
     with st.expander("Paste image data URL (optional)"):
@@ -219,27 +285,40 @@ with st.form("input_form"):
 # -----------------------------
 if submitted:
     image_meta = None
-    image_data_url = None
+    image_ref = None
 
-    if image_file:
-        image_result = safe_open_image(image_file)
+    if image_files:
+        single = len(image_files) == 1 and not image_files[0].name.lower().endswith(VIDEO_EXTENSIONS + (".gif", ".webp"))
+        if single:
+            image_result = safe_open_image(image_files[0])
+        else:
+            # Several shots or a clip: only the best distinct frame(s) go to the interpreter.
+            image_result = ingest_media([(f.name, f.getvalue()) for f in image_files])
         if image_result["ok"]:
-            st.image(image_result["image"], caption="Uploaded image", use_column_width=True)
+            frames = image_result["meta"].get("frames")
+            caption = "Uploaded image"
+            if frames:
+                caption = f"Best of {frames['sampled']} frames ({frames['duplicates']} near-duplicates skipped)"
+            st.image(image_result["image"], caption=caption, use_column_width=True)
             image_meta = image_result["meta"]
-            image_data_url = image_result.get("data_url")
+            image_ref = image_result.get("image_ref")
         else:
-            st.error("Invalid image file. Please upload a valid image.")
+            st.error(f"Invalid image or video: {image_result['error']}")
     elif paste_data_url and paste_data_url.strip():
         pasted = data_url_to_image(paste_data_url.strip())
         if pasted:
             st.image(pasted, caption="Pasted image", use_column_width=True)
             image_meta = {"name": "pasted_image", "size": pasted.size, "mode": pasted.mode}
-            image_data_url = paste_data_url.strip()
+            image_ref = store_data_url(paste_data_url.strip())
         else:
             st.warning("Paste a valid data URL starting with data:image...")
 
+    st.session_state.request_id = uuid.uuid4().hex
+    st.session_state.job_id = None
+    if "job" in st.query_params:
+        del st.query_params["job"]
     try:
-        coordinator = _make_coordinator(text_prompt, image_meta, image_data_url)
+        coordinator = _make_coordinator(text_prompt, image_meta, image_ref)
         interpreter_output = coordinator.run_interpreter()
         clarifier_output = coordinator.run_clarifier(interpreter_output)
 
@@ -247,7 +326,7 @@ if submitted:
         st.session_state.clarification = clarifier_output
         st.session_state.final = None
         st.session_state.image_meta = image_meta
-        st.session_state.image_data_url = image_data_url
+        st.session_state.image_ref = image_ref
     except Exception as exc:
         st.error(f"Failed to analyze input: {exc}")
 
@@ -303,15 +382,11 @@ if has_questions:
                 coordinator = _make_coordinator(
                     text_prompt,
                     st.session_state.image_meta,
-                    st.session_state.image_data_url,
+                    st.session_state.image_ref,
                     clarifications=answers,
+                    trace=st.session_state.trace,
                 )
-                interpreter_output = coordinator.apply_clarifications(
-                    st.session_state.trace.get("InterpreterAgent", {})
-                )
-                final_output = coordinator.build_outputs(interpreter_output)
-                st.session_state.trace = coordinator.state.trace
-                st.session_state.final = final_output
+                _generate_outputs(coordinator, st.session_state.trace.get("InterpreterAgent", {}))
                 st.session_state.clarification = None
             except Exception as exc:
                 st.error(f"Failed to generate outputs: {exc}")
@@ -331,7 +406,7 @@ if has_questions:
 # -----------------------------
 # If no questions, auto-generate outputs (kept behavior)
 # -----------------------------
-if (not has_questions) and st.session_state.trace and (not st.session_state.final):
+if (not has_questions) and st.session_state.trace and (not st.session_state.final) and (not st.session_state.job_id):
     interpreter_output = st.session_state.trace.get("InterpreterAgent", {})
     candidates = interpreter_output.get("candidates", [])
     if candidates:
@@ -339,43 +414,130 @@ if (not has_questions) and st.session_state.trace and (not st.session_state.fina
             coordinator = _make_coordinator(
                 text_prompt,
                 st.session_state.image_meta,
-                st.session_state.image_data_url,
+                st.session_state.image_ref,
+                trace=st.session_state.trace,
             )
-            final_output = coordinator.build_outputs(interpreter_output)
-            st.session_state.trace = coordinator.state.trace
-            st.session_state.final = final_output
+            _generate_outputs(coordinator, interpreter_output)
         except Exception as exc:
             st.error(f"Failed to generate outputs: {exc}")
 
 
+# -----------------------------
+# Queued build (JOBS_ENABLED): poll the job until the workers finish it
+# -----------------------------
+if st.session_state.job_id and not st.session_state.final:
+    job = get_job_queue().get(st.session_state.job_id)
+    if job is None:
+        st.session_state.job_id = None
+    elif job["status"] == DONE:
+        st.session_state.final = job["result"]["output"]
+        st.session_state.trace = job["result"]["trace"]
+        st.session_state.job_id = None
+        st.rerun()
+    elif job["status"] == DEAD:
+        st.error(f"Failed to generate outputs: {job['error']}")
+        st.session_state.job_id = None
+    else:
+        with st.status(f"Generating results ({job['status']}, attempt {max(job['attempts'], 1)})..."):
+            for event in get_job_queue().events(job["id"]):
+                mark = "⚠️" if event.get("error") else "✓"
+                st.write(f"{mark} {event['stage']} · {event['latency_ms']} ms")
+        time.sleep(1.0)
+        st.rerun()
+
+
 # -----------------------------
 # Results (kept layout)
 # -----------------------------
 final_output = st.session_state.final
 
+# Servings/style changes after results exist are applied locally, without new LLM calls.
+# Only what changed in the sidebar is applied: servings resolved from a clarification
+# answer stay until the servings preference itself is changed.
+if final_output and final_output.get("mode") != "plate":
+    prefs = _sidebar_prefs()
+    basis = st.session_state.result_prefs or prefs
+    if prefs != basis:
+        current_ingredients = final_output["ingredients"]
+        servings = prefs[0] if prefs[0] != basis[0] else int(current_ingredients.get("servings_assumption") or 1)
+        style = prefs[1] if prefs[1] != basis[1] else normalize_style(current_ingredients.get("style"))
+        if (servings, style) != (int(current_ingredients.get("servings_assumption") or 1), normalize_style(current_ingredients.get("style"))):
+            coordinator = _make_coordinator(text_prompt, st.session_state.image_meta, st.session_state.image_ref)
+            final_output = coordinator.rescale_outputs(final_output, servings, style)
+            st.session_state.final = final_output
+            st.session_state.trace.update(coordinator.state.trace)
+    st.session_state.result_prefs = prefs
+
 if final_output:
-    st.subheader("Dish Candidates")
-    for candidate in final_output["dish"]:
-        st.write(f"- {candidate['dish']} (confidence {candidate['confidence']:.2f})")
-
-    st.subheader("Ingredients")
-    ingredients = final_output["ingredients"]["ingredients"]
-    st.table(ingredients)
-
-    st.subheader("Nutrition per Serving")
-    nutrition = final_output["nutrition"]["per_serving"]
-    st.write(
-        f"Calories: {nutrition['calories_kcal']} kcal | "
-        f"Protein: {nutrition['protein_g']} g | "
-        f"Carbs: {nutrition['carbs_g']} g | "
-        f"Fat: {nutrition['fat_g']} g"
-    )
-    st.caption("Assumptions: " + "; ".join(final_output["nutrition"].get("assumptions", [])))
+    if final_output.get("degraded"):
+        parts = ", ".join(f"{name} {how.replace('_', ' ')}" for name, how in final_output["degraded"].items())
+        st.warning(f"Reduced result to meet the time budget: {parts}.")
+
+    if final_output.get("mode") == "plate":
+        plate_total = final_output["nutrition"]["per_serving"]
+        st.subheader("Plate Nutrition (total)")
+        st.write(
+            f"Calories: {plate_total['calories_kcal']} kcal | "
+            f"Protein: {plate_total['protein_g']} g | "
+            f"Carbs: {plate_total['carbs_g']} g | "
+            f"Fat: {plate_total['fat_g']} g"
+        )
+        st.caption("Assumptions: " + "; ".join(final_output["nutrition"].get("assumptions", [])))
+        for entry in final_output["dishes"]:
+            portion = entry.get("portion_note") or f"{entry['portion_servings']:g} serving(s)"
+            with st.expander(f"{entry['dish']} · {portion}"):
+                if entry.get("error"):
+                    st.error(entry["error"])
+                    continue
+                share = entry["contribution"]
+                st.write(
+                    f"On this plate: {int(share['calories_kcal'])} kcal | Protein {share['protein_g']} g | "
+                    f"Carbs {share['carbs_g']} g | Fat {share['fat_g']} g"
+                )
+                st.table(entry["ingredients"]["ingredients"])
+                recipe = entry["recipe"]
+                if recipe.get("status") == "skipped":
+                    st.info(recipe.get("message"))
+                else:
+                    st.write(f"Estimated time: {recipe['time_minutes']} minutes")
+                    for idx, step in enumerate(recipe["steps"], start=1):
+                        st.write(f"{idx}. {step}")
+    else:
+        st.subheader("Dish Candidates")
+        for candidate in final_output["dish"]:
+            st.write(f"- {candidate['dish']} (confidence {candidate['confidence']:.2f})")
+
+        st.subheader("Ingredients")
+        ingredients = final_output["ingredients"]["ingredients"]
+        st.table(ingredients)
+
+        st.subheader("Nutrition per Serving")
+        nutrition = final_output["nutrition"]["per_serving"]
+        st.write(
+            f"Calories: {nutrition['calories_kcal']} kcal | "
+            f"Protein: {nutrition['protein_g']} g | "
+            f"Carbs: {nutrition['carbs_g']} g | "
+            f"Fat: {nutrition['fat_g']} g"
+        )
+        interval = final_output["nutrition"].get("interval")
+        if interval:
+            band = interval["per_serving"]
+            st.caption(
+                "Likely range (10th–90th percentile over ingredient quantities): "
+                f"{band['calories_kcal']['p10']:g}–{band['calories_kcal']['p90']:g} kcal | "
+                f"Protein {band['protein_g']['p10']}–{band['protein_g']['p90']} g | "
+                f"Carbs {band['carbs_g']['p10']}–{band['carbs_g']['p90']} g | "
+                f"Fat {band['fat_g']['p10']}–{band['fat_g']['p90']} g"
+            )
+        st.caption("Assumptions: " + "; ".join(final_output["nutrition"].get("assumptions", [])))
 
-    st.subheader("Recipe")
-    st.write(f"Estimated time: {final_output['recipe']['time_minutes']} minutes")
-    for idx, step in enumerate(final_output["recipe"]["steps"], start=1):
-        st.write(f"{idx}. {step}")
+        st.subheader("Recipe")
+        if final_output["recipe"].get("status") == "skipped":
+            st.info(final_output["recipe"].get("message"))
+        else:
+            st.write(f"Estimated time: {final_output['recipe']['time_minutes']} minutes")
+            for idx, step in enumerate(final_output["recipe"]["steps"], start=1):
+                st.write(f"{idx}. {step}")
 
     commerce = final_output.get("commerce", {})
     if commerce.get("status") in {"mock", "available"}:
@@ -384,7 +546,7 @@ if final_output:
             st.write(f"- {option['name']} · {option['price']} · ETA {option['eta_minutes']} min")
         if commerce.get("quote"):
             st.caption(f"Estimated total: {commerce['quote'].get('estimated_total')}")
-    elif commerce.get("status") in {"disabled", "unavailable", "unauthorized"}:
+    elif commerce.get("status") in {"disabled", "unavailable", "unauthorized", "skipped"}:
         st.info(commerce.get("message"))
 
 
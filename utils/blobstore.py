@@ -0,0 +1,169 @@
+import base64
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+REF_PREFIX = "sha256:"
+
+
+class BlobStore:
+    """Content-addressed blob store: LRU in memory, spilled to disk on eviction."""
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        memory_limit_bytes: int = 64 * 1024 * 1024,
+        disk_limit_bytes: int = 512 * 1024 * 1024,
+        disk_limit_files: int = 10000,
+    ) -> None:
+        self.root = Path(root or os.path.join(tempfile.gettempdir(), "eatsense-blobs"))
+        self.memory_limit_bytes = memory_limit_bytes
+        self.disk_limit_bytes = disk_limit_bytes
+        self.disk_limit_files = disk_limit_files
+        self._memory: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, data: bytes, mime: str) -> str:
+        ref = REF_PREFIX + hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if ref in self._memory:
+                self._memory.move_to_end(ref)
+                return ref
+            self._memory[ref] = (data, mime)
+            self._memory_bytes += len(data)
+            self._evict_locked()
+        return ref
+
+    def get(self, ref: str) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            entry = self._memory.get(ref)
+            if entry is not None:
+                self._memory.move_to_end(ref)
+                return entry
+        entry = self._read_disk(ref)
+        if entry is None:
+            return None
+        with self._lock:
+            if ref not in self._memory:
+                self._memory[ref] = entry
+                self._memory_bytes += len(entry[0])
+                self._evict_locked()
+        return entry
+
+    def persist(self, ref: str) -> bool:
+        """Write ``ref`` to disk now so other processes sharing the directory can read it."""
+        entry = self.get(ref)
+        if entry is None:
+            return False
+        self._write_disk(ref, entry[0], entry[1])
+        return self._path(ref).exists()
+
+    def __contains__(self, ref: str) -> bool:
+        with self._lock:
+            if ref in self._memory:
+                return True
+        return self._path(ref).exists()
+
+    def _path(self, ref: str) -> Path:
+        return self.root / (ref[len(REF_PREFIX):] + ".blob")
+
+    def _evict_locked(self) -> None:
+        spilled = False
+        while self._memory_bytes > self.memory_limit_bytes and len(self._memory) > 1:
+            ref, (data, mime) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(data)
+            self._write_disk(ref, data, mime)
+            spilled = True
+        if spilled:
+            self._prune_disk()
+
+    def _write_disk(self, ref: str, data: bytes, mime: str) -> None:
+        path = self._path(ref)
+        if path.exists():
+            return
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            with open(tmp, "wb") as handle:
+                handle.write(mime.encode("ascii") + b"\n" + data)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def _read_disk(self, ref: str) -> Optional[Tuple[bytes, str]]:
+        path = self._path(ref)
+        try:
+            with open(path, "rb") as handle:
+                raw = handle.read()
+            os.utime(path)
+        except OSError:
+            return None
+        mime, _, data = raw.partition(b"\n")
+        return data, mime.decode("ascii")
+
+    def _prune_disk(self) -> None:
+        try:
+            stats = [(e.path, e.stat()) for e in os.scandir(self.root) if e.name.endswith(".blob")]
+        except OSError:
+            return
+        entries = sorted((st.st_mtime, st.st_size, path) for path, st in stats)
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+        for _, size, path in entries:
+            if total <= self.disk_limit_bytes and count <= self.disk_limit_files:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                count -= 1
+            except OSError:
+                continue
+
+
+_store: Optional[BlobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = BlobStore(
+                    root=os.getenv("EATSENSE_BLOB_DIR") or None,
+                    memory_limit_bytes=int(float(os.getenv("EATSENSE_BLOB_MEMORY_MB", "64")) * 1024 * 1024),
+                    disk_limit_bytes=int(float(os.getenv("EATSENSE_BLOB_DISK_MB", "512")) * 1024 * 1024),
+                    disk_limit_files=int(os.getenv("EATSENSE_BLOB_DISK_FILES", "10000")),
+                )
+    return _store
+
+
+def is_blob_ref(value: Optional[str]) -> bool:
+    return bool(value) and value.startswith(REF_PREFIX)
+
+
+def store_image_bytes(data: bytes, mime: str) -> str:
+    return get_blob_store().put(data, mime)
+
+
+def store_data_url(data_url: str) -> str:
+    header, _, b64 = data_url.partition(",")
+    mime = header[len("data:"):].split(";", 1)[0] or "image/jpeg"
+    return store_image_bytes(base64.b64decode(b64), mime)
+
+
+def load_image_bytes(ref: str) -> Optional[Tuple[bytes, str]]:
+    return get_blob_store().get(ref)
+
+
+def load_data_url(ref: str) -> str:
+    entry = load_image_bytes(ref)
+    if entry is None:
+        raise RuntimeError(f"Image blob {ref} is no longer available; please re-upload the image.")
+    data, mime = entry
+    return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from utils.tracing import record_event
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+    def __init__(self, name: str, retry_in: float) -> None:
+        super().__init__(f"Circuit for {name} is open; retry in {retry_in:.1f}s.")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker over a sliding window of recent outcomes.
+
+    closed: calls pass; once at least ``min_calls`` outcomes are recorded and the failure
+    rate reaches ``failure_rate`` the breaker opens. open: calls are rejected for
+    ``cooldown`` seconds. half_open: up to ``half_open_max`` probe calls pass; a success
+    closes the breaker, a failure reopens it for another cooldown.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        cooldown: float = 30.0,
+        half_open_max: int = 1,
+    ) -> None:
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.cooldown = cooldown
+        self.half_open_max = half_open_max
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._rejected = 0
+        self._opens = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open_locked()
+            return self._state
+
+    def allow(self) -> bool:
+        """Reserve a call slot; every allowed call must end in record_success/failure or release."""
+        with self._lock:
+            self._maybe_half_open_locked()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes < self.half_open_max:
+                self._probes += 1
+                return True
+            self._rejected += 1
+            retry_in = max(0.0, self._opened_at + self.cooldown - time.monotonic())
+        record_event("circuit_rejected", breaker=self.name, retry_in_s=round(retry_in, 1))
+        return False
+
+    def check(self) -> None:
+        if not self.allow():
+            with self._lock:
+                retry_in = max(0.0, self._opened_at + self.cooldown - time.monotonic())
+            raise CircuitOpenError(self.name, retry_in)
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                self._outcomes.clear()
+                self._transition_locked(CLOSED)
+            self._outcomes.append(True)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                self._open_locked()
+                return
+            self._outcomes.append(False)
+            calls = len(self._outcomes)
+            if calls >= self.min_calls and self._outcomes.count(False) / calls >= self.failure_rate:
+                self._open_locked()
+
+    def release(self) -> None:
+        """Give back an allowed slot without an outcome (e.g. the call was cancelled)."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._maybe_half_open_locked()
+            calls = len(self._outcomes)
+            snapshot: Dict[str, Any] = {
+                "state": self._state,
+                "calls": calls,
+                "failure_rate": round(self._outcomes.count(False) / calls, 3) if calls else 0.0,
+                "opens": self._opens,
+                "rejected": self._rejected,
+            }
+            if self._state == OPEN:
+                snapshot["retry_in_s"] = round(max(0.0, self._opened_at + self.cooldown - time.monotonic()), 1)
+            return snapshot
+
+    def _maybe_half_open_locked(self) -> None:
+        if self._state == OPEN and time.monotonic() >= self._opened_at + self.cooldown:
+            self._probes = 0
+            self._transition_locked(HALF_OPEN)
+
+    def _open_locked(self) -> None:
+        self._opened_at = time.monotonic()
+        self._opens += 1
+        self._transition_locked(OPEN)
+
+    def _transition_locked(self, state: str) -> None:
+        if state != self._state:
+            previous, self._state = self._state, state
+            record_event("circuit_state", breaker=self.name, previous=previous, state=state)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                name,
+                window=int(os.getenv("BREAKER_WINDOW", "20")),
+                min_calls=int(os.getenv("BREAKER_MIN_CALLS", "5")),
+                failure_rate=float(os.getenv("BREAKER_FAILURE_RATE", "0.5")),
+                cooldown=float(os.getenv("BREAKER_COOLDOWN_SECS", "30")),
+            )
+            _breakers[name] = breaker
+        return breaker
+
+
+def breaker_stats(prefix: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.snapshot() for b in breakers if prefix is None or b.name.startswith(prefix)}
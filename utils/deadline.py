@@ -0,0 +1,48 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# Absolute wall-clock deadline (time.time()) of the request being served, if any.
+_deadline: ContextVar[Optional[float]] = ContextVar("eatsense_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's time budget ran out before this step could run."""
+
+
+def deadline_after(seconds: Optional[float]) -> Optional[float]:
+    """Absolute deadline ``seconds`` from now; None (no deadline) for empty or non-positive budgets."""
+    return time.time() + float(seconds) if seconds and float(seconds) > 0 else None
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[float]) -> Iterator[None]:
+    """Apply ``deadline`` to everything called within; nested scopes keep the earlier deadline."""
+    current = _deadline.get()
+    if deadline is None or (current is not None and current <= deadline):
+        yield
+        return
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request's budget, or None when it has no deadline."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.time()
+
+
+def check_deadline(what: str = "request") -> None:
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Deadline exceeded before {what} ({-left:.1f}s over budget).")
+
+
+def bounded_timeout(timeout: float) -> float:
+    """``timeout`` capped to the remaining budget."""
+    left = remaining()
+    return timeout if left is None else max(0.0, min(timeout, left))
@@ -0,0 +1,271 @@
+import csv
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils.quantities import IngredientTable
+
+try:  # optional: Parquet / Arrow IPC output
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - CSV fallback
+    pa = None
+
+FORMATS = ("parquet", "arrow", "csv")
+
+# Column name -> type ("string", "float", "int", "bool") for each exported table.
+TABLES: Dict[str, List[Tuple[str, str]]] = {
+    "analyses": [
+        ("request_id", "string"), ("ts", "float"), ("session_id", "string"), ("priority", "string"),
+        ("mode", "string"), ("input_type", "string"), ("dish", "string"), ("confidence", "float"),
+        ("dishes", "int"), ("servings", "int"), ("style", "string"), ("ingredients", "int"),
+        ("calories_kcal", "float"), ("protein_g", "float"), ("carbs_g", "float"), ("fat_g", "float"),
+        ("calories_p10", "float"), ("calories_p90", "float"), ("nutrition_source", "string"),
+        ("recipe_minutes", "float"), ("recipe_status", "string"), ("commerce_status", "string"),
+        ("degraded", "string"), ("stages_ms", "float"), ("error", "string"),
+    ],
+    "candidates": [
+        ("request_id", "string"), ("rank", "int"), ("dish", "string"), ("confidence", "float"),
+    ],
+    "ingredients": [
+        ("request_id", "string"), ("dish", "string"), ("item", "string"), ("quantity_low", "float"),
+        ("quantity_high", "float"), ("unit", "string"), ("grams_low", "float"), ("grams_high", "float"),
+    ],
+    "stages": [
+        ("request_id", "string"), ("stage", "string"), ("latency_ms", "float"), ("llm_requests", "int"),
+        ("tokens", "int"), ("error", "string"),
+    ],
+}
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or np.isnan(value):
+        return None
+    return float(value)
+
+
+def _coerce(value: Any, kind: str) -> Any:
+    if value is None or value == "":
+        return None
+    try:
+        if kind == "int":
+            return int(value)
+        if kind == "float":
+            return float(value)
+        if kind == "bool":
+            return bool(value)
+    except (TypeError, ValueError):
+        return None
+    return str(value)
+
+
+def _record_id(record: Dict[str, Any]) -> str:
+    if record.get("request_id"):
+        return str(record["request_id"])
+    # Batch results written before request ids were included: derive a stable id from the input.
+    payload = json.dumps([record.get("index"), record.get("input")], sort_keys=True, default=str)
+    return "input-" + hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+
+def _ingredient_rows(request_id: str, dish: str, ingredient_output: Dict[str, Any]) -> List[Dict[str, Any]]:
+    table = IngredientTable.from_output(ingredient_output or {})
+    grams = table.grams
+    return [
+        {
+            "request_id": request_id,
+            "dish": dish,
+            "item": item,
+            "quantity_low": _number(table.quantities[idx, 0]),
+            "quantity_high": _number(table.quantities[idx, 1]),
+            "unit": table.units[idx],
+            "grams_low": _number(grams[idx, 0]),
+            "grams_high": _number(grams[idx, 1]),
+        }
+        for idx, item in enumerate(table.items)
+    ]
+
+
+def flatten(record: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """Rows per table for one analysis: a batch_run.py result line or a trace log record."""
+    trace = record.get("trace") or {}
+    output = record.get("output") or {}
+    request_id = _record_id(record)
+    interpreter = trace.get("InterpreterAgent") or {}
+    nutrition = output.get("nutrition") or trace.get("NutritionAgent") or {}
+    per_serving = nutrition.get("per_serving") or {}
+    band = ((nutrition.get("interval") or {}).get("per_serving") or {}).get("calories_kcal") or {}
+    recipe = trace.get("RecipeAgent") or {}
+    ingredient_output = trace.get("IngredientAgent") or {}
+    plate = trace.get("PlateDishes")
+    candidates = output.get("dish") if isinstance(output.get("dish"), list) else interpreter.get("candidates") or []
+
+    rows: Dict[str, List[Dict[str, Any]]] = {name: [] for name in TABLES}
+    for rank, candidate in enumerate(candidates):
+        rows["candidates"].append({
+            "request_id": request_id,
+            "rank": rank,
+            "dish": candidate.get("dish"),
+            "confidence": _number(candidate.get("confidence")),
+        })
+    if plate:
+        for entry in plate:
+            if entry.get("ingredients"):
+                rows["ingredients"] += _ingredient_rows(request_id, entry["dish"], entry["ingredients"])
+    elif ingredient_output:
+        rows["ingredients"] += _ingredient_rows(request_id, ingredient_output.get("dish") or "", ingredient_output)
+
+    stages_ms = 0.0
+    for name, stage in (trace.get("Stages") or {}).items():
+        events = stage.get("events") or []
+        llm = [event for event in events if event.get("kind") == "llm_request"]
+        stages_ms += stage.get("latency_ms") or 0.0
+        rows["stages"].append({
+            "request_id": request_id,
+            "stage": name,
+            "latency_ms": _number(stage.get("latency_ms")),
+            "llm_requests": len(llm),
+            "tokens": int(sum(event.get("tokens") or 0 for event in llm)),
+            "error": stage.get("error"),
+        })
+
+    top = candidates[0] if candidates else {}
+    rows["analyses"].append({
+        "request_id": request_id,
+        "ts": _number(record.get("ts")),
+        "session_id": record.get("session_id"),
+        "priority": record.get("priority"),
+        "mode": "plate" if plate else "dish",
+        "input_type": interpreter.get("input_type"),
+        "dish": top.get("dish"),
+        "confidence": _number(top.get("confidence")),
+        "dishes": len(plate) if plate else 1,
+        "servings": nutrition.get("servings") or ingredient_output.get("servings_assumption"),
+        "style": ingredient_output.get("style") or recipe.get("style"),
+        "ingredients": len(rows["ingredients"]),
+        "calories_kcal": _number(per_serving.get("calories_kcal")),
+        "protein_g": _number(per_serving.get("protein_g")),
+        "carbs_g": _number(per_serving.get("carbs_g")),
+        "fat_g": _number(per_serving.get("fat_g")),
+        "calories_p10": _number(band.get("p10")),
+        "calories_p90": _number(band.get("p90")),
+        "nutrition_source": nutrition.get("source") or ("llm" if per_serving else None),
+        "recipe_minutes": None if plate else _number(recipe.get("time_minutes")),
+        "recipe_status": None if plate else (recipe.get("status") or ("ok" if recipe else None)),
+        "commerce_status": (output.get("commerce") or trace.get("CommerceAgent") or {}).get("status"),
+        "degraded": ",".join(sorted(trace.get("Degraded") or output.get("degraded") or {})),
+        "stages_ms": round(stages_ms, 1),
+        "error": record.get("error"),
+    })
+    return rows
+
+
+class _TableWriter:
+    """Buffers rows for one table and writes them out a row group at a time."""
+
+    def __init__(self, directory: Path, name: str, fmt: str, part: str) -> None:
+        self.name = name
+        self.fmt = fmt
+        self.columns = TABLES[name]
+        self.rows: List[Dict[str, Any]] = []
+        self._writer: Any = None
+        if fmt == "csv":
+            self.path = directory / f"{name}.csv"
+        else:
+            # Parquet/IPC files can't be appended to; each export session adds a part file.
+            self.path = directory / name / f"part-{part}.{'parquet' if fmt == 'parquet' else 'arrow'}"
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            types = {"string": pa.string(), "float": pa.float64(), "int": pa.int64(), "bool": pa.bool_()}
+            self.schema = pa.schema([(column, types[kind]) for column, kind in self.columns])
+
+    def flush(self) -> int:
+        if not self.rows:
+            return 0
+        rows, self.rows = self.rows, []
+        if self.fmt == "csv":
+            new = not self.path.exists()
+            with open(self.path, "a", newline="", encoding="utf-8") as handle:
+                writer = csv.DictWriter(handle, fieldnames=[column for column, _ in self.columns], extrasaction="ignore")
+                if new:
+                    writer.writeheader()
+                writer.writerows(rows)
+            return len(rows)
+        batch = pa.RecordBatch.from_pydict(
+            {column: [_coerce(row.get(column), kind) for row in rows] for column, kind in self.columns},
+            schema=self.schema,
+        )
+        if self._writer is None:
+            if self.fmt == "parquet":
+                self._writer = pq.ParquetWriter(self.path, self.schema, compression="zstd")
+            else:
+                self._writer = pa_ipc.new_file(str(self.path), self.schema)
+        if self.fmt == "parquet":
+            self._writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self._writer.write(batch)
+        return len(rows)
+
+    def close(self) -> None:
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class ResultExporter:
+    """Streams flattened analyses into columnar tables under ``directory``.
+
+    Rows are buffered per table and written as one row group every ``row_group_size`` rows,
+    so memory stays bounded however many records go through. ``format`` is parquet or
+    arrow (with pyarrow) or csv; "auto" picks parquet when pyarrow is installed. Safe to
+    call ``add`` from several threads.
+    """
+
+    def __init__(self, directory: Path, format: str = "auto", row_group_size: int = 10_000) -> None:
+        if format == "auto":
+            format = "parquet" if pa is not None else "csv"
+        if format not in FORMATS:
+            raise ValueError(f"Unknown export format: {format}")
+        if format != "csv" and pa is None:
+            raise RuntimeError(f"{format} export needs pyarrow (pip install pyarrow); use --format csv.")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.format = format
+        self.row_group_size = row_group_size
+        part = f"{time.strftime('%Y%m%dT%H%M%S')}-{time.time_ns() % 1_000_000:06d}"
+        self._tables = {name: _TableWriter(self.directory, name, format, part) for name in TABLES}
+        self._lock = threading.Lock()
+        self.records = 0
+
+    def add(self, record: Dict[str, Any]) -> None:
+        rows = flatten(record)
+        with self._lock:
+            self.records += 1
+            for name, table_rows in rows.items():
+                table = self._tables[name]
+                table.rows.extend(table_rows)
+                if len(table.rows) >= self.row_group_size:
+                    table.flush()
+
+    def add_many(self, records: Iterable[Dict[str, Any]]) -> int:
+        count = 0
+        for record in records:
+            self.add(record)
+            count += 1
+        return count
+
+    def close(self) -> None:
+        with self._lock:
+            for table in self._tables.values():
+                table.close()
+
+    def __enter__(self) -> "ResultExporter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
@@ -0,0 +1,220 @@
+import io
+import os
+import tempfile
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from utils.blobstore import store_image_bytes
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".m4v", ".webm", ".avi")
+
+# Sharpness (Laplacian variance of a 256px grayscale) at which the sharpness score is 0.5.
+_SHARPNESS_HALF = 100.0
+_ANALYSIS_SIDE = 256
+_COMPOSITE_HEIGHT = 512
+
+
+def gray_array(image: Image.Image, max_side: int = _ANALYSIS_SIDE) -> np.ndarray:
+    small = image.convert("L")
+    small.thumbnail((max_side, max_side))
+    return np.asarray(small, dtype=np.float32)
+
+
+def laplacian_variance(gray: np.ndarray) -> float:
+    """Variance of the 4-neighbour Laplacian; low values mean blur."""
+    if gray.shape[0] < 3 or gray.shape[1] < 3:
+        return 0.0
+    lap = (
+        gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+        - 4.0 * gray[1:-1, 1:-1]
+    )
+    return float(lap.var())
+
+
+def dhash(image: Image.Image, size: int = 8) -> int:
+    """64-bit difference hash: near-duplicate frames differ in only a few bits."""
+    pixels = np.asarray(image.convert("L").resize((size + 1, size), Image.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def score_frame(image: Image.Image) -> Dict[str, float]:
+    """Local quality score in [0, 1] from sharpness, exposure and resolution."""
+    gray = gray_array(image)
+    sharpness = laplacian_variance(gray)
+    brightness = float(gray.mean()) / 255.0
+    clipped = float(((gray < 8) | (gray > 247)).mean())
+    exposure = max(0.0, 1.0 - abs(brightness - 0.5) * 2.0) * (1.0 - clipped)
+    size = min(1.0, min(image.size) / 512.0)
+    sharp_score = sharpness / (sharpness + _SHARPNESS_HALF)
+    return {
+        "score": round(0.5 * sharp_score + 0.3 * exposure + 0.2 * size, 4),
+        "sharpness": round(sharpness, 1),
+        "brightness": round(brightness, 3),
+        "clipped": round(clipped, 3),
+        "width": image.size[0],
+        "height": image.size[1],
+    }
+
+
+def assess_quality(image: Image.Image) -> Dict[str, Any]:
+    """Cheap local usability check: blur, exposure, contrast and resolution on a thumbnail."""
+    gray = gray_array(image)
+    histogram, _ = np.histogram(gray, bins=256, range=(0, 256))
+    cdf = np.cumsum(histogram) / max(1, gray.size)
+    low, high = int(np.searchsorted(cdf, 0.05)), int(np.searchsorted(cdf, 0.95))
+    metrics = {
+        "sharpness": round(laplacian_variance(gray), 1),
+        "brightness": round(float(gray.mean()) / 255.0, 3),
+        "contrast": high - low,
+        "min_side": min(image.size),
+    }
+    reasons = []
+    if metrics["min_side"] < int(os.getenv("IMAGE_GATE_MIN_SIDE", "160")):
+        reasons.append("too_small")
+    if metrics["sharpness"] < float(os.getenv("IMAGE_GATE_MIN_SHARPNESS", "25")):
+        reasons.append("blurry")
+    if metrics["brightness"] < float(os.getenv("IMAGE_GATE_MIN_BRIGHTNESS", "0.12")):
+        reasons.append("too_dark")
+    elif metrics["brightness"] > float(os.getenv("IMAGE_GATE_MAX_BRIGHTNESS", "0.95")):
+        reasons.append("overexposed")
+    if metrics["contrast"] < int(os.getenv("IMAGE_GATE_MIN_CONTRAST", "24")):
+        reasons.append("low_contrast")
+    return {"ok": not reasons, "reasons": reasons, **metrics}
+
+
+def sample_frames(name: str, data: bytes, samples: int) -> List[Image.Image]:
+    """Frames of one upload: the image itself, or up to ``samples`` evenly spaced frames of
+    an animation (GIF/WebP) or video."""
+    if name.lower().endswith(VIDEO_EXTENSIONS):
+        return _video_frames(data, name, samples)
+    image = Image.open(io.BytesIO(data))
+    count = getattr(image, "n_frames", 1)
+    if count <= 1:
+        image.load()
+        return [image]
+    frames = []
+    for index in sorted({int(i) for i in np.linspace(0, count - 1, min(samples, count))}):
+        image.seek(index)
+        frames.append(image.convert("RGB"))
+    return frames
+
+
+def _video_frames(data: bytes, name: str, samples: int) -> List[Image.Image]:
+    try:
+        import cv2  # optional: only needed for video uploads
+    except ImportError as exc:
+        raise RuntimeError("Video input needs opencv-python (pip install opencv-python-headless).") from exc
+
+    suffix = os.path.splitext(name)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix) as handle:
+        handle.write(data)
+        handle.flush()
+        capture = cv2.VideoCapture(handle.name)
+        try:
+            count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) or samples
+            frames = []
+            for index in sorted({int(i) for i in np.linspace(0, max(count - 1, 0), samples)}):
+                capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+                ok, frame = capture.read()
+                if ok:
+                    frames.append(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+        finally:
+            capture.release()
+    if not frames:
+        raise RuntimeError(f"Could not read frames from {name}.")
+    return frames
+
+
+def select_frames(
+    frames: Sequence[Tuple[str, Image.Image]],
+    keep: int = 2,
+    duplicate_distance: int = 10,
+    min_relative: float = 0.6,
+) -> Tuple[List[int], List[Dict[str, Any]]]:
+    """Indices of the best ``keep`` distinct frames, and every frame's score record.
+
+    Frames are ranked by score; a frame whose dHash is within ``duplicate_distance`` bits of
+    an already kept frame is marked as a duplicate instead. Frames scoring below
+    ``min_relative`` of the best one are never worth a place next to it.
+    """
+    records = []
+    for label, image in frames:
+        records.append({"frame": label, **score_frame(image), "hash": dhash(image)})
+    kept: List[int] = []
+    for index in sorted(range(len(records)), key=lambda i: records[i]["score"], reverse=True):
+        record = records[index]
+        duplicate_of = next((k for k in kept if hamming(records[k]["hash"], record["hash"]) <= duplicate_distance), None)
+        if duplicate_of is not None:
+            record["duplicate_of"] = records[duplicate_of]["frame"]
+        elif len(kept) < keep and (not kept or record["score"] >= min_relative * records[kept[0]]["score"]):
+            kept.append(index)
+    for record in records:
+        record["hash"] = f"{record['hash']:016x}"
+        record["selected"] = False
+    for index in kept:
+        records[index]["selected"] = True
+    return kept, records
+
+
+def _side_by_side(images: Sequence[Image.Image], height: int = _COMPOSITE_HEIGHT) -> Image.Image:
+    scaled = [image.convert("RGB").resize((max(1, round(image.width * height / image.height)), height)) for image in images]
+    canvas = Image.new("RGB", (sum(image.width for image in scaled) + 8 * (len(scaled) - 1), height), "white")
+    x = 0
+    for image in scaled:
+        canvas.paste(image, (x, 0))
+        x += image.width + 8
+    return canvas
+
+
+def ingest_media(uploads: Sequence[Tuple[str, bytes]]) -> Dict[str, Any]:
+    """Reduce several photos and/or a short clip to one image for the interpreter.
+
+    Frames are sampled, scored and deduplicated locally; the best one is sent as is, or the
+    best two side by side as a single image (one vision call either way). Returns the same
+    shape as utils.io.safe_open_image, with the selection under ``meta["frames"]``.
+    """
+    try:
+        samples = int(os.getenv("INGEST_VIDEO_SAMPLES", "12"))
+        frames: List[Tuple[str, Image.Image]] = []
+        for name, data in uploads:
+            sampled = sample_frames(name, data, samples)
+            frames += [(name if len(sampled) == 1 else f"{name}#{i}", frame) for i, frame in enumerate(sampled)]
+        if not frames:
+            return {"ok": False, "error": "No images or frames to analyze."}
+        kept, records = select_frames(
+            frames,
+            keep=int(os.getenv("INGEST_MAX_FRAMES", "2")),
+            duplicate_distance=int(os.getenv("INGEST_DUPLICATE_DISTANCE", "10")),
+        )
+        chosen = [frames[index][1] for index in kept]
+        image = chosen[0] if len(chosen) == 1 else _side_by_side(chosen)
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, format="JPEG", quality=90)
+        image_ref = store_image_bytes(buffer.getvalue(), "image/jpeg")
+        return {
+            "ok": True,
+            "image": image,
+            "meta": {
+                "name": ", ".join(frames[index][0] for index in kept),
+                "size": image.size,
+                "mode": "RGB",
+                "quality": assess_quality(image),
+                "frames": {
+                    "uploads": len(uploads),
+                    "sampled": len(frames),
+                    "duplicates": sum(1 for record in records if "duplicate_of" in record),
+                    "composite": len(chosen) > 1,
+                    "scores": records,
+                },
+            },
+            "image_ref": image_ref,
+        }
+    except Exception as exc:
+        return {"ok": False, "error": str(exc)}
@@ -1,7 +1,16 @@
-import base64
-from typing import Dict, Any
+import io
+import threading
+from typing import Dict, Any, Optional
+
 from PIL import Image
 
+from utils.blobstore import get_blob_store, load_image_bytes, store_image_bytes
+from utils.imaging import assess_quality
+
+_THUMBNAIL_MEMO_SIZE = 1024
+_thumbnails: Dict[str, str] = {}
+_thumbnails_lock = threading.Lock()
+
 
 def safe_open_image(file) -> Dict[str, Any]:
     try:
@@ -12,7 +21,7 @@ def safe_open_image(file) -> Dict[str, Any]:
         file.seek(0)
         data = file.read()
         mime = "image/png" if (image.format or "").lower() == "png" else "image/jpeg"
-        data_url = f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+        image_ref = store_image_bytes(data, mime)
         return {
             "ok": True,
             "image": image,
@@ -20,8 +29,34 @@ def safe_open_image(file) -> Dict[str, Any]:
                 "name": getattr(file, "name", "uploaded_image"),
                 "size": image.size,
                 "mode": image.mode,
+                "quality": assess_quality(image),
             },
-            "data_url": data_url,
+            "image_ref": image_ref,
         }
     except Exception as exc:
         return {"ok": False, "error": str(exc)}
+
+
+def thumbnail_ref(image_ref: str, max_side: int = 512) -> Optional[str]:
+    """Blob ref of a JPEG downscaled to ``max_side``; the original ref if already small enough."""
+    key = f"{image_ref}@{max_side}"
+    with _thumbnails_lock:
+        cached = _thumbnails.get(key)
+    if cached and cached in get_blob_store():
+        return cached
+    entry = load_image_bytes(image_ref)
+    if entry is None:
+        return None
+    image = Image.open(io.BytesIO(entry[0]))
+    if max(image.size) <= max_side:
+        ref = image_ref
+    else:
+        image.thumbnail((max_side, max_side))
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, format="JPEG", quality=85)
+        ref = store_image_bytes(buffer.getvalue(), "image/jpeg")
+    with _thumbnails_lock:
+        if len(_thumbnails) >= _THUMBNAIL_MEMO_SIZE:
+            _thumbnails.pop(next(iter(_thumbnails)))
+        _thumbnails[key] = ref
+    return ref
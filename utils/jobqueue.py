@@ -0,0 +1,302 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+DEFAULT_JOBS_DB = Path(__file__).resolve().parents[1] / ".jobs" / "jobs.db"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+DEAD = "dead"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    visible_at REAL NOT NULL,
+    lease_owner TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, visible_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    data TEXT NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, seq);
+CREATE TABLE IF NOT EXISTS dead_letter (
+    id TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    error TEXT,
+    failed_at REAL NOT NULL
+);
+"""
+
+
+def fingerprint(kind: str, inputs: Dict[str, Any]) -> str:
+    """Stable hash of the inputs that determine a job's result."""
+    payload = json.dumps([kind, inputs], sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class JobQueue:
+    """Durable job queue in SQLite (WAL), shared by the web tier and worker processes.
+
+    Jobs are unique by input fingerprint: submitting the same inputs again returns the
+    existing job (queued, running, or done within ``dedupe_ttl`` seconds) instead of running
+    the work twice. A worker
+    that claims a job holds a lease for ``visibility`` seconds and must heartbeat to keep
+    it; if the worker dies the job becomes visible again. Failed attempts are retried with
+    exponential backoff, and after ``max_attempts`` the job moves to ``dead_letter``.
+    Stage completions are appended to ``job_events`` for clients to poll; they describe
+    the current attempt only.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        visibility: float = 120.0,
+        max_attempts: int = 3,
+        retry_backoff: float = 2.0,
+        dedupe_ttl: float = 3600.0,
+    ) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.visibility = visibility
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.dedupe_ttl = dedupe_ttl
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # One short-lived connection per operation: safe across threads and processes.
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def submit(self, kind: str, payload: Dict[str, Any], inputs: Optional[Dict[str, Any]] = None) -> str:
+        """Enqueue a job and return its id; ``inputs`` (default: payload) are what make it unique."""
+        key = fingerprint(kind, payload if inputs is None else inputs)
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT id, status, updated_at FROM jobs WHERE fingerprint = ?", (key,)).fetchone()
+            if row is not None:
+                if row["status"] != DONE or row["updated_at"] > now - self.dedupe_ttl:
+                    return row["id"]
+                # A stale result is not reused: forget it and run the inputs again.
+                conn.execute("DELETE FROM job_events WHERE job_id = ?", (row["id"],))
+                conn.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, fingerprint, kind, payload, status, max_attempts, visible_at, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, key, kind, json.dumps(payload, default=str), QUEUED, self.max_attempts, now, now, now),
+            )
+        return job_id
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """Lease the oldest visible job (queued, or running with an expired lease) to ``worker``."""
+        now = time.time()
+        with self._transaction() as conn:
+            # Expired leases that already used every attempt go to the dead-letter table.
+            for row in conn.execute(
+                "SELECT * FROM jobs WHERE status = ? AND visible_at <= ? AND attempts >= max_attempts",
+                (RUNNING, now),
+            ).fetchall():
+                self._bury(conn, row, "Lease expired on the final attempt (worker lost?).")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) AND visible_at <= ? ORDER BY created_at LIMIT 1",
+                (QUEUED, RUNNING, now),
+            ).fetchone()
+            if row is None:
+                return None
+            if row["attempts"]:
+                # Stage events of an earlier attempt would show up twice next to this one's.
+                conn.execute("DELETE FROM job_events WHERE job_id = ?", (row["id"],))
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_owner = ?, visible_at = ?, updated_at = ?"
+                " WHERE id = ?",
+                (RUNNING, worker, now + self.visibility, now, row["id"]),
+            )
+        return {
+            "id": row["id"],
+            "kind": row["kind"],
+            "payload": json.loads(row["payload"]),
+            "attempt": row["attempts"] + 1,
+        }
+
+    def heartbeat(self, job_id: str, worker: str) -> bool:
+        """Extend the lease; False if the worker no longer owns the job."""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET visible_at = ?, updated_at = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+                (now + self.visibility, now, job_id, RUNNING, worker),
+            )
+            return cursor.rowcount == 1
+
+    def add_event(self, job_id: str, stage: str, data: Dict[str, Any], worker: Optional[str] = None) -> bool:
+        """Append a stage event; with ``worker``, only while that worker still holds the lease."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO job_events (job_id, stage, data, ts) SELECT ?, ?, ?, ?"
+                " WHERE ? IS NULL OR EXISTS (SELECT 1 FROM jobs WHERE id = ? AND status = ? AND lease_owner = ?)",
+                (job_id, stage, json.dumps(data, default=str), time.time(), worker, job_id, RUNNING, worker),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker: str, result: Dict[str, Any]) -> bool:
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, lease_owner = NULL, updated_at = ?"
+                " WHERE id = ? AND status = ? AND lease_owner = ?",
+                (DONE, json.dumps(result, default=str), now, job_id, RUNNING, worker),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: str, worker: str, error: str, retryable: bool = True) -> str:
+        """Record a failed attempt; returns the job's new status (queued for a retry, or dead)."""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE id = ? AND status = ? AND lease_owner = ?", (job_id, RUNNING, worker)
+            ).fetchone()
+            if row is None:
+                return "lost"
+            if not retryable or row["attempts"] >= row["max_attempts"]:
+                self._bury(conn, row, error)
+                return DEAD
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, visible_at = ?, updated_at = ? WHERE id = ?",
+                (QUEUED, error, now + self.retry_backoff * 2 ** (row["attempts"] - 1), now, job_id),
+            )
+            return QUEUED
+
+    def _bury(self, conn: sqlite3.Connection, row: sqlite3.Row, error: str) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO dead_letter (id, fingerprint, kind, payload, attempts, error, failed_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (row["id"], row["fingerprint"], row["kind"], row["payload"], row["attempts"], error, time.time()),
+        )
+        # Free the fingerprint so the same inputs can be submitted again.
+        conn.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is not None:
+                return {
+                    "id": row["id"],
+                    "kind": row["kind"],
+                    "status": row["status"],
+                    "attempts": row["attempts"],
+                    "error": row["error"],
+                    "result": json.loads(row["result"]) if row["result"] else None,
+                }
+            row = conn.execute("SELECT * FROM dead_letter WHERE id = ?", (job_id,)).fetchone()
+            if row is not None:
+                return {
+                    "id": row["id"],
+                    "kind": row["kind"],
+                    "status": DEAD,
+                    "attempts": row["attempts"],
+                    "error": row["error"],
+                    "result": None,
+                }
+        return None
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        """Stage completions of ``job_id`` with seq > ``after``, oldest first."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT seq, stage, data, ts FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after),
+            ).fetchall()
+        return [{"seq": r["seq"], "stage": r["stage"], "ts": r["ts"], **json.loads(r["data"])} for r in rows]
+
+    def follow(self, job_id: str, poll_interval: float = 0.5, timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """Yield stage events as they arrive, then the final job record (status done or dead)."""
+        seq = 0
+        started = time.monotonic()
+        while True:
+            for event in self.events(job_id, seq):
+                seq = event["seq"]
+                yield event
+            job = self.get(job_id)
+            if job is None or job["status"] in (DONE, DEAD):
+                for event in self.events(job_id, seq):
+                    yield event
+                if job is not None:
+                    yield job
+                return
+            if timeout is not None and time.monotonic() - started > timeout:
+                return
+            time.sleep(poll_interval)
+
+    def stats(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            counts = {row["status"]: row["n"] for row in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+            counts[DEAD] = conn.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+        return {status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, DEAD)}
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def jobs_enabled() -> bool:
+    return os.getenv("JOBS_ENABLED", "false").lower() == "true"
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue(
+                    Path(os.getenv("JOBS_DB") or DEFAULT_JOBS_DB),
+                    visibility=float(os.getenv("JOBS_VISIBILITY_SECS", "120")),
+                    max_attempts=int(os.getenv("JOBS_MAX_ATTEMPTS", "3")),
+                    retry_backoff=float(os.getenv("JOBS_RETRY_BACKOFF_SECS", "2")),
+                    dedupe_ttl=float(os.getenv("JOBS_DEDUPE_TTL_SECS", "3600")),
+                )
+    return _queue
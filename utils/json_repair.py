@@ -0,0 +1,133 @@
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+_counts = {"repaired": 0, "failed": 0}
+_counts_lock = threading.Lock()
+
+
+def repair_json(text: str) -> Optional[Any]:
+    """Best-effort parse of almost-JSON model output; None if it can't be recovered.
+
+    Handles code fences and surrounding prose, Python literals, trailing commas, and
+    output truncated mid-string or with unclosed brackets.
+    """
+    if not text:
+        return None
+    start = _first_bracket(text)
+    fenced = _FENCE.search(text)
+    # Only a fence that opens before the JSON wraps it; backticks may also sit inside a string.
+    if fenced and (start < 0 or fenced.start() < start):
+        text = fenced.group(1)
+        start = _first_bracket(text)
+    if start < 0:
+        return None
+    candidate = _balance(_normalize(text[start:]))
+    for attempt in (candidate, _drop_dangling(candidate)):
+        try:
+            return json.loads(attempt)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def _first_bracket(text: str) -> int:
+    return min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+
+
+def _normalize(text: str) -> str:
+    """Rewrite Python literals and drop trailing commas outside strings; stop after the
+    first complete top-level value."""
+    out: List[str] = []
+    depth = 0
+    in_string = escaped = False
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+            out.append(char)
+        elif char in "{[":
+            depth += 1
+            out.append(char)
+        elif char in "}]":
+            _strip_comma(out)
+            depth -= 1
+            out.append(char)
+            if depth == 0:
+                break
+        elif char.isalpha():
+            word = re.match(r"[A-Za-z]+", text[i:]).group(0)
+            out.append(_PY_LITERALS.get(word, word))
+            i += len(word)
+            continue
+        else:
+            out.append(char)
+        i += 1
+    return "".join(out)
+
+
+def _strip_comma(out: List[str]) -> None:
+    """Remove a trailing comma (and the whitespace after it) from the scanned output."""
+    end = len(out)
+    while end and out[end - 1].isspace():
+        end -= 1
+    if end and out[end - 1] == ",":
+        del out[end - 1:]
+
+
+def _balance(text: str) -> str:
+    """Close an unterminated string and any brackets left open by truncation."""
+    stack: List[str] = []
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    text = text.rstrip().rstrip(",")
+    return text + "".join(reversed(stack))
+
+
+def _drop_dangling(text: str) -> str:
+    """Cut a truncated trailing member (``"key": `` or ``"key"``) that can't be completed."""
+    body = text.rstrip("}] ")
+    cut = max(body.rfind(","), body.rfind("{"), body.rfind("["))
+    if cut < 0:
+        return text
+    trimmed = body[: cut + 1] if body[cut] in "{[" else body[:cut]
+    return _balance(trimmed)
+
+
+def record_repair(outcome: str) -> None:
+    with _counts_lock:
+        _counts[outcome] = _counts.get(outcome, 0) + 1
+
+
+def repair_stats() -> Dict[str, int]:
+    """Local repair outcomes; every "repaired" is an LLM round trip that was not needed."""
+    with _counts_lock:
+        return dict(_counts)
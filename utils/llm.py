@@ -1,10 +1,32 @@
+import copy
+import hashlib
 import os
-from typing import Any, List, Optional, Type, Union
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
 
 import json
 
+import openai
 from openai import OpenAI
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+
+from utils.blobstore import load_data_url
+from utils.breaker import CircuitOpenError, get_breaker
+from utils.deadline import DeadlineExceeded, bounded_timeout, check_deadline, remaining
+from utils.json_repair import record_repair, repair_json
+from utils.metrics import LLM_INFLIGHT
+from utils.ratelimit import current_priority, get_scheduler
+from utils.router import get_router
+from utils.schemas import get_schema
+from utils.singleflight import SingleFlight, WaitTimeout
+from utils.tracing import record_event
+
+# Rough per-request token cost used to charge the limiter before usage is known.
+_IMAGE_TOKEN_ESTIMATE = 765
+_LOW_DETAIL_IMAGE_TOKENS = 85
+_OUTPUT_TOKEN_ESTIMATE = 600
+
+_flight = SingleFlight()
 
 
 def _get_client() -> OpenAI:
@@ -13,26 +35,219 @@ def _get_client() -> OpenAI:
         raise RuntimeError("Missing OPENAI_API_KEY in environment.")
     base_url = os.getenv("OPENAI_BASE_URL")
     timeout = float(os.getenv("OPENAI_TIMEOUT_SECS", "30"))
-    return OpenAI(api_key=api_key, base_url=base_url, timeout=timeout)
+    # Under a request deadline a retry would overrun the budget; the coordinator degrades instead.
+    max_retries = 0 if remaining() is not None else 2
+    return OpenAI(api_key=api_key, base_url=base_url, timeout=timeout, max_retries=max_retries)
+
+
+def _endpoint() -> str:
+    return os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1"
+
+
+def _is_backend_failure(exc: Exception) -> bool:
+    # Client errors (bad request, auth, schema) mean the backend answered; don't trip on them.
+    if isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code >= 500
+
+
+def _estimate_tokens(*texts: Optional[str], image: bool = False, image_detail: Optional[str] = None) -> int:
+    chars = sum(len(text) for text in texts if text)
+    image_tokens = 0
+    if image:
+        image_tokens = _LOW_DETAIL_IMAGE_TOKENS if image_detail == "low" else _IMAGE_TOKEN_ESTIMATE
+    return chars // 4 + image_tokens + _OUTPUT_TOKEN_ESTIMATE
+
+
+def _send(send: Callable[[float], Any], model_name: str, estimated_tokens: int) -> Any:
+    """Run ``send(timeout)`` under the breaker, rate limiter and request deadline."""
+    check_deadline(f"{model_name} request")
+    # Fail fast while the endpoint's breaker is open instead of waiting out the timeout.
+    breaker = get_breaker(f"llm:{_endpoint()}")
+    breaker.check()
+    scheduler = get_scheduler()
+    try:
+        queue_wait = scheduler.acquire(estimated_tokens)
+    except BaseException:
+        breaker.release()
+        raise
+    LLM_INFLIGHT.inc()
+    try:
+        check_deadline(f"{model_name} request")
+        response = send(bounded_timeout(float(os.getenv("OPENAI_TIMEOUT_SECS", "30"))))
+    except Exception as exc:
+        left = remaining()
+        if left is not None and left <= 0:
+            # Timed out on our own budget, not the backend's health.
+            breaker.release()
+            if isinstance(exc, DeadlineExceeded):
+                raise
+            raise DeadlineExceeded(f"Deadline exceeded during {model_name} request.") from exc
+        if _is_backend_failure(exc):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        raise
+    except BaseException:
+        breaker.release()
+        raise
+    finally:
+        LLM_INFLIGHT.dec()
+    breaker.record_success()
+    usage = getattr(response, "usage", None)
+    used = getattr(usage, "total_tokens", None) if usage is not None else None
+    scheduler.settle(estimated_tokens, used)
+    record_event(
+        "llm_request",
+        model=model_name,
+        priority=current_priority(),
+        queue_wait_ms=round(queue_wait * 1000, 1),
+        tokens=used,
+    )
+    return response
+
+
+def coalescing_stats() -> Dict[str, int]:
+    return _flight.stats()
+
+
+def _fingerprint(model_cls: Type[BaseModel], model_name: str, temperature: float, *parts: Any) -> str:
+    payload = json.dumps(
+        [f"{model_cls.__module__}.{model_cls.__qualname__}", model_name, temperature, *parts],
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
 
 def call_structured(
     model_cls: Type[BaseModel],
     system_prompt: str,
     user_text: str,
-    image_data_url: Optional[str] = None,
+    image_ref: Optional[str] = None,
     extra_user_text: Optional[str] = None,
     allow_invalid: bool = False,
-) -> Union[BaseModel, dict]:
-    model_name = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    context: Optional[Dict[str, Any]] = None,
+    stage: Optional[str] = None,
+    confidence: Optional[Callable[[Dict[str, Any]], Optional[float]]] = None,
+    image_detail: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Call the model with the registered JSON schema and return the normalized output dict.
+
+    ``context`` feeds the schema's context-dependent defaults (e.g. requested servings).
+    With ``allow_invalid``, output that still fails validation is returned best-effort.
+    ``stage`` selects the per-stage model configuration; when the stage cascades, a model
+    whose output fails validation or scores below OPENAI_CASCADE_MIN_CONFIDENCE under
+    ``confidence`` is escalated to the next configured model. ``image_detail`` (low|high|auto)
+    is passed through to the vision input.
+    """
     temperature = float(os.getenv("OPENAI_TEMPERATURE", "0"))
+    min_confidence = float(os.getenv("OPENAI_CASCADE_MIN_CONFIDENCE", "0.6"))
+    context = context or {}
+    router = get_router()
+    models = router.plan(stage)
+    for tier, model_name in enumerate(models):
+        last = tier == len(models) - 1
+        started = time.perf_counter()
+        try:
+            data, valid = _call_coalesced(
+                model_cls, system_prompt, user_text, image_ref, extra_user_text, allow_invalid, context, model_name, temperature,
+                image_detail,
+            )
+        except DeadlineExceeded:
+            record_event("model_route", stage=stage, model=model_name, tier=tier, outcome="deadline", escalated=False)
+            raise
+        except Exception as exc:
+            # A rejected call says nothing about the model's own latency or health.
+            if not isinstance(exc, CircuitOpenError):
+                router.observe(stage, model_name, time.perf_counter() - started, ok=False)
+            outcome = "circuit_open" if isinstance(exc, CircuitOpenError) else "error"
+            record_event("model_route", stage=stage, model=model_name, tier=tier, outcome=outcome, escalated=not last)
+            if last:
+                raise
+            continue
+        latency = time.perf_counter() - started
+        router.observe(stage, model_name, latency, ok=valid)
+        score = confidence(data) if confidence and valid else None
+        escalate = not last and (not valid or (score is not None and score < min_confidence))
+        record_event(
+            "model_route",
+            stage=stage,
+            model=model_name,
+            tier=tier,
+            latency_ms=round(latency * 1000, 1),
+            outcome="valid" if valid else "invalid",
+            confidence=score,
+            escalated=escalate,
+        )
+        if not escalate:
+            return data
+    raise RuntimeError("No model configured.")  # pragma: no cover - plan() never returns an empty list
+
+
+def _call_coalesced(
+    model_cls: Type[BaseModel],
+    system_prompt: str,
+    user_text: str,
+    image_ref: Optional[str],
+    extra_user_text: Optional[str],
+    allow_invalid: bool,
+    context: Dict[str, Any],
+    model_name: str,
+    temperature: float,
+    image_detail: Optional[str] = None,
+) -> Tuple[Dict[str, Any], bool]:
+    # Identical in-flight requests share one round trip; each caller gets its own copy
+    # because agents mutate the returned dicts. Priority is part of the key so a request
+    # never waits on a leader queued behind lower-priority traffic.
+    key = _fingerprint(
+        model_cls, model_name, temperature, system_prompt, user_text, image_ref, image_detail, extra_user_text,
+        allow_invalid, context, current_priority(),
+    )
+    try:
+        result, coalesced = _flight.do(
+            key,
+            lambda: _call_structured(
+                model_cls, system_prompt, user_text, image_ref, extra_user_text, allow_invalid, context, model_name,
+                temperature, image_detail,
+            ),
+            clone=copy.deepcopy,
+            # A waiter is bounded by its own budget, and the leader's deadline or open breaker
+            # is not the waiter's failure: it retries as the new leader instead.
+            timeout=remaining(),
+            retry_on=(DeadlineExceeded, CircuitOpenError),
+        )
+    except WaitTimeout as exc:
+        raise DeadlineExceeded(f"Deadline exceeded waiting for a coalesced {model_name} request.") from exc
+    if coalesced:
+        record_event("llm_coalesced", model=model_name, fingerprint=key[:12])
+    return result
+
+
+def _call_structured(
+    model_cls: Type[BaseModel],
+    system_prompt: str,
+    user_text: str,
+    image_ref: Optional[str],
+    extra_user_text: Optional[str],
+    allow_invalid: bool,
+    context: Dict[str, Any],
+    model_name: str,
+    temperature: float,
+    image_detail: Optional[str] = None,
+) -> Tuple[Dict[str, Any], bool]:
+    """Returns (output, passed_validation)."""
     client = _get_client()
+    spec = get_schema(model_cls)
 
     user_content: List[Any] | str
-    if image_data_url:
+    if image_ref:
+        # Bytes are materialized only here, right before the request is sent.
+        image_url = {"url": load_data_url(image_ref)}
+        if image_detail:
+            image_url["detail"] = image_detail
         user_content = [
             {"type": "text", "text": user_text},
-            {"type": "image_url", "image_url": {"url": image_data_url}},
+            {"type": "image_url", "image_url": image_url},
         ]
         if extra_user_text:
             user_content.append({"type": "text", "text": extra_user_text})
@@ -41,42 +256,75 @@ def call_structured(
         if extra_user_text:
             combined = f"{user_text}\n\n{extra_user_text}"
         user_content = combined
+    estimated_tokens = _estimate_tokens(system_prompt, user_text, extra_user_text, image=bool(image_ref), image_detail=image_detail)
 
-    if hasattr(client, "responses"):
-        try:
-            response = client.responses.parse(
+    raw: Optional[str] = None
+    try:
+        response = _send(
+            lambda timeout: client.chat.completions.create(
                 model=model_name,
-                input=[
+                messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_content},
                 ],
-                text_format=model_cls,
                 temperature=temperature,
-            )
-            return response.output_parsed
-        except Exception:
-            if not allow_invalid:
-                raise
+                response_format=spec.response_format,
+                timeout=timeout,
+            ),
+            model_name,
+            estimated_tokens,
+        )
+        raw = response.choices[0].message.content or "{}"
+        return spec.validate_json(raw, context), True
+    except (DeadlineExceeded, CircuitOpenError):
+        raise
+    except Exception as exc:
+        if raw is None and not allow_invalid:
+            raise
+        first_error = exc
+
+    # Malformed output (fences, truncation, trailing commas, aliased fields) is usually
+    # recoverable locally, which saves a second round trip.
+    if raw is not None:
+        repaired = repair_json(raw)
+        if isinstance(repaired, dict):
+            try:
+                data = spec.validate_python(repaired, context)
+                record_repair("repaired")
+                record_event("json_repair", model=model_name, outcome="repaired")
+                return data, True
+            except ValidationError:
+                pass
+        record_repair("failed")
+        record_event("json_repair", model=model_name, outcome="failed")
+        if not allow_invalid:
+            raise first_error
 
     json_guard = "\n\nReturn JSON only. The response must be a valid JSON object."
     messages = [
         {"role": "system", "content": system_prompt + json_guard},
         {"role": "user", "content": user_content},
     ]
-    response = client.chat.completions.create(
-        model=model_name,
-        messages=messages,
-        temperature=temperature,
-        response_format={"type": "json_object"},
+    response = _send(
+        lambda timeout: client.chat.completions.create(
+            model=model_name,
+            messages=messages,
+            temperature=temperature,
+            response_format={"type": "json_object"},
+            timeout=timeout,
+        ),
+        model_name,
+        estimated_tokens,
     )
     content = response.choices[0].message.content or "{}"
+    try:
+        return spec.validate_json(content, context), True
+    except ValidationError:
+        pass
     try:
         data = json.loads(content)
     except json.JSONDecodeError as exc:
         raise RuntimeError(f"Failed to parse model JSON output: {exc}") from exc
-    try:
-        return model_cls.model_validate(data)
-    except Exception:
-        if allow_invalid:
-            return data
-        raise
+    if not isinstance(data, dict):
+        raise RuntimeError("Model JSON output is not an object.")
+    return spec.coerce(data, context), False
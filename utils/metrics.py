@@ -0,0 +1,274 @@
+import bisect
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; covers cache hits (ms) up to slow image calls near the LLM timeout.
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+_STAGE_SUFFIX = re.compile(r"\[\d+\]$")
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def samples(self) -> Iterable[Tuple[str, LabelValues, float]]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterable[Tuple[str, LabelValues, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, key, value) for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last), sum].
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def samples(self) -> Iterable[Tuple[str, LabelValues, float]]:
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        out = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                out.append((f"{self.name}_bucket", key + (_format_value(bound),), float(cumulative)))
+            out.append((f"{self.name}_sum", key, total))
+            out.append((f"{self.name}_count", key, float(cumulative)))
+        return out
+
+
+_registry: List[_Metric] = []
+
+
+def _register(metric: _Metric) -> Any:
+    _registry.append(metric)
+    return metric
+
+
+STAGE_LATENCY = _register(Histogram(
+    "eatsense_stage_latency_seconds", "Latency of pipeline stages by agent.", ["agent"]))
+STAGE_ERRORS = _register(Counter(
+    "eatsense_stage_errors_total", "Pipeline stages that raised, by agent and exception type.", ["agent", "error"]))
+STAGES_INFLIGHT = _register(Gauge(
+    "eatsense_stages_inflight", "Pipeline stages currently running, by agent.", ["agent"]))
+REQUESTS_INFLIGHT = _register(Gauge(
+    "eatsense_requests_inflight", "Requests currently being served by the coordinator."))
+LLM_INFLIGHT = _register(Gauge(
+    "eatsense_llm_requests_inflight", "LLM requests currently waiting on the endpoint."))
+LLM_REQUESTS = _register(Counter(
+    "eatsense_llm_requests_total", "Completed LLM requests by agent and model.", ["agent", "model"]))
+LLM_TOKENS = _register(Counter(
+    "eatsense_llm_tokens_total", "LLM tokens reported by the endpoint, by agent and model.", ["agent", "model"]))
+CACHE_LOOKUPS = _register(Counter(
+    "eatsense_cache_lookups_total", "Local shortcut and cache lookups by cache and result (hit/miss).",
+    ["cache", "result"]))
+COMMERCE_OUTCOMES = _register(Counter(
+    "eatsense_commerce_outcomes_total", "Commerce lookups by final status.", ["status"]))
+CLARIFICATIONS = _register(Counter(
+    "eatsense_clarification_checks_total", "Clarification gatekeeper runs (denominator for the question rate)."))
+CLARIFICATION_QUESTIONS = _register(Counter(
+    "eatsense_clarification_questions_total", "Clarification questions asked, by question id.", ["id"]))
+
+
+def observe_stage(name: str, seconds: float, error: Optional[BaseException], events: List[Dict[str, Any]]) -> None:
+    """Fold one finished stage (its latency and trace events) into the metrics."""
+    agent = _STAGE_SUFFIX.sub("", name)
+    STAGE_LATENCY.observe(seconds, agent=agent)
+    if error is not None:
+        STAGE_ERRORS.inc(agent=agent, error=type(error).__name__)
+    for event in events:
+        kind = event.get("kind")
+        if kind == "llm_request":
+            LLM_REQUESTS.inc(agent=agent, model=event.get("model"))
+            if event.get("tokens"):
+                LLM_TOKENS.inc(event["tokens"], agent=agent, model=event.get("model"))
+        elif "hit" in event:
+            CACHE_LOOKUPS.inc(cache=event.get("cache") or kind, result="hit" if event["hit"] else "miss")
+        elif kind == "llm_coalesced":
+            CACHE_LOOKUPS.inc(cache="llm_coalesced", result="hit")
+
+
+def observe_clarification(questions: List[Dict[str, Any]]) -> None:
+    CLARIFICATIONS.inc()
+    for question in questions:
+        CLARIFICATION_QUESTIONS.inc(id=question.get("id", "unknown"))
+
+
+def _component_stats() -> Iterable[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]:
+    """Gauges read from the components' own stats at scrape time (imported lazily: no cycles)."""
+    from agents.commerce import commerce_stats
+    from agents.interpreter import vision_stats
+    from utils.breaker import HALF_OPEN, OPEN, breaker_stats
+    from utils.json_repair import repair_stats
+    from utils.llm import coalescing_stats
+    from utils.router import get_router
+    from utils.trace_log import get_trace_log, trace_log_enabled
+
+    yield ("eatsense_llm_coalescing", "gauge", "Request coalescing counters.",
+           [({"counter": key}, value) for key, value in coalescing_stats().items()])
+    yield ("eatsense_json_repairs", "gauge", "Malformed LLM outputs repaired locally (each one a saved round trip) or not.",
+           [({"outcome": key}, value) for key, value in repair_stats().items()])
+    yield ("eatsense_vision", "gauge", "Vision cascade counters and escalation rate.",
+           [({"counter": key}, value) for key, value in vision_stats().items()])
+    breakers = breaker_stats()
+    state_value = {OPEN: 2, HALF_OPEN: 1}
+    yield ("eatsense_breaker_state", "gauge", "Circuit breaker state (0 closed, 1 half-open, 2 open).",
+           [({"breaker": name}, state_value.get(snap["state"], 0)) for name, snap in breakers.items()])
+    yield ("eatsense_breaker_rejected", "gauge", "Calls rejected by each circuit breaker.",
+           [({"breaker": name}, snap["rejected"]) for name, snap in breakers.items()])
+    commerce = commerce_stats()
+    yield ("eatsense_commerce_server_attempts_total", "counter", "Commerce lookups sent to each MCP server.",
+           [({"server": name}, stat["attempts"]) for name, stat in commerce.items()])
+    yield ("eatsense_commerce_server_wins_total", "counter", "Commerce lookups each MCP server answered with results.",
+           [({"server": name}, stat["wins"]) for name, stat in commerce.items()])
+    yield ("eatsense_commerce_server_latency_ms", "gauge", "Latency of the last lookup per MCP server.",
+           [({"server": name}, stat["latency_ms"]) for name, stat in commerce.items()
+            if isinstance(stat.get("latency_ms"), (int, float))])
+    route_rows = []
+    for model, stat in get_router().stats().items():
+        route_rows += [({"model": model, "stat": key}, value) for key, value in stat.items()
+                       if isinstance(value, (int, float))]
+    yield ("eatsense_router_model", "gauge", "Model router observations per model.", route_rows)
+    if trace_log_enabled():
+        yield ("eatsense_trace_log", "gauge", "Trace log writer counters.",
+               [({"counter": key}, value) for key, value in get_trace_log().stats().items()])
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, key, value in metric.samples():
+            names = metric.labels + (("le",) if name.endswith("_bucket") else ())
+            lines.append(f"{name}{_format_labels(dict(zip(names, key)))} {_format_value(value)}")
+    try:
+        components = list(_component_stats())
+    except Exception as exc:
+        components = []
+        lines.append(f"# component stats unavailable: {type(exc).__name__}")
+    for name, kind, help_text, rows in components:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in rows:
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(float(value))}")
+    return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", _CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def metrics_enabled() -> bool:
+    return os.getenv("METRICS_ENABLED", "false").lower() == "true"
+
+
+def start_metrics_server(port: Optional[int] = None, host: Optional[str] = None) -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics from a daemon thread; idempotent, and None if the port is taken."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(
+                    (host or os.getenv("METRICS_HOST", "127.0.0.1"), port or int(os.getenv("METRICS_PORT", "9464"))),
+                    _MetricsHandler,
+                )
+            except OSError:
+                # Another process (e.g. a second Streamlit worker) already serves this port.
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="eatsense-metrics", daemon=True).start()
+    return _server
@@ -0,0 +1,134 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator
+
+DEFAULT_PROFILE_DIR = Path(__file__).resolve().parents[1] / ".profiles"
+
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+
+
+def profiling_enabled() -> bool:
+    return os.getenv("EATSENSE_PROFILE", "false").lower() in {"1", "true"}
+
+
+def _profile_dir() -> Path:
+    return Path(os.getenv("EATSENSE_PROFILE_DIR") or DEFAULT_PROFILE_DIR)
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        super().__init__(name="eatsense-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{Path(code.co_filename).name}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if frames:
+                self.stacks[";".join(reversed(frames))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+def _start_tracemalloc() -> None:
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0:
+            _tracemalloc_owned = not tracemalloc.is_tracing()
+            if _tracemalloc_owned:
+                tracemalloc.start(int(os.getenv("EATSENSE_PROFILE_TRACEMALLOC_FRAMES", "1")))
+            tracemalloc.reset_peak()
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc() -> None:
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+
+
+def _rotate(directory: Path, keep: int) -> None:
+    entries = []
+    for path in directory.iterdir():
+        try:
+            entries.append((path.stat().st_mtime, path))
+        except FileNotFoundError:
+            continue
+    entries.sort()
+    for _, path in entries[: max(0, len(entries) - keep)]:
+        path.unlink(missing_ok=True)
+
+
+@contextmanager
+def profile_stage(request_key: str, stage: str) -> Iterator[Dict[str, Any]]:
+    """Profile the calling thread for the duration of one stage.
+
+    Writes ``<request_key>-<stage>.collapsed`` (flamegraph.pl / speedscope input) and
+    ``<request_key>-<stage>.alloc.txt`` (top allocation sites by size delta) and fills the
+    yielded dict with their paths for the trace. Only the newest EATSENSE_PROFILE_KEEP
+    artifacts are kept.
+    """
+    interval = float(os.getenv("EATSENSE_PROFILE_INTERVAL_MS", "5")) / 1000
+    top_n = int(os.getenv("EATSENSE_PROFILE_TOP_ALLOCATIONS", "25"))
+    info: Dict[str, Any] = {}
+
+    _start_tracemalloc()
+    before = tracemalloc.take_snapshot()
+    sampler = _StackSampler(threading.get_ident(), interval)
+    sampler.start()
+    started = time.perf_counter()
+    try:
+        yield info
+    finally:
+        sampler.stop()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        _stop_tracemalloc()
+
+        directory = _profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        base = directory / f"{request_key}-{stage}"
+        stacks_path = base.with_name(base.name + ".collapsed")
+        alloc_path = base.with_name(base.name + ".alloc.txt")
+        stacks_path.write_text(
+            "".join(f"{stack} {count}\n" for stack, count in sampler.stacks.most_common()),
+            encoding="utf-8",
+        )
+        noise = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+        stats = after.filter_traces(noise).compare_to(before.filter_traces(noise), "lineno")[:top_n]
+        alloc_path.write_text("".join(f"{stat}\n" for stat in stats), encoding="utf-8")
+        _rotate(directory, int(os.getenv("EATSENSE_PROFILE_KEEP", "200")))
+
+        info.update({
+            "stacks": str(stacks_path),
+            "allocations": str(alloc_path),
+            "samples": sum(sampler.stacks.values()),
+            "wall_ms": round((time.perf_counter() - started) * 1000, 1),
+            "traced_peak_kb": round(peak / 1024, 1),
+        })
+
+
+def request_key(request_id: str) -> str:
+    """Artifact name prefix: sortable by time, unique per request."""
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{request_id}"
@@ -0,0 +1,182 @@
+import re
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Matches the IngredientAgent prompt: restaurant-style portions are ~10-15% larger.
+RESTAURANT_UPLIFT = (1.10, 1.15)
+
+# Grams (mass units) or millilitres (volume units) per unit.
+_MASS_UNITS = {"g": 1.0, "gm": 1.0, "gms": 1.0, "gram": 1.0, "grams": 1.0, "kg": 1000.0, "mg": 0.001}
+_VOLUME_UNITS = {
+    "ml": 1.0, "l": 1000.0, "litre": 1000.0, "liter": 1000.0,
+    "tbsp": 15.0, "tablespoon": 15.0, "tablespoons": 15.0,
+    "tsp": 5.0, "teaspoon": 5.0, "teaspoons": 5.0,
+    "cup": 240.0, "cups": 240.0,
+}
+_PIECE_UNITS = {"pc", "pcs", "piece", "pieces", "no", "nos", "whole", "medium", "unit", "units", "clove", "cloves"}
+
+# g/ml for volume units, by the first keyword found as a whole word in the item name.
+_DENSITIES = [
+    ("oil", 0.92), ("ghee", 0.91), ("butter", 0.96), ("cream", 1.0), ("milk", 1.03),
+    ("curd", 1.03), ("yogurt", 1.03), ("honey", 1.42), ("sugar", 0.85), ("salt", 1.2),
+    ("flour", 0.53), ("atta", 0.53), ("besan", 0.45), ("rice", 0.85), ("dal", 0.8),
+    ("paste", 1.1), ("puree", 1.05), ("powder", 0.5), ("masala", 0.5), ("seeds", 0.6),
+]
+# Typical grams for counted items, matched the same way (so "eggplant" isn't an egg).
+_PIECE_GRAMS = [
+    ("egg", 50.0), ("onion", 110.0), ("tomato", 100.0), ("potato", 150.0), ("chili", 4.0),
+    ("chilli", 4.0), ("garlic", 4.0), ("lemon", 60.0), ("bread", 30.0), ("roti", 40.0),
+]
+
+_VULGAR_FRACTIONS = {
+    "½": "1/2", "⅓": "1/3", "⅔": "2/3", "¼": "1/4", "¾": "3/4", "⅕": "1/5", "⅖": "2/5",
+    "⅗": "3/5", "⅘": "4/5", "⅙": "1/6", "⅚": "5/6", "⅛": "1/8", "⅜": "3/8", "⅝": "5/8", "⅞": "7/8",
+}
+_VULGAR = re.compile(rf"(\d?)\s*([{''.join(_VULGAR_FRACTIONS)}])")
+# A hyphenated mixed number ("1-1/2") is tried first and never split into a range; the
+# atomic group stops the range pattern from backtracking into "1" - "1/2".
+_NUMBER = r"(?>[1-9]\d*-\d+/\d+|\d+(?:\.\d+)?(?:\s+\d+/\d+|/\d+)?)"
+_RANGE = re.compile(rf"({_NUMBER})\s*(?:-|–|to)\s*({_NUMBER})|({_NUMBER})")
+
+
+@lru_cache(maxsize=4096)
+def name_tokens(text: str) -> Tuple[str, ...]:
+    """Lowercase words of an ingredient name, crudely singularized ("chillies" -> chilli)."""
+    words = []
+    for word in re.findall(r"[a-z]+", (text or "").lower()):
+        if word.endswith("ies"):
+            word = word[:-2]  # chillies -> chilli
+        elif word.endswith("oes"):
+            word = word[:-2]  # tomatoes -> tomato
+        elif word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return tuple(words)
+
+
+def _has_words(words: Tuple[str, ...], key: str) -> bool:
+    key_words = name_tokens(key)
+    size = len(key_words)
+    return any(words[start:start + size] == key_words for start in range(len(words) - size + 1))
+
+
+def _first_match(name: str, table: List[Tuple[str, float]], default: float) -> float:
+    words = name_tokens(name)
+    return next((value for key, value in table if _has_words(words, key)), default)
+
+
+def _to_float(token: str) -> float:
+    total = 0.0
+    for part in token.replace("-", " ").split():
+        if "/" in part:
+            num, den = part.split("/", 1)
+            total += float(num) / float(den)
+        else:
+            total += float(part)
+    return total
+
+
+def parse_range(text: Any) -> Tuple[float, float]:
+    """Parse "120-160", "1/2 - 1", "1 1/2", "1-1/2", "1½", "2 to 3" or "~100" into (low, high); NaN if unknown."""
+    text = _VULGAR.sub(lambda m: f"{m.group(1)} {_VULGAR_FRACTIONS[m.group(2)]}", str(text or "").replace("⁄", "/"))
+    match = _RANGE.search(text)
+    if not match:
+        return float("nan"), float("nan")
+    if match.group(3):
+        value = _to_float(match.group(3))
+        return value, value
+    low, high = _to_float(match.group(1)), _to_float(match.group(2))
+    return min(low, high), max(low, high)
+
+
+def grams_per_unit(item: str, unit: str) -> float:
+    """Grams-equivalent of one ``unit`` of ``item``; NaN when it cannot be estimated."""
+    unit = (unit or "").strip().lower().rstrip(".")
+    if unit in _MASS_UNITS:
+        return _MASS_UNITS[unit]
+    if unit in _VOLUME_UNITS:
+        return _VOLUME_UNITS[unit] * _first_match(item, _DENSITIES, 1.0)
+    if unit in _PIECE_UNITS or not unit:
+        return _first_match(item, _PIECE_GRAMS, float("nan"))
+    return float("nan")
+
+
+def format_quantity(value: float) -> str:
+    if value >= 10:
+        return str(int(round(value)))
+    if value <= 0:
+        return "0"
+    return f"{max(0.25, round(value * 4) / 4):g}"
+
+
+def normalize_style(style: Optional[str]) -> str:
+    """Canonical style: "restaurant-style" for any restaurant variant the LLM may return, else "home-style"."""
+    return "restaurant-style" if "restaurant" in (style or "").lower() else "home-style"
+
+
+def _style_factors(style: str) -> np.ndarray:
+    return np.array(RESTAURANT_UPLIFT if normalize_style(style) == "restaurant-style" else (1.0, 1.0))
+
+
+@dataclass
+class IngredientTable:
+    """Array-backed ingredient list: one row per ingredient, quantities as (low, high) columns."""
+
+    items: List[str]
+    units: List[str]
+    raw: List[str]
+    quantities: np.ndarray  # shape (n, 2): low, high in the listed unit
+    grams_per_unit: np.ndarray  # shape (n,)
+    servings: int
+    style: str
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_output(cls, ingredient_output: Dict[str, Any]) -> "IngredientTable":
+        rows = [row for row in ingredient_output.get("ingredients", []) if isinstance(row, dict)]
+        items = [str(row.get("item", "")) for row in rows]
+        units = [str(row.get("unit") or "") for row in rows]
+        raw = [str(row.get("quantity_range", "")) for row in rows]
+        quantities = np.array([parse_range(text) for text in raw], dtype=np.float64).reshape(-1, 2)
+        meta = {key: value for key, value in ingredient_output.items() if key != "ingredients"}
+        return cls(
+            items=items,
+            units=units,
+            raw=raw,
+            quantities=quantities,
+            grams_per_unit=np.array([grams_per_unit(i, u) for i, u in zip(items, units)], dtype=np.float64),
+            servings=max(1, int(ingredient_output.get("servings_assumption") or 1)),
+            style=normalize_style(ingredient_output.get("style")),
+            meta=meta,
+        )
+
+    @property
+    def grams(self) -> np.ndarray:
+        """(n, 2) grams-equivalent low/high; NaN rows for unparseable or unknown units."""
+        return self.quantities * self.grams_per_unit[:, None]
+
+    def rescale(self, servings: int, style: Optional[str] = None) -> "IngredientTable":
+        servings = max(1, int(servings))
+        style = normalize_style(style or self.style)
+        factors = (servings / self.servings) * _style_factors(style) / _style_factors(self.style)
+        return replace(self, quantities=self.quantities * factors, servings=servings, style=style)
+
+    def to_output(self) -> Dict[str, Any]:
+        ingredients = []
+        for idx, item in enumerate(self.items):
+            low, high = self.quantities[idx]
+            if np.isnan(low):
+                quantity = self.raw[idx]
+            elif format_quantity(low) == format_quantity(high):
+                quantity = format_quantity(low)
+            else:
+                quantity = f"{format_quantity(low)}-{format_quantity(high)}"
+            ingredients.append({"item": item, "quantity_range": quantity, "unit": self.units[idx]})
+        output = dict(self.meta)
+        output["servings_assumption"] = self.servings
+        output["style"] = self.style
+        output["ingredients"] = ingredients
+        return output
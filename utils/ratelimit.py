@@ -0,0 +1,216 @@
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from utils.deadline import DeadlineExceeded, remaining
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+PRIORITIES = {"interactive": 0, "batch": 1, "speculative": 2}
+# Fraction of each bucket that lower priority classes may not consume, kept for interactive traffic.
+RESERVES = {"interactive": 0.0, "batch": 0.2, "speculative": 0.4}
+
+_priority: ContextVar[str] = ContextVar("eatsense_llm_priority", default="interactive")
+_session: ContextVar[str] = ContextVar("eatsense_llm_session", default="")
+
+
+@contextmanager
+def request_scope(priority: str = "interactive", session_id: str = "") -> Iterator[None]:
+    """Tag LLM calls made inside the block with a priority class and session id."""
+    priority_token = _priority.set(priority if priority in PRIORITIES else "interactive")
+    session_token = _session.set(session_id or "")
+    try:
+        yield
+    finally:
+        _priority.reset(priority_token)
+        _session.reset(session_token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def current_session() -> str:
+    return _session.get()
+
+
+class _LocalBuckets:
+    """Requests-per-minute and tokens-per-minute token buckets for this process."""
+
+    def __init__(self, rpm: float, tpm: float) -> None:
+        self.capacity = (rpm, tpm)
+        self.levels = [rpm, tpm]
+        self.updated = time.time()
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self.updated)
+        for idx, cap in enumerate(self.capacity):
+            if cap:
+                self.levels[idx] = min(cap, self.levels[idx] + elapsed * cap / 60.0)
+        self.updated = now
+
+    def try_acquire(self, amounts: Tuple[float, float], reserve: float) -> float:
+        now = time.time()
+        self._refill(now)
+        wait = 0.0
+        for idx, cap in enumerate(self.capacity):
+            if not cap:
+                continue
+            floor = cap * reserve
+            need = min(amounts[idx], cap - floor) + floor
+            if self.levels[idx] < need:
+                wait = max(wait, (need - self.levels[idx]) * 60.0 / cap)
+        if wait > 0:
+            return wait
+        for idx, cap in enumerate(self.capacity):
+            if cap:
+                self.levels[idx] -= min(amounts[idx], cap)
+        return 0.0
+
+    def adjust(self, tokens: float) -> None:
+        if self.capacity[1]:
+            self.levels[1] = min(self.capacity[1], self.levels[1] - tokens)
+
+
+class _FileBuckets(_LocalBuckets):
+    """Bucket levels shared across processes through a flock-guarded state file."""
+
+    def __init__(self, rpm: float, tpm: float, path: str) -> None:
+        super().__init__(rpm, tpm)
+        self.path = path
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with open(self.path, "a+", encoding="utf-8") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                handle.seek(0)
+                try:
+                    state = json.loads(handle.read() or "{}")
+                    self.levels = list(state["levels"])
+                    self.updated = float(state["updated"])
+                except (ValueError, KeyError, TypeError):
+                    self.levels = list(self.capacity)
+                    self.updated = time.time()
+                yield
+                handle.seek(0)
+                handle.truncate()
+                handle.write(json.dumps({"levels": self.levels, "updated": self.updated}))
+                handle.flush()
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def try_acquire(self, amounts: Tuple[float, float], reserve: float) -> float:
+        with self._locked():
+            return super().try_acquire(amounts, reserve)
+
+    def adjust(self, tokens: float) -> None:
+        with self._locked():
+            super().adjust(tokens)
+
+
+class _Waiter:
+    __slots__ = ("priority", "tag", "seq", "session_id", "tokens")
+
+    def __init__(self, priority: int, tag: int, seq: int, session_id: str, tokens: float) -> None:
+        self.priority = priority
+        self.tag = tag
+        self.seq = seq
+        self.session_id = session_id
+        self.tokens = tokens
+
+    def key(self) -> Tuple[int, int, int]:
+        return (self.priority, self.tag, self.seq)
+
+
+class LLMScheduler:
+    """Token-bucket limiter with strict priority classes and fair queuing across sessions.
+
+    Within a priority class, waiters are ordered by a per-session virtual tag, so a session
+    that has just been served queues behind sessions that have not (start-time fair queuing).
+    """
+
+    def __init__(self, rpm: float = 0, tpm: float = 0, lock_path: Optional[str] = None) -> None:
+        self.enabled = bool(rpm or tpm)
+        if lock_path and fcntl is not None:
+            self._buckets: _LocalBuckets = _FileBuckets(rpm, tpm, lock_path)
+        else:
+            self._buckets = _LocalBuckets(rpm, tpm)
+        self._cond = threading.Condition()
+        self._waiting: List[_Waiter] = []
+        self._session_tags: Dict[str, int] = {}
+        self._vtime = 0
+        self._seq = itertools.count()
+
+    def acquire(self, tokens: float, priority: Optional[str] = None, session_id: Optional[str] = None) -> float:
+        """Block until the request may be sent; returns the queue wait in seconds.
+
+        Raises DeadlineExceeded if the request's budget runs out while it is queued.
+        """
+        if not self.enabled:
+            return 0.0
+        priority = priority or current_priority()
+        session_id = session_id if session_id is not None else current_session()
+        reserve = RESERVES.get(priority, 0.0)
+        started = time.monotonic()
+        with self._cond:
+            tag = max(self._vtime, self._session_tags.get(session_id, 0)) + 1
+            self._session_tags[session_id] = tag
+            waiter = _Waiter(PRIORITIES.get(priority, 0), tag, next(self._seq), session_id, tokens)
+            self._waiting.append(waiter)
+            try:
+                while True:
+                    head = min(self._waiting, key=_Waiter.key)
+                    wait = 0.25
+                    if head is waiter:
+                        wait = self._buckets.try_acquire((1, tokens), reserve)
+                        if wait <= 0:
+                            break
+                    left = remaining()
+                    if left is not None and left <= 0:
+                        raise DeadlineExceeded(f"Deadline exceeded after {time.monotonic() - started:.1f}s in the LLM queue.")
+                    # Re-check periodically: a higher priority waiter may arrive meanwhile.
+                    self._cond.wait(timeout=min(wait, 0.25) if left is None else min(wait, 0.25, left))
+                self._vtime = max(self._vtime, tag)
+                if len(self._session_tags) > 1024:
+                    self._session_tags = {k: v for k, v in self._session_tags.items() if v > self._vtime}
+            finally:
+                self._waiting.remove(waiter)
+                self._cond.notify_all()
+        return time.monotonic() - started
+
+    def settle(self, estimated_tokens: float, actual_tokens: Optional[float]) -> None:
+        """Correct the token bucket once the real usage of a request is known."""
+        if not self.enabled or actual_tokens is None:
+            return
+        with self._cond:
+            self._buckets.adjust(actual_tokens - estimated_tokens)
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._waiting)
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler(
+                    rpm=float(os.getenv("LLM_RATE_LIMIT_RPM", "0") or 0),
+                    tpm=float(os.getenv("LLM_RATE_LIMIT_TPM", "0") or 0),
+                    lock_path=os.getenv("LLM_RATE_LIMIT_LOCK_FILE") or None,
+                )
+    return _scheduler
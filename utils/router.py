@@ -0,0 +1,99 @@
+import os
+import random
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+Sample = Tuple[float, bool]
+
+
+def _env_key(stage: Optional[str]) -> str:
+    return (stage or "").upper().replace("-", "_")
+
+
+class ModelRouter:
+    """Pick a model per stage from rolling latency and error-rate statistics.
+
+    Models for a stage come from ``OPENAI_MODEL_<STAGE>`` (comma-separated, cheapest first),
+    falling back to ``OPENAI_MODEL``. With ``OPENAI_CASCADE_<STAGE>=true`` every configured
+    model is returned in order so the caller can escalate; otherwise the best one is chosen.
+    Models failing more than ``max_error_rate`` of their calls rank after every healthy one,
+    and only successful calls count towards latency, so a model that fails fast never wins.
+    """
+
+    def __init__(
+        self, window: int = 50, min_samples: int = 3, explore_rate: float = 0.05, max_error_rate: float = 0.5
+    ) -> None:
+        self.window = window
+        self.min_samples = min_samples
+        self.explore_rate = explore_rate
+        self.max_error_rate = max_error_rate
+        self._samples: Dict[Tuple[str, str], Deque[Sample]] = {}
+        self._lock = threading.Lock()
+
+    def models(self, stage: Optional[str]) -> List[str]:
+        raw = os.getenv(f"OPENAI_MODEL_{_env_key(stage)}", "") if stage else ""
+        models = [name.strip() for name in raw.split(",") if name.strip()]
+        return models or [os.getenv("OPENAI_MODEL", "gpt-4o-mini")]
+
+    def cascade(self, stage: Optional[str]) -> bool:
+        return bool(stage) and os.getenv(f"OPENAI_CASCADE_{_env_key(stage)}", "false").lower() == "true"
+
+    def plan(self, stage: Optional[str]) -> List[str]:
+        models = self.models(stage)
+        if len(models) == 1 or self.cascade(stage):
+            return models
+        return [self.best(stage or "", models)]
+
+    def best(self, stage: str, models: List[str]) -> str:
+        with self._lock:
+            for model in models:
+                if len(self._samples.get((stage, model), ())) < self.min_samples:
+                    return model
+            if random.random() < self.explore_rate:
+                return random.choice(models)
+            return min(models, key=lambda model: self._score(stage, model))
+
+    def _score(self, stage: str, model: str) -> Tuple[bool, float, float]:
+        samples = self._samples[(stage, model)]
+        error_rate = _error_rate(samples)
+        unhealthy = error_rate > self.max_error_rate
+        latency = _median_latency(samples)
+        if latency is None:
+            return True, error_rate, float("inf")
+        return unhealthy, error_rate if unhealthy else 0.0, latency * (1.0 + 4.0 * error_rate)
+
+    def observe(self, stage: Optional[str], model: str, latency_s: float, ok: bool) -> None:
+        with self._lock:
+            samples = self._samples.setdefault((stage or "", model), deque(maxlen=self.window))
+            samples.append((latency_s, ok))
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            out = {}
+            for (stage, model), samples in self._samples.items():
+                if not samples:
+                    continue
+                latency = _median_latency(samples)
+                out[f"{stage or 'default'}:{model}"] = {
+                    "calls": len(samples),
+                    "median_latency_ms": None if latency is None else round(latency * 1000, 1),
+                    "error_rate": round(_error_rate(samples), 3),
+                }
+            return out
+
+
+def _error_rate(samples: Deque[Sample]) -> float:
+    return sum(1 for _, ok in samples if not ok) / len(samples)
+
+
+def _median_latency(samples: Deque[Sample]) -> Optional[float]:
+    latencies = sorted(latency for latency, ok in samples if ok)
+    return latencies[len(latencies) // 2] if latencies else None
+
+
+_router = ModelRouter()
+
+
+def get_router() -> ModelRouter:
+    return _router
@@ -0,0 +1,151 @@
+import copy
+import threading
+from dataclasses import dataclass, field
+from typing import Annotated, Any, Callable, Dict, Optional, Sequence, Type, Union
+
+from openai import pydantic_function_tool
+from pydantic import BaseModel, BeforeValidator, TypeAdapter, ValidationError, ValidationInfo
+
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class FromContext:
+    """Default/override value taken from the per-call validation context."""
+
+    key: str
+    fallback: Any = None
+
+
+def _get_path(data: Dict[str, Any], path: str) -> Any:
+    node: Any = data
+    for part in path.split("."):
+        if not isinstance(node, dict) or part not in node:
+            return _MISSING
+        node = node[part]
+    return node
+
+
+def _set_path(data: Dict[str, Any], path: str, value: Any) -> None:
+    parts = path.split(".")
+    node = data
+    for part in parts[:-1]:
+        if not isinstance(node.get(part), dict):
+            node[part] = {}
+        node = node[part]
+    node[parts[-1]] = value
+
+
+def _resolve(value: Any, context: Dict[str, Any]) -> Any:
+    if isinstance(value, FromContext):
+        return copy.deepcopy(context.get(value.key, value.fallback))
+    if callable(value):
+        return value(context)
+    return copy.deepcopy(value)
+
+
+@dataclass
+class SchemaSpec:
+    """Precompiled validation for one agent output model.
+
+    Rules are applied in order before validation: ``aliases`` (target path <- first present
+    source path), ``coercions`` (per-field fix-ups of present values), ``defaults`` (only when
+    missing) and ``overrides`` (always). Paths may be dotted to reach nested objects.
+    """
+
+    model_cls: Type[BaseModel]
+    aliases: Dict[str, Sequence[str]] = field(default_factory=dict)
+    coercions: Dict[str, Callable[[Any], Any]] = field(default_factory=dict)
+    defaults: Dict[str, Any] = field(default_factory=dict)
+    overrides: Dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        def before(value: Any, info: ValidationInfo) -> Any:
+            return self.apply_rules(value, info.context or {})
+
+        # Well-formed output validates entirely inside pydantic-core; only output that needs
+        # aliasing or defaults goes through the Python rules.
+        self.fast_adapter = TypeAdapter(self.model_cls)
+        self.adapter = TypeAdapter(Annotated[self.model_cls, BeforeValidator(before)])
+        # Strict structured outputs hold the model to the schema (every field required, no
+        # extra keys). The SDK's public tool helper builds the same strict schema that its
+        # ``parse`` helpers send.
+        self.json_schema = pydantic_function_tool(self.model_cls)["function"]["parameters"]
+        self.response_format = {
+            "type": "json_schema",
+            "json_schema": {"name": self.model_cls.__name__, "schema": self.json_schema, "strict": True},
+        }
+
+    def apply_rules(self, data: Any, context: Dict[str, Any]) -> Any:
+        if not isinstance(data, dict):
+            return data
+        for target, sources in self.aliases.items():
+            if _get_path(data, target) is not _MISSING:
+                continue
+            for source in sources:
+                value = _get_path(data, source)
+                if value is not _MISSING and value is not None:
+                    _set_path(data, target, value)
+                    break
+        for path, coerce in self.coercions.items():
+            value = _get_path(data, path)
+            if value is not _MISSING:
+                _set_path(data, path, coerce(value))
+        for path, value in self.defaults.items():
+            if _get_path(data, path) is _MISSING:
+                _set_path(data, path, _resolve(value, context))
+        for path, value in self.overrides.items():
+            _set_path(data, path, _resolve(value, context))
+        return data
+
+    def validate_json(self, raw: Union[str, bytes], context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Parse, normalize and validate raw model output in a single pydantic-core pass."""
+        context = context or {}
+        try:
+            data = self.fast_adapter.validate_json(raw).model_dump()
+        except ValidationError:
+            return self.adapter.validate_json(raw, context=context).model_dump()
+        for path, coerce in self.coercions.items():
+            value = _get_path(data, path)
+            if value is not _MISSING:
+                _set_path(data, path, coerce(value))
+        for path, value in self.overrides.items():
+            _set_path(data, path, _resolve(value, context))
+        return data
+
+    def validate_python(self, data: Any, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """validate_json for already parsed (e.g. locally repaired) output."""
+        return self.adapter.validate_python(copy.deepcopy(data), context=context or {}).model_dump()
+
+    def coerce(self, data: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Best-effort normalization for output that does not validate (allow_invalid)."""
+        return self.apply_rules(data, context or {})
+
+
+class SchemaRegistry:
+    def __init__(self) -> None:
+        self._specs: Dict[Type[BaseModel], SchemaSpec] = {}
+        self._lock = threading.Lock()
+
+    def register(self, model_cls: Type[BaseModel], **rules: Any) -> SchemaSpec:
+        spec = SchemaSpec(model_cls, **rules)
+        with self._lock:
+            self._specs[model_cls] = spec
+        return spec
+
+    def get(self, model_cls: Type[BaseModel]) -> SchemaSpec:
+        spec = self._specs.get(model_cls)
+        if spec is None:
+            spec = self.register(model_cls)
+        return spec
+
+
+registry = SchemaRegistry()
+
+
+def register_schema(model_cls: Type[BaseModel], **rules: Any) -> SchemaSpec:
+    return registry.register(model_cls, **rules)
+
+
+def get_schema(model_cls: Type[BaseModel]) -> SchemaSpec:
+    return registry.get(model_cls)
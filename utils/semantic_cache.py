@@ -0,0 +1,189 @@
+import copy
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+_SYNONYMS = {
+    "veg": "vegetable", "vegetables": "vegetable", "vegetarian": "vegetable", "veggie": "vegetable",
+    "n": "and", "w": "with", "&": "and", "murgh": "chicken", "anda": "egg", "eggs": "egg",
+}
+
+
+def normalize_prompt(text: str) -> str:
+    words = re.sub(r"[^a-z0-9& ]+", " ", (text or "").lower()).split()
+    return " ".join(_SYNONYMS.get(word, word) for word in words)
+
+
+class SemanticCache:
+    """Near-duplicate lookup over hashed character n-gram TF-IDF vectors.
+
+    Term frequencies are stored raw and IDF weights are applied at query time, so
+    inserts stay incremental. Entries only match others with the same ``tag``
+    (e.g. servings/variant that must agree exactly); the least recently used slot
+    is overwritten once ``capacity`` is reached.
+    """
+
+    def __init__(
+        self,
+        dim: int = 2048,
+        capacity: int = 2048,
+        threshold: float = 0.9,
+        ngrams: Tuple[int, ...] = (3, 4),
+        path: Optional[str] = None,
+        persist_every: int = 20,
+    ) -> None:
+        self.dim = dim
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ngrams = ngrams
+        self.path = path
+        self.persist_every = persist_every
+        self._tf = np.zeros((capacity, dim), dtype=np.float32)
+        self._df = np.zeros(dim, dtype=np.float32)
+        self._used = np.zeros(capacity, dtype=bool)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._tags: List[str] = [""] * capacity
+        self._texts: List[str] = [""] * capacity
+        self._values: List[Any] = [None] * capacity
+        self._docs = 0
+        self._dirty = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def embed(self, text: str) -> np.ndarray:
+        padded = f" {text} "
+        buckets = [
+            zlib.crc32(padded[i:i + n].encode("utf-8")) % self.dim
+            for n in self.ngrams
+            for i in range(max(len(padded) - n + 1, 0))
+        ]
+        vector = np.bincount(np.asarray(buckets, dtype=np.int64), minlength=self.dim).astype(np.float32)
+        nonzero = vector > 0
+        vector[nonzero] = 1.0 + np.log(vector[nonzero])
+        return vector
+
+    def _idf(self) -> np.ndarray:
+        return np.log((1.0 + self._docs) / (1.0 + self._df)) + 1.0
+
+    def _search(self, vector: np.ndarray, tag: str) -> Tuple[int, float]:
+        rows = np.flatnonzero(self._used & np.fromiter((t == tag for t in self._tags), bool, self.capacity))
+        if rows.size == 0:
+            return -1, 0.0
+        idf = self._idf()
+        query = vector * idf
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0:
+            return -1, 0.0
+        matrix = self._tf[rows] * idf
+        norms = np.linalg.norm(matrix, axis=1)
+        scores = (matrix @ query) / (np.maximum(norms, 1e-9) * query_norm)
+        best = int(np.argmax(scores))
+        return int(rows[best]), float(scores[best])
+
+    def lookup(self, text: str, tag: str = "") -> Tuple[Optional[Any], float]:
+        """Return (value copy or None, best similarity score)."""
+        vector = self.embed(normalize_prompt(text))
+        with self._lock:
+            row, score = self._search(vector, tag)
+            if row < 0 or score < self.threshold:
+                return None, score
+            self._last_used[row] = time.time()
+            return copy.deepcopy(self._values[row]), score
+
+    def insert(self, text: str, value: Any, tag: str = "") -> None:
+        normalized = normalize_prompt(text)
+        vector = self.embed(normalized)
+        with self._lock:
+            row, score = self._search(vector, tag)
+            if row < 0 or score < 0.99:
+                free = np.flatnonzero(~self._used)
+                row = int(free[0]) if free.size else int(np.argmin(self._last_used))
+                if self._used[row]:
+                    self._df -= self._tf[row] > 0
+                    self._docs -= 1
+                self._tf[row] = vector
+                self._df += vector > 0
+                self._docs += 1
+                self._used[row] = True
+            self._tags[row] = tag
+            self._texts[row] = normalized
+            self._values[row] = copy.deepcopy(value)
+            self._last_used[row] = time.time()
+            self._dirty += 1
+            should_persist = bool(self.path) and self._dirty >= self.persist_every
+        if should_persist:
+            self.save(self.path)
+
+    def __len__(self) -> int:
+        return int(self._used.sum())
+
+    def save(self, path: str) -> None:
+        with self._lock:
+            rows = np.flatnonzero(self._used)
+            payload = {
+                "tf": self._tf[rows],
+                "last_used": self._last_used[rows],
+                "meta": np.array(json.dumps({
+                    "dim": self.dim,
+                    "ngrams": list(self.ngrams),
+                    "tags": [self._tags[r] for r in rows],
+                    "texts": [self._texts[r] for r in rows],
+                    "values": [self._values[r] for r in rows],
+                })),
+            }
+            self._dirty = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez_compressed(tmp, **payload)
+        os.replace(tmp, path)
+
+    def load(self, path: str) -> None:
+        try:
+            with np.load(path) as data:
+                meta = json.loads(str(data["meta"]))
+                tf, last_used = data["tf"], data["last_used"]
+        except (OSError, ValueError, KeyError):
+            return
+        if meta.get("dim") != self.dim or tuple(meta.get("ngrams", ())) != self.ngrams:
+            return
+        count = min(len(tf), self.capacity)
+        keep = np.argsort(-last_used)[:count]
+        with self._lock:
+            for row, src in enumerate(keep):
+                self._tf[row] = tf[src]
+                self._last_used[row] = last_used[src]
+                self._tags[row] = meta["tags"][src]
+                self._texts[row] = meta["texts"][src]
+                self._values[row] = meta["values"][src]
+                self._used[row] = True
+            self._df = (self._tf[:count] > 0).sum(axis=0).astype(np.float32)
+            self._docs = count
+
+
+_caches: Dict[str, SemanticCache] = {}
+_caches_lock = threading.Lock()
+
+
+def semantic_cache_enabled() -> bool:
+    return os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+
+
+def get_semantic_cache(name: str) -> SemanticCache:
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            directory = os.getenv("SEMANTIC_CACHE_DIR", "").strip()
+            cache = SemanticCache(
+                capacity=int(os.getenv("SEMANTIC_CACHE_CAPACITY", "2048")),
+                threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9")),
+                path=os.path.join(directory, f"{name}.npz") if directory else None,
+            )
+            _caches[name] = cache
+        return cache
@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+Errors = Tuple[Type[BaseException], ...]
+
+# A cancelled leader says nothing about the call itself, so waiters always retry it.
+_LEADER_ONLY: Errors = (asyncio.CancelledError,)
+
+
+class WaitTimeout(TimeoutError):
+    """A waiter gave up on an in-flight call before the leader finished."""
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "waiters", "async_waiters")
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+        self.async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class SingleFlight:
+    """Coalesce concurrent identical calls: one leader runs, the rest share its outcome.
+
+    Works across threads and asyncio loops alike; waiters in a loop are resolved via
+    call_soon_threadsafe. ``clone`` gives every caller a private copy of a shared result.
+    A waiter blocks for at most ``timeout`` seconds (then WaitTimeout). Leader errors of a
+    ``retry_on`` type are specific to the leader, so they are not shared: waiters join
+    again and one of them runs its own ``fn`` as the new leader. A cancelled leader is
+    always treated that way.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._leaders = 0
+        self._coalesced = 0
+        self._errors = 0
+
+    def _join(self, key: str) -> Tuple[_Call, bool]:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._coalesced += 1
+                return call, False
+            call = _Call()
+            self._calls[key] = call
+            self._leaders += 1
+            return call, True
+
+    def _leave(self, call: _Call, future: Optional[asyncio.Future] = None) -> None:
+        with self._lock:
+            call.waiters -= 1
+            if future is not None:
+                call.async_waiters = [entry for entry in call.async_waiters if entry[1] is not future]
+
+    def _finish(self, key: str, call: _Call) -> bool:
+        with self._lock:
+            self._calls.pop(key, None)
+            shared = call.waiters > 0
+            if call.error is not None:
+                self._errors += 1
+            call.event.set()
+            async_waiters = list(call.async_waiters)
+        for loop, future in async_waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+        return shared
+
+    @staticmethod
+    def _share(call: _Call, clone: Optional[Callable[[Any], Any]]) -> Any:
+        if call.error is not None:
+            raise call.error
+        return clone(call.result) if clone else call.result
+
+    def do(
+        self,
+        key: str,
+        fn: Callable[[], Any],
+        clone: Optional[Callable[[Any], Any]] = None,
+        timeout: Optional[float] = None,
+        retry_on: Errors = (),
+    ) -> Tuple[Any, bool]:
+        """Run ``fn`` once per in-flight ``key``; returns (result, was_coalesced)."""
+        until = None if timeout is None else time.monotonic() + timeout
+        retry_on = tuple(retry_on) + _LEADER_ONLY
+        while True:
+            call, leader = self._join(key)
+            if leader:
+                break
+            left = None if until is None else max(0.0, until - time.monotonic())
+            if not call.event.wait(left):
+                self._leave(call)
+                raise WaitTimeout(f"Gave up waiting for in-flight call after {timeout:.1f}s.")
+            if not isinstance(call.error, retry_on):
+                return self._share(call, clone), True
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+        shared = self._finish(key, call)
+        if call.error is not None:
+            raise call.error
+        return (clone(call.result) if clone and shared else call.result), False
+
+    async def do_async(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        clone: Optional[Callable[[Any], Any]] = None,
+        timeout: Optional[float] = None,
+        retry_on: Errors = (),
+    ) -> Tuple[Any, bool]:
+        until = None if timeout is None else time.monotonic() + timeout
+        retry_on = tuple(retry_on) + _LEADER_ONLY
+        while True:
+            call, leader = self._join(key)
+            if leader:
+                break
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            with self._lock:
+                done = call.event.is_set()
+                if not done:
+                    call.async_waiters.append((loop, future))
+            if not done:
+                left = None if until is None else max(0.0, until - time.monotonic())
+                try:
+                    # The future only signals that the leader finished; the outcome is read from ``call``.
+                    await asyncio.wait_for(asyncio.shield(future), left)
+                except BaseException as exc:
+                    if not future.done():
+                        self._leave(call, future)
+                        if isinstance(exc, asyncio.TimeoutError):
+                            raise WaitTimeout(f"Gave up waiting for in-flight call after {timeout:.1f}s.") from None
+                        raise
+            if not isinstance(call.error, retry_on):
+                return self._share(call, clone), True
+        try:
+            call.result = await fn()
+        except BaseException as exc:
+            call.error = exc
+        shared = self._finish(key, call)
+        if call.error is not None:
+            raise call.error
+        return (clone(call.result) if clone and shared else call.result), False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "leaders": self._leaders,
+                "coalesced": self._coalesced,
+                "errors": self._errors,
+                "in_flight": len(self._calls),
+            }
@@ -0,0 +1,252 @@
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.blobstore import is_blob_ref
+
+DEFAULT_TRACE_DIR = Path(__file__).resolve().parents[1] / ".traces"
+INDEX_NAME = "index.jsonl"
+
+_IMAGE_KEYS = {"image", "image_b64", "image_data_url", "image_bytes"}
+
+
+def redact(value: Any) -> Any:
+    """Copy of ``value`` with inline image payloads replaced by their sha256."""
+    if isinstance(value, dict):
+        return {
+            key: _digest(item) if key in _IMAGE_KEYS and not (isinstance(item, str) and is_blob_ref(item)) else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if isinstance(value, (bytes, bytearray)) or (isinstance(value, str) and value.startswith("data:")):
+        return _digest(value)
+    return value
+
+
+def _digest(value: Any) -> Any:
+    if value is None:
+        return None
+    data = value if isinstance(value, (bytes, bytearray)) else str(value).encode("utf-8")
+    return f"<redacted sha256:{hashlib.sha256(data).hexdigest()}>"
+
+
+class TraceLog:
+    """Append-only, gzip-compressed JSONL trace log written by a background thread.
+
+    ``submit`` never blocks on I/O: records go to a bounded queue and are dropped (and counted)
+    when it is full. The writer appends each batch as its own gzip member to the current
+    segment, rotating at ``segment_bytes`` and keeping at most ``max_segments``. Every
+    record gets an ``index.jsonl`` line (request_id, segment, member offset and length) so
+    ``lookup`` decompresses only one member. Lookups go through an in-memory map of the
+    index that reads only the lines appended since the previous lookup.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        segment_bytes: int = 16 * 1024 * 1024,
+        max_segments: int = 50,
+        queue_size: int = 1000,
+        batch_size: int = 64,
+        flush_interval: float = 1.0,
+    ) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=queue_size)
+        self._index_lock = threading.Lock()
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self._index_pos: Tuple[int, int] = (0, 0)  # (inode, bytes read) of index.jsonl
+        self._segment: Optional[Path] = None
+        # Counters have their own lock: the index lock is held across file I/O.
+        self._stats_lock = threading.Lock()
+        self._written = 0
+        self._dropped = 0
+        self._errors = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="eatsense-trace-log", daemon=True)
+        self._thread.start()
+
+    def submit(self, request_id: str, trace: Dict[str, Any], **meta: Any) -> bool:
+        """Queue one trace for writing; False if it was dropped because the queue is full."""
+        if self._closed:
+            return False
+        # redact() also snapshots the trace, which the caller may keep mutating.
+        record = {"request_id": request_id, "ts": time.time(), **redact(meta), "trace": redact(trace)}
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            with self._stats_lock:
+                self._dropped += 1
+            return False
+
+    def lookup(self, request_id: str) -> Optional[Dict[str, Any]]:
+        """Most recent record for ``request_id``, or None if unknown or rotated away."""
+        with self._index_lock:
+            try:
+                self._refresh_index_locked()
+            except FileNotFoundError:
+                return None
+            entry = self._index.get(request_id)
+        if entry is None:
+            return None
+        try:
+            with open(self.directory / entry["segment"], "rb") as handle:
+                handle.seek(entry["offset"])
+                member = handle.read(entry["length"])
+        except FileNotFoundError:
+            return None
+        for line in gzip.decompress(member).splitlines():
+            record = json.loads(line)
+            if record.get("request_id") == request_id:
+                return record
+        return None
+
+    def _refresh_index_locked(self) -> None:
+        # Other processes may append to (or prune and replace) the same index file.
+        with open(self.directory / INDEX_NAME, "rb") as handle:
+            stat = os.fstat(handle.fileno())
+            inode, position = self._index_pos
+            if stat.st_ino != inode or stat.st_size < position:
+                self._index, position = {}, 0
+            handle.seek(position)
+            for line in handle:
+                if not line.endswith(b"\n"):
+                    break  # partially written; picked up next time
+                position += len(line)
+                item = json.loads(line)
+                self._index[item["request_id"]] = item
+            self._index_pos = (stat.st_ino, position)
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return {
+                "written": self._written,
+                "dropped": self._dropped,
+                "errors": self._errors,
+                "queued": self._queue.qsize(),
+            }
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Flush queued traces and stop the writer."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch: List[Dict[str, Any]] = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+                while len(batch) < self.batch_size and not stop:
+                    item = self._queue.get_nowait()
+                    if item is None:
+                        stop = True
+                    else:
+                        batch.append(item)
+            except queue.Empty:
+                pass
+            if batch:
+                try:
+                    self._write_batch(batch)
+                    ok = True
+                except Exception:
+                    ok = False
+                with self._stats_lock:
+                    if ok:
+                        self._written += len(batch)
+                    else:
+                        self._errors += len(batch)
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        lines = [json.dumps(record, default=str, separators=(",", ":")) for record in batch]
+        member = gzip.compress(("\n".join(lines) + "\n").encode("utf-8"), compresslevel=6)
+        segment, offset = self._segment_for(len(member))
+        with open(segment, "ab") as handle:
+            handle.write(member)
+        index_lines = "".join(
+            json.dumps({
+                "request_id": record["request_id"],
+                "ts": round(record["ts"], 3),
+                "segment": segment.name,
+                "offset": offset,
+                "length": len(member),
+            }) + "\n"
+            for record in batch
+        )
+        with self._index_lock:
+            with open(self.directory / INDEX_NAME, "a", encoding="utf-8") as handle:
+                handle.write(index_lines)
+
+    def _segment_for(self, size: int) -> Tuple[Path, int]:
+        if self._segment is not None and self._segment.exists():
+            offset = self._segment.stat().st_size
+            if offset + size <= self.segment_bytes or offset == 0:
+                return self._segment, offset
+        self._segment = self.directory / f"traces-{time.time_ns()}.jsonl.gz"
+        self._prune()
+        return self._segment, 0
+
+    def _prune(self) -> None:
+        segments = sorted(self.directory.glob("traces-*.jsonl.gz"))
+        expired = segments[: max(0, len(segments) - (self.max_segments - 1))]
+        if not expired:
+            return
+        names = {path.name for path in expired}
+        for path in expired:
+            path.unlink(missing_ok=True)
+        # Drop index entries pointing at removed segments.
+        with self._index_lock:
+            index = self.directory / INDEX_NAME
+            try:
+                with open(index, "r", encoding="utf-8") as handle:
+                    kept = [line for line in handle if json.loads(line).get("segment") not in names]
+            except FileNotFoundError:
+                return
+            tmp = index.with_suffix(".tmp")
+            tmp.write_text("".join(kept), encoding="utf-8")
+            os.replace(tmp, index)
+            self._index, self._index_pos = {}, (0, 0)
+
+
+_trace_log: Optional[TraceLog] = None
+_trace_log_lock = threading.Lock()
+
+
+def trace_log_enabled() -> bool:
+    # Off unless asked for: traces hold user inputs, which shouldn't land on disk by default.
+    return os.getenv("TRACE_LOG_ENABLED", "false").lower() == "true"
+
+
+def get_trace_log() -> TraceLog:
+    global _trace_log
+    if _trace_log is None:
+        with _trace_log_lock:
+            if _trace_log is None:
+                _trace_log = TraceLog(
+                    Path(os.getenv("TRACE_LOG_DIR") or DEFAULT_TRACE_DIR),
+                    segment_bytes=int(float(os.getenv("TRACE_LOG_SEGMENT_MB", "16")) * 1024 * 1024),
+                    max_segments=int(os.getenv("TRACE_LOG_MAX_SEGMENTS", "50")),
+                    queue_size=int(os.getenv("TRACE_LOG_QUEUE_SIZE", "1000")),
+                )
+                atexit.register(_trace_log.close)
+    return _trace_log
@@ -0,0 +1,22 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+_events: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("eatsense_trace_events", default=None)
+
+
+@contextmanager
+def collect_events() -> Iterator[List[Dict[str, Any]]]:
+    """Collect events recorded by helpers (LLM calls, caches, ...) during one pipeline stage."""
+    events: List[Dict[str, Any]] = []
+    token = _events.set(events)
+    try:
+        yield events
+    finally:
+        _events.reset(token)
+
+
+def record_event(kind: str, **fields: Any) -> None:
+    events = _events.get()
+    if events is not None:
+        events.append({"kind": kind, **fields})